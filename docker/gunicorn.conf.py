@@ -0,0 +1,37 @@
+"""
+Konfiguracja gunicorna dla trybu produkcyjnego (workery uvicorn)
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+
+# Aplikacja importowana raz w procesie głównym; workery współdzielą pamięć (copy-on-write)
+preload_app = True
+
+# Restart workerów (HUP) czeka na dokończenie trwających żądań
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Heartbeat workerów w pamięci, nie na warstwie overlay kontenera
+worker_tmp_dir = "/dev/shm"
+
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Połączenia z puli utworzone przed forkiem nie mogą być współdzielone między procesami
+    from flood_monitoring.core.database import engine
+
+    engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,5 +5,16 @@ echo "Inicjalizacja bazy danych..."
 python -m flood_monitoring.scripts.init_db
 
 # Uruchamiamy aplikację
-echo "Uruchamianie aplikacji..."
-uvicorn flood_monitoring.api.main:app --host 0.0.0.0 --port 8000 --reload 
\ No newline at end of file
+if [ "${APP_ENV:-development}" = "production" ]; then
+    echo "Uruchamianie aplikacji (produkcja, gunicorn)..."
+    # Metryki Prometheus sumowane ze wszystkich workerów
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/flood_metrics}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    # Zdarzenia SSE rozsyłane do wszystkich workerów
+    export EVENTS_PG_NOTIFY="${EVENTS_PG_NOTIFY:-true}"
+    exec gunicorn flood_monitoring.api.main:app -c /gunicorn.conf.py
+else
+    echo "Uruchamianie aplikacji (tryb deweloperski)..."
+    exec uvicorn flood_monitoring.api.main:app --host 0.0.0.0 --port 8000 --reload
+fi
@@ -0,0 +1,188 @@
+"""
+Kompresja odpowiedzi HTTP (gzip / brotli) oraz odpowiedzi z cache z gotowymi wariantami
+"""
+import gzip
+import zlib
+from typing import Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from flood_monitoring.core.cache import CacheEntry
+
+try:
+    import brotli
+except ImportError:  # brotli jest opcjonalne - bez niego negocjujemy tylko gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Warianty trzymane w cache kompresujemy raz, więc stać nas na mocniejsze ustawienia
+CACHED_GZIP_LEVEL = 9
+CACHED_BROTLI_QUALITY = 9
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/geo+json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+    "text/html",
+)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Wybierz kodowanie z nagłówka Accept-Encoding (br ma pierwszeństwo przed gzip)"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    def allowed(name: str) -> bool:
+        return accepted.get(name, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and allowed("br"):
+        return "br"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(
+            body, quality=CACHED_BROTLI_QUALITY if cached else BROTLI_QUALITY
+        )
+    return gzip.compress(body, compresslevel=CACHED_GZIP_LEVEL if cached else GZIP_LEVEL)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def cached_response(
+    request: Request, entry: CacheEntry, minimum_size: int, status_code: int = 200
+) -> Response:
+    """Zbuduj odpowiedź z wpisu cache, kompresując body najwyżej raz na kodowanie"""
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+
+    if encoding is None or len(entry.body) < minimum_size:
+        return Response(entry.body, status_code, headers, entry.media_type)
+
+    body = entry.encoded.get(encoding)
+    if body is None:
+        body = compress(entry.body, encoding, cached=True)
+        entry.encoded[encoding] = body
+    headers["Content-Encoding"] = encoding
+    return Response(body, status_code, headers, entry.media_type)
+
+
+class _StreamCompressor:
+    """Kompresor przyrostowy - każdy fragment jest od razu wypychany (flush) do klienta"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI negocjujące gzip / brotli dla odpowiedzi powyżej progu rozmiaru.
+
+    Odpowiedzi z ustawionym już Content-Encoding (np. warianty z cache) są przepuszczane
+    bez zmian; odpowiedzi strumieniowe są kompresowane fragment po fragmencie.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not is_compressible(
+                    headers.get("content-type", "")
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None and start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body:
+                    if len(body) >= self.minimum_size:
+                        body = compress(body, encoding)
+                        headers["Content-Encoding"] = encoding
+                        headers["Content-Length"] = str(len(body))
+                        headers.add_vary_header("Accept-Encoding")
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    start_message = None
+                    return
+
+                compressor = _StreamCompressor(encoding)
+                del headers["Content-Length"]
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                await send(start_message)
+                start_message = None
+
+            if compressor is None:
+                await send(message)
+                return
+
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,30 +1,24 @@
+import asyncio
 import logging
 import os
-import sys
-from typing import Dict
+from typing import Any, Dict
 
-import aiohttp
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 
-from flood_monitoring.api.dependencies import get_database_service, get_imgw_service
-from flood_monitoring.api.routers import stations, sync, warnings
+from flood_monitoring.api.compression import CompressionMiddleware
+from flood_monitoring.api.routers import admin, events, export, rivers, stations, sync, warnings
+from flood_monitoring.api.scheduler import IngestionScheduler
 from flood_monitoring.core.config import get_settings
-from flood_monitoring.core.database import get_db
-from flood_monitoring.services.database import DatabaseService
-from flood_monitoring.services.imgw import IMGWService
-
-log_level = os.getenv("LOG_LEVEL", "INFO")
-logging.basicConfig(
-    level=getattr(logging, log_level),
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+from flood_monitoring.core.database import engine
+from flood_monitoring.core.logging_config import setup_logging
+from flood_monitoring.core.metrics import MetricsMiddleware, render_metrics
+from flood_monitoring.services.events import PgNotifyBridge, event_broker
+from flood_monitoring.services.health import UpstreamProbe
 
-logging.getLogger("flood_monitoring").setLevel(logging.DEBUG)
+setup_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_FORMAT", "text"))
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
@@ -32,6 +26,14 @@ app = FastAPI(
     title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
+imgw_probe = UpstreamProbe(settings.IMGW_API_URL, interval=settings.IMGW_PROBE_INTERVAL)
+ingestion_scheduler = (
+    IngestionScheduler(settings.SYNC_INTERVAL) if settings.SYNC_INTERVAL > 0 else None
+)
+event_bridge = (
+    PgNotifyBridge(event_broker, engine) if settings.EVENTS_PG_NOTIFY else None
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -39,10 +41,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(stations.router)
 app.include_router(sync.router)
 app.include_router(warnings.router)
+app.include_router(rivers.router)
+app.include_router(export.router)
+app.include_router(events.router)
+app.include_router(admin.router)
 
 """Glowny endpoint"""
 @app.get("/")
@@ -51,41 +59,87 @@ async def root():
     return {"message": "Flood Monitoring System API"}
 
 
-@app.get("/health", response_model=Dict[str, str])
-async def health_check(
-    db: Session = Depends(get_db), imgw_service: IMGWService = Depends(get_imgw_service)
-):
-    logger.info("Performing health check")
+"""Metryki w formacie Prometheus"""
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+def check_database() -> Dict[str, Any]:
+    """Sprawdź połączenie z bazą przez pulę połączeń"""
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    return {"status": "connected", "pool": engine.pool.status()}
+
+
+@app.on_event("startup")
+async def start_imgw_probe():
+    imgw_probe.start()
+
+
+@app.on_event("shutdown")
+async def stop_imgw_probe():
+    await imgw_probe.stop()
+
+
+@app.on_event("startup")
+async def start_background_ingestion():
+    if event_bridge is not None:
+        event_bridge.start(asyncio.get_running_loop())
+        event_broker.use_bridge(event_bridge)
+    if ingestion_scheduler is not None:
+        ingestion_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_ingestion():
+    if ingestion_scheduler is not None:
+        await ingestion_scheduler.stop()
+    if event_bridge is not None:
+        event_broker.use_bridge(None)
+        await run_in_threadpool(event_bridge.stop)
+
+
+"""Liveness - proces odpowiada, bez zaleznosci zewnetrznych"""
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+
+"""Readiness - dostepnosc bazy danych (pula polaczen)"""
+@app.get("/health/ready")
+async def readiness():
+    try:
+        database = await run_in_threadpool(check_database)
+    except Exception as e:
+        logger.error("Database readiness check failed: %s", e)
+        raise HTTPException(
+            status_code=503,
+            detail={"status": "unready", "database": f"error: {str(e)}"},
+        )
+    return {"status": "ready", "database": database}
+
+
+"""Pelny status: baza danych + ostatni wynik sprawdzania IMGW (bez zapytania do IMGW)"""
+@app.get("/health")
+async def health_check():
     status = {
         "status": "healthy",
-        "database": "connected",
         "api": "running",
-        "imgw_api": "connected",
+        "database": "connected",
+        "imgw_api": imgw_probe.status(),
     }
 
     try:
-        db.execute(text("SELECT 1"))
-        logger.debug("Database connection test successful")
+        await run_in_threadpool(check_database)
     except Exception as e:
-        logger.error(f"Database connection test failed: {str(e)}")
+        logger.error("Database connection test failed: %s", e)
         status["status"] = "unhealthy"
         status["database"] = f"error: {str(e)}"
         raise HTTPException(status_code=503, detail=status)
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{imgw_service.base_url}/station") as response:
-                if response.status != 200:
-                    logger.error(f"IMGW API test failed with status {response.status}")
-                    status["status"] = "unhealthy"
-                    status["imgw_api"] = f"error: status {response.status}"
-                    raise HTTPException(status_code=503, detail=status)
-                logger.debug("IMGW API connection test successful")
-    except Exception as e:
-        logger.error(f"IMGW API connection test failed: {str(e)}")
-        status["status"] = "unhealthy"
-        status["imgw_api"] = f"error: {str(e)}"
-        raise HTTPException(status_code=503, detail=status)
+    if status["imgw_api"]["status"] not in ("connected", "unknown"):
+        status["status"] = "degraded"
 
-    logger.info("Health check completed successfully")
     return status
@@ -0,0 +1,24 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from flood_monitoring.core.database import slow_query_log
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+"""Log wolnych zapytan SQL z planami EXPLAIN (bez parametrow zapytan)"""
+@router.get("/slow-queries", response_model=Dict[str, Any])
+async def get_slow_queries(limit: int = 50):
+
+    return {
+        "enabled": slow_query_log.enabled,
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.entries()[:limit],
+    }
+
+"""Wyczyszczenie logu wolnych zapytan"""
+@router.delete("/slow-queries")
+async def clear_slow_queries():
+
+    slow_query_log.clear()
+    return {"message": "Log wolnych zapytan wyczyszczony"}
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from flood_monitoring.services.events import event_broker
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+KEEPALIVE_INTERVAL = 15
+
+
+def format_sse(event: dict) -> str:
+    data = json.dumps(event["data"], ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+"""Strumien zmian (Server-Sent Events): nowe pomiary i nowe ostrzezenia"""
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    station_id: Optional[List[str]] = Query(None),
+    last_event_id: Optional[int] = Header(None),
+):
+
+    stations = set(station_id) if station_id else None
+    queue = event_broker.subscribe(last_event_id)
+    logger.info("SSE client connected (%d subscribers)", event_broker.subscriber_count)
+
+    async def event_stream():
+        try:
+            yield f"retry: {KEEPALIVE_INTERVAL * 1000}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if (
+                    stations is not None
+                    and event["type"] == "measurement"
+                    and event["data"]["station_id"] not in stations
+                ):
+                    continue
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(queue)
+            logger.info("SSE client disconnected (%d subscribers)", event_broker.subscriber_count)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
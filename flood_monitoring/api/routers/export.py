@@ -0,0 +1,52 @@
+import logging
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from flood_monitoring.api.dependencies import get_database_service
+from flood_monitoring.services.database import DatabaseService
+from flood_monitoring.services.export import MEDIA_TYPES, WRITERS
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+"""Eksport strumieniowy pomiarow (CSV / NDJSON / Parquet)"""
+@router.get("/measurements")
+async def export_measurements(
+    kind: Literal["stan", "przeplyw"] = "stan",
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    station_id: Optional[List[str]] = Query(None),
+    wojewodztwo: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    batch_size: int = Query(5000, ge=100, le=100000),
+    exclude_flagged: bool = False,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        batches = db_service.iter_measurements(
+            kind=kind,
+            station_ids=station_id,
+            wojewodztwo=wojewodztwo,
+            date_from=date_from,
+            date_to=date_to,
+            batch_size=batch_size,
+            exclude_flagged=exclude_flagged,
+        )
+        logger.info(
+            "Starting %s export of %s measurements (stations=%s, wojewodztwo=%s)",
+            format, kind, station_id, wojewodztwo,
+        )
+        filename = f"{kind}_measurements.{format}"
+        return StreamingResponse(
+            WRITERS[format](batches, kind),
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    except Exception as e:
+        logger.error(f"Blad eksportu pomiarow: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
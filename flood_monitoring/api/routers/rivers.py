@@ -0,0 +1,95 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+
+from flood_monitoring.api.dependencies import get_database_service
+from flood_monitoring.services.database import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/rivers", tags=["rivers"])
+
+
+class RiverStationResponse(BaseModel):
+    id_stacji: str
+    stacja: str
+    rzeka: Optional[str]
+    wojewodztwo: str
+    lat: float
+    lon: float
+    kolejnosc: int
+    kilometraz: float
+    metoda: str
+
+
+class StationLagResponse(BaseModel):
+    station_a: str
+    stacja_a: str
+    station_b: str
+    stacja_b: str
+    lag_hours: float
+    korelacja: float
+    overlap_hours: int
+    computed_at: datetime
+
+"""Stacje rzeki uporzadkowane od zrodla do ujscia (kilometraz od najwyzej polozonej stacji).
+Nazwa rzeki jest normalizowana (wielkosc liter, dopiski w nawiasach)."""
+@router.get("/{name}/stations", response_model=List[RiverStationResponse])
+async def get_river_stations(
+    name: str,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        rows = db_service.get_river_index(name)
+        if not rows:
+            raise HTTPException(status_code=404, detail="Nie znaleziono rzeki")
+        return [
+            RiverStationResponse(
+                id_stacji=station.id_stacji,
+                stacja=station.stacja,
+                rzeka=station.rzeka,
+                wojewodztwo=station.wojewodztwo,
+                lat=station.lat,
+                lon=station.lon,
+                kolejnosc=entry.kolejnosc,
+                kilometraz=entry.kilometraz,
+                metoda=entry.metoda,
+            )
+            for entry, station in rows
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting stations for river %s: %s", name, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+"""Czasy dojscia fali miedzy stacjami rzeki (station_a reaguje wczesniej o lag_hours).
+Wynik analizy flood_monitoring.scripts.compute_lags, posortowany po sile korelacji."""
+@router.get("/{name}/lags", response_model=List[StationLagResponse])
+async def get_river_lags(
+    name: str,
+    min_correlation: float = Query(0.0, ge=-1, le=1),
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        return [
+            StationLagResponse(
+                station_a=lag.station_a,
+                stacja_a=upstream.stacja,
+                station_b=lag.station_b,
+                stacja_b=downstream.stacja,
+                lag_hours=lag.lag_hours,
+                korelacja=lag.korelacja,
+                overlap_hours=lag.overlap_hours,
+                computed_at=lag.computed_at,
+            )
+            for lag, upstream, downstream in db_service.get_station_lags(name, min_correlation)
+        ]
+    except Exception as e:
+        logger.error("Error getting lags for river %s: %s", name, e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,27 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from geojson import Feature, FeatureCollection, Point
 
+from flood_monitoring.api.compression import cached_response
 from flood_monitoring.api.dependencies import get_database_service
+from flood_monitoring.core.cache import json_body, response_cache
+from flood_monitoring.core.config import get_settings
 from flood_monitoring.services.database import DatabaseService
+from flood_monitoring.services.export import (
+    ARROW_STREAM_MEDIA_TYPE,
+    matrix_to_arrow_ipc,
+    series_to_arrow_ipc,
+    wants_arrow,
+)
+from flood_monitoring.services.resample import AGGREGATIONS, STEP_PATTERN, parse_step, resample_stations
+from flood_monitoring.services.trends import RATE_COLUMNS
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 router = APIRouter(prefix="/stations", tags=["stations"])
 
@@ -26,75 +38,369 @@ class Station(BaseModel):
 class StanMeasurement(BaseModel):
     stan_wody_data_pomiaru: datetime
     stan_wody: float
+    flaga: Optional[str] = None
 
 
 class PrzeplywMeasurement(BaseModel):
     przeplyw_data: datetime
     przelyw: float
+    flaga: Optional[str] = None
 
 
 class StationMeasurements(BaseModel):
     stan: List[StanMeasurement]
     przelyw: List[PrzeplywMeasurement]
 
-"""Pobieranie danych w formacie geojson"""
+
+class RisingStation(BaseModel):
+    id_stacji: str
+    stacja: str
+    rzeka: Optional[str] = None
+    wojewodztwo: str
+    stan_wody: Optional[float] = None
+    stan_wody_data_pomiaru: Optional[datetime] = None
+    tempo_1h: Optional[float] = None
+    tempo_3h: Optional[float] = None
+    tempo_6h: Optional[float] = None
+    tempo_24h: Optional[float] = None
+    trend_3h: Optional[float] = None
+    status: Optional[str] = None
+
+
+class SeriesStats(BaseModel):
+    count: int
+    min: float
+    max: float
+    mean: float
+    std: Optional[float] = None
+    p10: float
+    p25: float
+    median: float
+    p75: float
+    p90: float
+    latest: float
+    latest_time: datetime
+    delta_mean: float
+    z_score: Optional[float] = None
+
+
+class ResampledSeries(BaseModel):
+    kind: str
+    step: str
+    agg: str
+    czas: List[datetime]
+    serie: Dict[str, List[Optional[float]]]
+
+
+class ForecastPoint(BaseModel):
+    horyzont: int
+    czas: datetime
+    stan_wody: float
+    dolna: float
+    gorna: float
+
+
+class StationForecastResponse(BaseModel):
+    station_id: str
+    wygenerowano: datetime
+    prognoza: List[ForecastPoint]
+
+
+class StationStats(BaseModel):
+    station_id: str
+    days: int
+    limit: Optional[int] = None
+    stan: Optional[SeriesStats] = None
+    przelyw: Optional[SeriesStats] = None
+
+def build_stations_geojson(db_service: DatabaseService) -> FeatureCollection:
+    """Zbuduj FeatureCollection stacji z najnowszymi pomiarami"""
+    stations = db_service.get_all_stations()
+    latest_measurements = db_service.get_latest_measurements_for_all_stations()
+    states = db_service.get_station_states()
+    warning_levels = db_service.get_station_warning_levels()
+    features = []
+
+    for station in stations:
+        # Pobierz najnowsze pomiary dla tej stacji
+        station_measurements = latest_measurements.get(station.id_stacji, {})
+        
+        properties = {
+            "id_stacji": station.id_stacji,
+            "stacja": station.stacja,
+            "rzeka": station.rzeka,
+            "wojewodztwo": station.wojewodztwo
+        }
+        
+        # Dodaj najnowsze pomiary jeśli są dostępne
+        if 'stan_wody' in station_measurements:
+            properties['stan_wody'] = station_measurements['stan_wody']
+            properties['stan_wody_data_pomiaru'] = station_measurements['stan_wody_data_pomiaru'].isoformat() if station_measurements['stan_wody_data_pomiaru'] else None
+        
+        if 'przeplyw' in station_measurements:
+            properties['przeplyw'] = station_measurements['przeplyw']
+            properties['przeplyw_data'] = station_measurements['przeplyw_data'].isoformat() if station_measurements['przeplyw_data'] else None
+
+        # Tempo zmian stanu [cm/h] utrzymywane przy ingestii i status wg progów
+        state = states.get(station.id_stacji)
+        for column in RATE_COLUMNS:
+            properties[column] = getattr(state, column) if state else None
+        properties['status'] = state.status if state and state.status else 'inactive'
+        # Najwyższy stopień aktywnego ostrzeżenia hydrologicznego obejmującego stację
+        properties['poziom_ostrzezenia'] = warning_levels.get(station.id_stacji)
+        
+        feature = Feature(
+            geometry=Point((float(station.lon), float(station.lat))),
+            properties=properties
+        )
+        features.append(feature)
+
+    return FeatureCollection(features)
+
+
+"""Pobieranie danych w formacie geojson (z cache, z gotowymi wariantami skompresowanymi)"""
 @router.get("/", response_model=Dict[str, Any])
-async def get_stations(db_service: DatabaseService = Depends(get_database_service)):
+async def get_stations(request: Request, db_service: DatabaseService = Depends(get_database_service)):
 
     try:
-        stations = db_service.get_all_stations()
-        latest_measurements = db_service.get_latest_measurements_for_all_stations()
-        features = []
+        entry = response_cache.get_or_build(
+            "stations:",
+            lambda: (json_body(build_stations_geojson(db_service)), "application/json"),
+        )
+        return cached_response(request, entry, settings.COMPRESSION_MIN_SIZE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        for station in stations:
-            # Pobierz najnowsze pomiary dla tej stacji
-            station_measurements = latest_measurements.get(station.id_stacji, {})
-            
-            properties = {
-                "id_stacji": station.id_stacji,
-                "stacja": station.stacja,
-                "rzeka": station.rzeka,
-                "wojewodztwo": station.wojewodztwo
+"""Stacje o najszybciej rosnacym stanie wody (tempo cm/h w oknie 1h/3h/6h/24h)"""
+@router.get("/rising", response_model=List[RisingStation])
+async def get_rising_stations(
+    request: Request,
+    window: str = Query("3h", pattern="^(1h|3h|6h|24h)$"),
+    limit: int = Query(20, ge=1, le=500),
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        def build():
+            rows = db_service.get_rising_stations(window, limit)
+            payload = [
+                RisingStation(
+                    id_stacji=station.id_stacji,
+                    stacja=station.stacja,
+                    rzeka=station.rzeka,
+                    wojewodztwo=station.wojewodztwo,
+                    stan_wody=state.stan_wody,
+                    stan_wody_data_pomiaru=state.stan_wody_data_pomiaru,
+                    status=state.status,
+                    **{column: getattr(state, column) for column in RATE_COLUMNS},
+                ).model_dump(mode="json")
+                for station, state in rows
+            ]
+            return json_body(payload), "application/json"
+
+        entry = response_cache.get_or_build(f"rising:{window}:{limit}", build)
+        return cached_response(request, entry, settings.COMPRESSION_MIN_SIZE)
+    except Exception as e:
+        logger.error("Error getting rising stations: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def build_station_stats(
+    db_service: DatabaseService,
+    station_ids: Optional[List[str]],
+    days: int,
+    exclude_flagged: bool = False,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Statystyki stacji jako lista słowników gotowych do serializacji"""
+    stats = db_service.get_station_stats(station_ids, days, exclude_flagged, limit)
+    return [
+        StationStats(station_id=station_id, days=days, limit=limit, **series).model_dump(mode="json")
+        for station_id, series in sorted(stats.items())
+    ]
+
+
+"""Statystyki serii wielu stacji naraz (wszystkich, gdy nie podano station_id).
+limit - tylko najnowsze pomiary stacji, jak w /{station_id}?extended=true&limit=...
+Cache per (stacje, okno, czas ostatniego pomiaru) - nowy pomiar zmienia klucz."""
+@router.get("/stats", response_model=List[StationStats])
+async def get_stations_stats(
+    request: Request,
+    station_id: Optional[List[str]] = Query(None),
+    days: int = Query(7, ge=1, le=365),
+    limit: Optional[int] = Query(None, ge=1),
+    exclude_flagged: bool = False,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        station_ids = sorted(set(station_id)) if station_id else None
+        last_ingest = db_service.get_last_ingest_time()
+        key = f"stats:{','.join(station_ids or ['*'])}:{days}:{limit}:{exclude_flagged}:{last_ingest}"
+        entry = response_cache.get_or_build(
+            key,
+            lambda: (
+                json_body(build_station_stats(db_service, station_ids, days, exclude_flagged, limit)),
+                "application/json",
+            ),
+        )
+        return cached_response(request, entry, settings.COMPRESSION_MIN_SIZE)
+    except Exception as e:
+        logger.error("Error computing station stats: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+"""Serie stanu lub przeplywu kilku stacji na wspolnej siatce czasu (krok step, agregacja agg).
+Luki do max_gap krokow sa interpolowane liniowo, reszta to null. JSON kolumnowy
+albo jeden RecordBatch Arrow IPC (kolumna czas + kolumna na stacje)."""
+@router.get("/resample", response_model=ResampledSeries)
+async def get_resampled_series(
+    request: Request,
+    station_id: Optional[List[str]] = Query(None, max_length=50),
+    kind: str = Query("stan", pattern="^(stan|przeplyw)$"),
+    days: int = Query(7, ge=1, le=365),
+    step: str = Query("1h", pattern=STEP_PATTERN),
+    agg: str = Query("mean", pattern=f"^({'|'.join(AGGREGATIONS)})$"),
+    max_gap: int = Query(3, ge=0, le=1000),
+    exclude_flagged: bool = False,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    if not station_id:
+        raise HTTPException(status_code=422, detail="Podaj co najmniej jeden station_id")
+    station_ids = list(dict.fromkeys(station_id))
+    end = datetime.now()
+    start = end - timedelta(days=days)
+
+    def compute():
+        batches = db_service.iter_measurements(
+            kind, station_ids, date_from=start, exclude_flagged=exclude_flagged
+        )
+        return resample_stations(batches, station_ids, start, end, step, agg, max_gap)
+
+    try:
+        if wants_arrow(request.headers.get("accept")):
+            grid, columns = compute()
+            return Response(
+                content=matrix_to_arrow_ipc(grid, columns),
+                media_type=ARROW_STREAM_MEDIA_TYPE,
+                headers={"Vary": "Accept"},
+            )
+
+        def build():
+            grid, columns = compute()
+            payload = {
+                "kind": kind,
+                "step": step,
+                "agg": agg,
+                "czas": [timestamp.isoformat() for timestamp in grid],
+                "serie": {
+                    sid: [None if value != value else float(value) for value in values.tolist()]
+                    for sid, values in columns.items()
+                },
             }
-            
-            # Dodaj najnowsze pomiary jeśli są dostępne
-            if 'stan_wody' in station_measurements:
-                properties['stan_wody'] = station_measurements['stan_wody']
-                properties['stan_wody_data_pomiaru'] = station_measurements['stan_wody_data_pomiaru'].isoformat() if station_measurements['stan_wody_data_pomiaru'] else None
-            
-            if 'przeplyw' in station_measurements:
-                properties['przeplyw'] = station_measurements['przeplyw']
-                properties['przeplyw_data'] = station_measurements['przeplyw_data'].isoformat() if station_measurements['przeplyw_data'] else None
-            
-            feature = Feature(
-                geometry=Point((float(station.lon), float(station.lat))),
-                properties=properties
+            return json_body(payload), "application/json"
+
+        # Siatka przesuwa się co krok, więc klucz obejmuje bieżący slot i czas ostatniego pomiaru
+        last_ingest = db_service.get_last_ingest_time()
+        slot = int(end.timestamp() // parse_step(step).total_seconds())
+        key = f"resample:{','.join(station_ids)}:{kind}:{days}:{step}:{agg}:{max_gap}:{exclude_flagged}:{last_ingest}:{slot}"
+        entry = response_cache.get_or_build(key, build)
+        return cached_response(request, entry, settings.COMPRESSION_MIN_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error("Error resampling series for stations %s: %s", station_ids, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+"""Statystyki serii stanu i przeplywu jednej stacji w oknie days; z limitem tylko z najnowszych
+pomiarow - tego samego okna, ktore pokazuje wykres z /{station_id}?extended=true&limit=..."""
+@router.get("/{station_id}/stats", response_model=StationStats)
+async def get_station_stats(
+    request: Request,
+    station_id: str,
+    days: int = Query(7, ge=1, le=365),
+    limit: Optional[int] = Query(None, ge=1),
+    exclude_flagged: bool = False,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        last_ingest = db_service.get_last_ingest_time(station_id)
+        key = f"stats:{station_id}:{days}:{limit}:{exclude_flagged}:{last_ingest}"
+
+        def build():
+            stats = build_station_stats(db_service, [station_id], days, exclude_flagged, limit)
+            payload = (
+                stats[0] if stats
+                else StationStats(station_id=station_id, days=days, limit=limit).model_dump(mode="json")
             )
-            features.append(feature)
+            return json_body(payload), "application/json"
 
-        geojson = FeatureCollection(features)
-        return geojson
+        entry = response_cache.get_or_build(key, build)
+        return cached_response(request, entry, settings.COMPRESSION_MIN_SIZE)
+    except Exception as e:
+        logger.error("Error computing stats for station %s: %s", station_id, e)
+        raise HTTPException(status_code=500, detail=str(e))
 
+"""Prognoza stanu wody stacji na kolejne godziny (model AR z uwzglednieniem stacji powyzej),
+przeliczana po kazdej synchronizacji. dolna/gorna - przyblizony przedzial 95%."""
+@router.get("/{station_id}/forecast", response_model=StationForecastResponse)
+async def get_station_forecast(
+    station_id: str,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        forecast = db_service.get_station_forecast(station_id)
+        if not forecast:
+            raise HTTPException(status_code=404, detail="Brak prognozy dla stacji")
+        return StationForecastResponse(
+            station_id=station_id,
+            wygenerowano=forecast[0].wygenerowano,
+            prognoza=[
+                ForecastPoint(
+                    horyzont=point.horyzont,
+                    czas=point.czas,
+                    stan_wody=point.stan_wody,
+                    dolna=point.dolna,
+                    gorna=point.gorna,
+                )
+                for point in forecast
+            ],
+        )
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.error("Error getting forecast for station %s: %s", station_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
-"""Dane dla pojedynczej stacji"""
+"""Dane dla pojedynczej stacji (JSON lub Arrow IPC przy Accept: application/vnd.apache.arrow.stream).
+exclude_flagged=true pomija odczyty oznaczone przez detektor jako podejrzane."""
 @router.get("/{station_id}", response_model=StationMeasurements)
 async def get_station_data(
+    request: Request,
     station_id: str,
     days: int = 7,
     extended: bool = False,
     limit: int = 100,
+    exclude_flagged: bool = False,
     db_service: DatabaseService = Depends(get_database_service),
 ):
 
     try:
         logger.info(f"Received request for station {station_id} data (extended={extended}, days={days}, limit={limit})")
-        
+
+        if wants_arrow(request.headers.get("accept")):
+            series = db_service.get_station_series(station_id, days, limit if extended else None, exclude_flagged)
+            return Response(
+                content=series_to_arrow_ipc(series),
+                media_type=ARROW_STREAM_MEDIA_TYPE,
+                headers={"Vary": "Accept"},
+            )
+
         if extended:
-            measurements = db_service.get_station_measurements_extended(station_id, days, limit)
+            measurements = db_service.get_station_measurements_extended(station_id, days, limit, exclude_flagged)
         else:
-            measurements = db_service.get_station_measurements(station_id, days)
+            measurements = db_service.get_station_measurements(station_id, days, exclude_flagged)
             
         logger.info(f"Sending response for station {station_id}: {len(measurements.get('stan', []))} stan measurements, {len(measurements.get('przelyw', []))} flow measurements")
         return measurements
@@ -1,24 +1,85 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from flood_monitoring.services.events import invalidate_response_cache
+from flood_monitoring.services.forecast import compute_forecasts
 from flood_monitoring.services.imgw import IMGWService
 from flood_monitoring.api.dependencies import get_imgw_service
+from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.locks import SYNC_RUN_LOCK, AdvisoryLock
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Literal, Optional
 
 router = APIRouter(prefix="/sync", tags=["sync"])
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
-"""Pomiary dla stacji w tle"""
+
+class Gap(BaseModel):
+    station_id: str
+    gap_start: datetime
+    gap_end: datetime
+    missing_slots: int
+    cadence_minutes: int
+
+
+async def refresh_station_statuses(imgw_service: IMGWService):
+    """Przelicz statusy stacji (alarm/warning/active/inactive) po zapisaniu nowych pomiarow (w puli watkow)"""
+    db_service = imgw_service.db_service
+    try:
+        await run_in_threadpool(db_service.refresh_station_statuses, settings.STATION_INACTIVE_AFTER_HOURS)
+    except Exception as e:
+        await run_in_threadpool(db_service.db.rollback)
+        logger.error("Blad przeliczania statusow stacji: %s", e)
+
+async def refresh_forecasts(imgw_service: IMGWService):
+    """Przelicz prognozy stanu wody wszystkich stacji (obliczenia w puli watkow, poza petla zdarzen)"""
+    if settings.FORECAST_HORIZON_HOURS <= 0:
+        return
+    db_service = imgw_service.db_service
+
+    def run():
+        rows = compute_forecasts(
+            db_service,
+            horizon=settings.FORECAST_HORIZON_HOURS,
+            order=settings.FORECAST_AR_ORDER,
+            days=settings.FORECAST_HISTORY_DAYS,
+        )
+        db_service.replace_forecasts(rows)
+
+    try:
+        await run_in_threadpool(run)
+    except Exception as e:
+        await run_in_threadpool(db_service.db.rollback)
+        logger.error("Blad przeliczania prognoz: %s", e)
+
+"""Pomiary dla stacji w tle (najwyzej jeden przebieg naraz we wszystkich workerach)"""
 async def sync_all_measurements(imgw_service: IMGWService, days: int = 7):
 
+    async with AdvisoryLock(SYNC_RUN_LOCK) as acquired:
+        if not acquired:
+            logger.info("Synchronizacja juz trwa w innym procesie - pomijam")
+            return
+        await _sync_all_measurements(imgw_service, days)
+
+
+async def _sync_all_measurements(imgw_service: IMGWService, days: int):
+    stats = imgw_service.start_sync_run()
     try:
         stations = await imgw_service.get_stations()
         for station in stations:
             try:
                 await imgw_service.get_station_data(station["id_stacji"], days=days)
             except Exception as e:
-                logger.error(f"Blad synchronizacji stacji {station['id_stacji']}: {str(e)}")
+                stats.record_error(station["id_stacji"], e)
     except Exception as e:
-        logger.error(f"Blad pobierania: {str(e)}")
+        logger.error("Blad pobierania: %s", e)
+    finally:
+        await refresh_station_statuses(imgw_service)
+        await refresh_forecasts(imgw_service)
+        invalidate_response_cache()
+        stats.log_summary("all")
 """Wszystkie dane z imgw"""
 @router.post("/all")
 async def sync_all_data(background_tasks: BackgroundTasks, days: int = 7, imgw_service: IMGWService = Depends(get_imgw_service)):
@@ -35,6 +96,7 @@ async def sync_all_data(background_tasks: BackgroundTasks, days: int = 7, imgw_s
 async def sync_stations(imgw_service: IMGWService = Depends(get_imgw_service)):
 
     try:
+        stats = imgw_service.start_sync_run()
         stations = await imgw_service.get_stations()
         stan_count = 0
         przeplyw_count = 0
@@ -42,11 +104,13 @@ async def sync_stations(imgw_service: IMGWService = Depends(get_imgw_service)):
             try:
                 measurement_stan = await imgw_service.get_station_data_stan(station["id_stacji"], days=7)
                 measurement_przelyw = await imgw_service.get_station_data_przelyw(station["id_stacji"], days=7)
-                stan_count += len(measurement_stan["stan_wody"])
-                przeplyw_count += len(measurement_przelyw["przelyw"])
-                logger.info(f"Synchronizowano pomiary dla stacji {station['id_stacji']}: {len(measurement_stan['stan_wody'])} stan, {len(measurement_przelyw['przelyw'])} przelyw")
+                stan_count += len(measurement_stan.get("stan_wody", []))
+                przeplyw_count += len(measurement_przelyw.get("przelyw", []))
             except Exception as e:
-                logger.error(f"Blad synchronizacji dla stacji {station['id_stacji']}: {str(e)}")
+                stats.record_error(station["id_stacji"], e)
+        await refresh_station_statuses(imgw_service)
+        invalidate_response_cache()
+        stats.log_summary("stations")
         return {
             "message": f"Zaktualizowano {len(stations)} stacji, {stan_count} pomiarow, {przeplyw_count} przeplywow"
         }
@@ -60,6 +124,8 @@ async def sync_station_data(station_id: str, days: int = 7, imgw_service: IMGWSe
 
     try:
         measurements = await imgw_service.get_station_data(station_id, days)
+        await refresh_station_statuses(imgw_service)
+        invalidate_response_cache()
         return {"message": f"Zaktualizowano dane dla stacji {station_id}"}
     except Exception as e:
         logger.error(f"Blad synchronizacja dla:  {station_id}: {str(e)}")
@@ -71,7 +137,77 @@ async def sync_warnings(imgw_service: IMGWService = Depends(get_imgw_service)):
 
     try:
         await imgw_service.sync_warnings()
+        invalidate_response_cache("warnings:", "stations:")
         return {"message": "Ostrzezenia zsynchronizowane"}
     except Exception as e:
         logger.error(f"Blad synchronizacji: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+"""Luki w seriach pomiarow wszystkich stacji (oczekiwany rytm = mediana odstepow stacji)"""
+@router.get("/gaps", response_model=List[Gap])
+async def get_gaps(
+    kind: Literal["stan", "przeplyw"] = "stan",
+    hours: int = Query(24, ge=1, le=24 * 31),
+    station_id: Optional[List[str]] = Query(None),
+    min_slots: int = Query(1, ge=1),
+    imgw_service: IMGWService = Depends(get_imgw_service),
+):
+
+    try:
+        return imgw_service.db_service.find_gaps(
+            kind=kind, hours=hours, station_ids=station_id, min_slots=min_slots
+        )
+    except Exception as e:
+        logger.error("Blad wyszukiwania luk: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+"""Ponowna synchronizacja tylko stacji, którym brakuje najnowszego odczytu"""
+async def backfill_stations(imgw_service: IMGWService, station_ids: List[str], days: int = 7):
+
+    async with AdvisoryLock(SYNC_RUN_LOCK) as acquired:
+        if not acquired:
+            logger.info("Synchronizacja juz trwa w innym procesie - pomijam uzupelnianie luk")
+            return
+        stats = imgw_service.start_sync_run()
+        stats.stations = len(station_ids)
+        for station_id in station_ids:
+            try:
+                await imgw_service.get_station_data(station_id, days=days)
+            except Exception as e:
+                stats.record_error(station_id, e)
+        await refresh_station_statuses(imgw_service)
+        invalidate_response_cache()
+        stats.log_summary("backfill")
+
+
+"""Uzupelnianie luk: API IMGW udostepnia wylacznie najnowszy odczyt stacji, wiec da sie
+uzupelnic tylko luki konczace sie na biezacym slocie (stacja nie ma jeszcze ostatniego
+pomiaru). Tylko dla takich stacji planowana jest synchronizacja w tle; wczesniejsze luki
+sa zwracane jako nieodzyskiwalne (szczegoly w GET /sync/gaps)."""
+@router.post("/backfill")
+async def backfill(
+    background_tasks: BackgroundTasks,
+    kind: Literal["stan", "przeplyw"] = "stan",
+    hours: int = Query(24, ge=1, le=24 * 31),
+    imgw_service: IMGWService = Depends(get_imgw_service),
+):
+
+    try:
+        gaps = imgw_service.db_service.find_gaps(kind=kind, hours=hours)
+        current_slot = datetime.now().replace(minute=0, second=0, microsecond=0)
+        trailing = [gap for gap in gaps if gap["gap_end"] >= current_slot]
+        station_ids = sorted({gap["station_id"] for gap in trailing})
+        if station_ids:
+            background_tasks.add_task(backfill_stations, imgw_service, station_ids)
+        return {
+            "message": (
+                f"Pobieranie biezacego odczytu w tle dla {len(station_ids)} stacji; "
+                f"{len(gaps) - len(trailing)} wczesniejszych luk nie da sie uzupelnic z API IMGW"
+            ),
+            "gaps": len(trailing),
+            "unrecoverable_gaps": len(gaps) - len(trailing),
+            "stations": station_ids,
+        }
+    except Exception as e:
+        logger.error("Blad planowania uzupelniania luk: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
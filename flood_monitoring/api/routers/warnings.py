@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel  # Add this import
 from datetime import datetime
 
+from flood_monitoring.api.compression import cached_response
 from flood_monitoring.api.dependencies import get_database_service
+from flood_monitoring.core.cache import json_body, response_cache
+from flood_monitoring.core.config import get_settings
 from flood_monitoring.services.database import DatabaseService
 from flood_monitoring.models.warnings import HydroWarning, WarningArea
 
+settings = get_settings()
+
 router = APIRouter(prefix="/warnings", tags=["warnings"])
 
 
@@ -30,12 +35,22 @@ class WarningResponse(BaseModel):
     komentarz: str
     obszary: List[WarningAreaResponse]
 
-"""Pobieranie listy ostrzezen"""
+"""Pobieranie listy ostrzezen (filtry: wojewodztwo, kod zlewni, prefiks kodu zlewni)"""
 @router.get("/", response_model=List[WarningResponse])
-async def get_warnings(db_service: DatabaseService = Depends(get_database_service)):
+async def get_warnings(
+    request: Request,
+    wojewodztwo: Optional[str] = None,
+    kod_zlewni: Optional[str] = None,
+    kod_zlewni_prefix: Optional[str] = None,
+    db_service: DatabaseService = Depends(get_database_service),
+):
 
-    try:
-        warnings = db_service.get_all_warnings()
+    def build():
+        warnings = db_service.get_warnings(
+            wojewodztwo=wojewodztwo,
+            kod_zlewni=kod_zlewni,
+            kod_zlewni_prefix=kod_zlewni_prefix,
+        )
         response = []
         for warning in warnings:
             areas = [
@@ -59,9 +74,41 @@ async def get_warnings(db_service: DatabaseService = Depends(get_database_servic
                     przebieg=warning.przebieg,
                     komentarz=warning.komentarz,
                     obszary=areas
-                )
+                ).model_dump(mode="json")
             )
-        return response
+        return json_body(response), "application/json"
+
+    try:
+        entry = response_cache.get_or_build(f"warnings:{request.url.query}", build)
+        return cached_response(request, entry, settings.COMPRESSION_MIN_SIZE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class WarningStationResponse(BaseModel):
+    id_stacji: str
+    stacja: str
+    rzeka: Optional[str] = None
+    wojewodztwo: str
+    dopasowanie: str
+
+"""Stacje objete ostrzezeniem (dopasowanie po kodzie zlewni lub wojewodztwie)"""
+@router.get("/{warning_id}/stations", response_model=List[WarningStationResponse])
+async def get_warning_stations(
+    warning_id: int,
+    db_service: DatabaseService = Depends(get_database_service),
+):
+
+    try:
+        return [
+            WarningStationResponse(
+                id_stacji=station.id_stacji,
+                stacja=station.stacja,
+                rzeka=station.rzeka,
+                wojewodztwo=station.wojewodztwo,
+                dopasowanie=dopasowanie,
+            )
+            for station, dopasowanie in db_service.get_warning_stations(warning_id)
+        ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
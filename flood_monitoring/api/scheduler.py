@@ -0,0 +1,76 @@
+"""
+Okresowa synchronizacja z IMGW uruchamiana w dokładnie jednym workerze
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from flood_monitoring.api.routers.sync import sync_all_measurements
+from flood_monitoring.core.database import SessionLocal
+from flood_monitoring.core.locks import INGESTION_LEADER_LOCK, AdvisoryLock
+from flood_monitoring.services.database import DatabaseService
+from flood_monitoring.services.events import invalidate_response_cache
+from flood_monitoring.services.imgw import IMGWService
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionScheduler:
+    """Zadanie w tle uruchamiane w każdym workerze; synchronizuje tylko lider.
+
+    Liderem jest worker, który trzyma blokadę doradczą INGESTION_LEADER_LOCK.
+    Pozostałe co interwał próbują ją przejąć, więc po awarii lidera (zamknięte
+    połączenie zwalnia blokadę) synchronizację przejmuje inny worker.
+    """
+
+    def __init__(self, interval: float, days: int = 7):
+        self.interval = interval
+        self.days = days
+        self._leader = AdvisoryLock(INGESTION_LEADER_LOCK)
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        db = SessionLocal()
+        try:
+            imgw_service = IMGWService(DatabaseService(db))
+            await sync_all_measurements(imgw_service, days=self.days)
+            await imgw_service.sync_warnings()
+            invalidate_response_cache("warnings:", "stations:")
+        finally:
+            db.close()
+
+    async def _is_leader(self) -> bool:
+        if self._leader.held and await run_in_threadpool(self._leader.is_alive):
+            return True
+        if await run_in_threadpool(self._leader.try_acquire):
+            logger.info("Worker %d przejmuje okresowa synchronizacje", os.getpid())
+            return True
+        return False
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._is_leader():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Blad okresowej synchronizacji: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self._leader.release)
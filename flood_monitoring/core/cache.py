@@ -0,0 +1,94 @@
+"""
+Pamięć podręczna odpowiedzi API (w obrębie procesu)
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.metrics import CACHE_LOOKUPS
+
+settings = get_settings()
+
+
+def json_body(payload: Any) -> bytes:
+    """Zserializuj dane do zwartego JSON (daty jako ISO 8601)"""
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=lambda value: value.isoformat() if hasattr(value, "isoformat") else str(value),
+    ).encode("utf-8")
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    media_type: str
+    created: float = field(default_factory=time.monotonic)
+    # Skompresowane warianty body, klucz to nazwa kodowania (gzip / br)
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+
+class ResponseCache:
+    """Ograniczony cache LRU z TTL dla gotowych (zserializowanych) odpowiedzi"""
+
+    def __init__(self, name: str, ttl: float, max_entries: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.created > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                CACHE_LOOKUPS.labels(self.name, "miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_LOOKUPS.labels(self.name, "hit").inc()
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> CacheEntry:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_or_build(
+        self, key: str, builder: Callable[[], Tuple[bytes, str]]
+    ) -> CacheEntry:
+        """Zwróć wpis z cache lub zbuduj go funkcją builder() -> (body, media_type)"""
+        entry = self.get(key)
+        if entry is None:
+            body, media_type = builder()
+            entry = self.set(key, CacheEntry(body=body, media_type=media_type))
+        return entry
+
+    def invalidate(self, prefix: str = ""):
+        """Usuń wpisy zaczynające się od prefiksu (domyślnie wszystkie)"""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache(
+    "responses",
+    ttl=settings.RESPONSE_CACHE_TTL, max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES
+)
@@ -16,6 +16,54 @@ class Settings(BaseSettings):
     IMGW_API_URL: str = "https://danepubliczne.imgw.pl/api/data/hydro/"
     IMGW_WARNINGS_URL:str = "https://danepubliczne.imgw.pl/api/data/warningshydro"
 
+    # Pula połączeń na proces (w trybie produkcyjnym pomnożona przez liczbę workerów)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+
+    # Okresowa synchronizacja z IMGW w tle co tyle sekund (0 = tylko ręcznie przez /sync)
+    SYNC_INTERVAL: int = 0
+
+    # Status stacji: brak odczytu przez tyle godzin = inactive; plik CSV ze stanami
+    # ostrzegawczymi/alarmowymi wczytywany przy inicjalizacji bazy (jeśli istnieje)
+    STATION_INACTIVE_AFTER_HOURS: int = 6
+    STATION_THRESHOLDS_FILE: str = "data/station_thresholds.csv"
+
+    # Analiza opóźnień fali między stacjami rzeki: okno danych (dni), maksymalne
+    # opóźnienie i minimalna liczba wspólnych godzin; procesy analizy (0 = liczba rdzeni)
+    LAG_WINDOW_DAYS: int = 30
+    LAG_MAX_HOURS: int = 72
+    LAG_MIN_OVERLAP_HOURS: int = 48
+    ANALYSIS_WORKERS: int = 0
+
+    # Prognoza stanu wody po każdej synchronizacji: horyzont [h] (0 = wyłączona),
+    # rząd modelu AR i długość historii do dopasowania [dni]
+    FORECAST_HORIZON_HOURS: int = 12
+    FORECAST_AR_ORDER: int = 3
+    FORECAST_HISTORY_DAYS: int = 7
+
+    # Linie rzek do porządkowania stacji (plik czytany przez geopandas, opcjonalny),
+    # kolumna z nazwą rzeki i maksymalna odległość stacji od linii w metrach
+    RIVER_LINES_FILE: str = "data/rivers.gpkg"
+    RIVER_LINES_NAME_COLUMN: str = "nazwa"
+    RIVER_LINE_MAX_DISTANCE_M: float = 2000
+
+    # Rozsyłanie zdarzeń SSE i unieważnień cache między workerami przez LISTEN/NOTIFY PostgreSQL
+    EVENTS_PG_NOTIFY: bool = False
+
+    # Log wolnych zapytań: próg w ms (0 = wyłączony), rozmiar bufora, plan EXPLAIN w tle
+    SLOW_QUERY_THRESHOLD_MS: int = 0
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN: bool = True
+
+    # Co ile sekund sprawdzać w tle dostępność API IMGW
+    IMGW_PROBE_INTERVAL: int = 60
+
+    # Kompresja odpowiedzi i cache gotowych odpowiedzi (bajty / sekundy / liczba wpisów).
+    # Bez EVENTS_PG_NOTIFY TTL to jedyne ograniczenie nieaktualności cache w pozostałych workerach
+    COMPRESSION_MIN_SIZE: int = 1024
+    RESPONSE_CACHE_TTL: int = 60
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -1,17 +1,140 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 
 from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.metrics import DB_STATEMENT_DURATION
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(
+    settings.DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Opcja wykonania oznaczająca zapytania pomijane przez log wolnych zapytań (np. sam EXPLAIN)
+SKIP_SLOW_QUERY_LOG = "skip_slow_query_log"
+
+
+class SlowQueryLog:
+    """Ograniczony bufor cykliczny wolnych zapytań z planem EXPLAIN zbieranym w tle.
+
+    Plan jest pobierany osobnym połączeniem w jednym wątku roboczym, więc nie
+    spowalnia żądania, które wykonało wolne zapytanie. Gdy w kolejce czeka już
+    kilka planów, kolejne zapytania są zapisywane bez planu.
+
+    Używany jest zwykły EXPLAIN (bez ANALYZE), bo zapytanie nie może zostać
+    wykonane drugi raz - SELECT-y wołają też pg_advisory_lock, pg_notify czy
+    nextval, których skutków nie cofa wycofanie transakcji. Parametry zapytania
+    trafiają tylko do EXPLAIN i nie są zapisywane w logu.
+    """
+
+    MAX_PENDING_EXPLAINS = 4
+
+    def __init__(self, threshold_ms: int, size: int, explain: bool):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._entries: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def record(self, statement: str, parameters: Any, duration_ms: float, executemany: bool):
+        entry = {
+            "recorded_at": datetime.now().isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "statement": statement,
+            "plan": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            can_explain = (
+                self.explain
+                and not executemany
+                and statement.lstrip().upper().startswith(("SELECT", "WITH"))
+                and self._pending < self.MAX_PENDING_EXPLAINS
+            )
+            if can_explain:
+                self._pending += 1
+        logger.warning("Slow query (%.1f ms): %s", duration_ms, statement[:200])
+
+        if can_explain:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+            self._executor.submit(self._explain, entry, statement, parameters)
+
+    def _explain(self, entry: Dict[str, Any], statement: str, parameters: Any):
+        try:
+            with engine.connect() as connection:
+                connection = connection.execution_options(**{SKIP_SLOW_QUERY_LOG: True})
+                rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+            entry["plan"] = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            entry["plan"] = f"EXPLAIN failed: {str(e)}"
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    size=settings.SLOW_QUERY_LOG_SIZE,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else "UNKNOWN"
+    DB_STATEMENT_DURATION.labels(operation).observe(elapsed)
+
+    if (
+        slow_query_log.enabled
+        and elapsed * 1000 >= slow_query_log.threshold_ms
+        and not conn.get_execution_options().get(SKIP_SLOW_QUERY_LOG)
+    ):
+        slow_query_log.record(statement, parameters, elapsed * 1000, executemany)
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
 
 def get_db() -> Session:
     db = SessionLocal()
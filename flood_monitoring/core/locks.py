@@ -0,0 +1,98 @@
+"""
+Blokady doradcze PostgreSQL - koordynacja zadań między workerami i kontenerami
+"""
+import logging
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from flood_monitoring.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Klucze blokad (stałe 64-bitowe, wspólne dla wszystkich procesów aplikacji)
+INGESTION_LEADER_LOCK = 0x464C4F4F44_01
+SYNC_RUN_LOCK = 0x464C4F4F44_02
+
+
+class AdvisoryLock:
+    """Blokada na poziomie sesji trzymana na osobnym połączeniu z puli.
+
+    Blokada żyje tak długo jak połączenie - gdy proces, który ją trzyma, zginie,
+    PostgreSQL zwalnia ją sam. Przed oddaniem połączenia do puli blokada jest
+    jawnie zwalniana (reset połączenia w puli robi tylko ROLLBACK).
+    W kodzie asynchronicznym używamy "async with" - połączenie i zapytanie
+    wykonują się wtedy w puli wątków, a nie w pętli zdarzeń.
+    """
+
+    def __init__(self, key: int):
+        self.key = key
+        self._connection: Optional[Connection] = None
+
+    @property
+    def held(self) -> bool:
+        return self._connection is not None
+
+    def try_acquire(self) -> bool:
+        if self.held:
+            return True
+        connection = engine.connect()
+        try:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+            ).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if acquired:
+            self._connection = connection
+        else:
+            connection.close()
+        return bool(acquired)
+
+    def is_alive(self) -> bool:
+        """Sprawdź, czy połączenie trzymające blokadę nadal działa (np. po restarcie bazy)"""
+        if not self.held:
+            return False
+        try:
+            self._connection.execute(text("SELECT 1"))
+            self._connection.commit()
+            return True
+        except Exception as e:
+            logger.warning("Lost connection holding advisory lock %s: %s", self.key, e)
+            self._discard()
+            return False
+
+    def release(self):
+        if not self.held:
+            return
+        try:
+            self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            self._connection.commit()
+            self._connection.close()
+        except Exception as e:
+            logger.warning("Error releasing advisory lock %s: %s", self.key, e)
+            self._discard()
+        self._connection = None
+
+    def _discard(self):
+        try:
+            self._connection.invalidate()
+        except Exception:
+            pass
+        self._connection = None
+
+    def __enter__(self) -> bool:
+        return self.try_acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    async def __aenter__(self) -> bool:
+        return await run_in_threadpool(self.try_acquire)
+
+    async def __aexit__(self, *exc_info):
+        await run_in_threadpool(self.release)
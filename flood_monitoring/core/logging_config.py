@@ -0,0 +1,100 @@
+"""
+Konfiguracja logowania: nieblokująca kolejka + format tekstowy lub JSON
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Atrybuty, które ma każdy LogRecord - wszystko poza nimi to pola przekazane przez extra=
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_config: Optional[tuple] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden obiekt JSON na linię; pola z extra= trafiają na najwyższy poziom"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, który nie formatuje wiadomości w wątku wywołującym.
+
+    Standardowy QueueHandler.prepare() wywołuje format() przed włożeniem rekordu
+    do kolejki; tutaj formatowanie (i interpolacja argumentów) odbywa się dopiero
+    w wątku QueueListenera.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", log_format: str = "text"):
+    """Skonfiguruj logger główny: rekordy trafiają do kolejki, zapis na stdout w osobnym wątku"""
+    global _listener, _config
+
+    if _listener is not None:
+        return
+    _config = (level, log_format)
+
+    handler = logging.StreamHandler(sys.stdout)
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_DeferredFormatQueueHandler(log_queue)]
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_after_fork():
+    # Wątek listenera nie przechodzi przez fork (gunicorn --preload): proces potomny
+    # dostaje nową kolejkę i własny wątek zapisujący
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    setup_logging(*_config)
+
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_after_fork)
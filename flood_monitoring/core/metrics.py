@@ -0,0 +1,115 @@
+"""
+Metryki aplikacji w formacie Prometheus (API, baza danych, ingestia, cache)
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HTTP_REQUEST_DURATION = Histogram(
+    "flood_http_request_duration_seconds",
+    "Czas obsługi żądań HTTP",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_STATEMENT_DURATION = Histogram(
+    "flood_db_statement_duration_seconds",
+    "Czas wykonania zapytań SQL",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+INGEST_STATIONS_FETCHED = Counter(
+    "flood_ingest_stations_fetched_total", "Liczba stacji pobranych z IMGW"
+)
+INGEST_READINGS = Counter(
+    "flood_ingest_readings_total",
+    "Pomiary przetworzone podczas ingestii",
+    ["kind", "result"],
+)
+INGEST_FLAGGED = Counter(
+    "flood_ingest_flagged_readings_total",
+    "Odczyty oznaczone przez detektor jako podejrzane",
+    ["kind", "flag"],
+)
+IMGW_REQUEST_DURATION = Histogram(
+    "flood_imgw_request_duration_seconds",
+    "Czas odpowiedzi API IMGW",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+IMGW_REQUEST_ERRORS = Counter(
+    "flood_imgw_request_errors_total",
+    "Błędy zapytań do API IMGW (wyjątki i statusy inne niż 200)",
+    ["endpoint"],
+)
+CACHE_LOOKUPS = Counter(
+    "flood_cache_lookups_total", "Odczyty z cache", ["cache", "result"]
+)
+
+
+@contextmanager
+def track_imgw_request(endpoint: str):
+    """Mierz czas zapytania do IMGW; wyjątek liczony jest jako błąd"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        IMGW_REQUEST_ERRORS.labels(endpoint).inc()
+        raise
+    finally:
+        IMGW_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> tuple:
+    """Zwraca (body, content_type) dla endpointu /metrics.
+
+    Przy kilku workerach (ustawione PROMETHEUS_MULTIPROC_DIR) metryki są sumowane
+    z plików wszystkich procesów, a nie tylko workera obsługującego żądanie.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Middleware ASGI mierzące czas żądań; etykietą jest szablon ścieżki, nie surowy URL"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            ).observe(time.perf_counter() - started)
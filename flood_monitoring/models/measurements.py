@@ -14,6 +14,8 @@ class StanMeasurement(Base):
     station_id = Column(String, ForeignKey("stations.id_stacji"), nullable=False)
     stan_wody_data_pomiaru = Column(DateTime, nullable=False)
     stan_wody = Column(Float, nullable=False)
+    # Flaga jakości z detektora przy ingestii (pik / linia_plaska / skok_jednostek), NULL = poprawny
+    flaga = Column(String)
 
     station = relationship("Station", back_populates="stan_measurements")
 
@@ -38,6 +40,7 @@ class PrzeplywMeasurement(Base):
     station_id = Column(String, ForeignKey("stations.id_stacji"), nullable=False)
     przeplyw_data = Column(DateTime, nullable=False)
     przelyw = Column(Float, nullable=False)
+    flaga = Column(String)
 
     station = relationship("Station", back_populates="przeplyw_measurements")
 
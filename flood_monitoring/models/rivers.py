@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, PrimaryKeyConstraint, String
+
+from flood_monitoring.core.database import Base
+
+
+class StationLag(Base):
+    """Opóźnienie fali między dwiema stacjami na tej samej rzece.
+
+    station_a to stacja, na której zmiany stanu pojawiają się wcześniej (wyżej na
+    rzece), lag_hours to czas dojścia zmian do station_b. korelacja to szczyt
+    korelacji wzajemnej zmian godzinowych, overlap_hours - liczba godzin wspólnych danych.
+    """
+
+    __tablename__ = "station_lags"
+
+    station_a = Column(String, ForeignKey("stations.id_stacji"), nullable=False)
+    station_b = Column(String, ForeignKey("stations.id_stacji"), nullable=False)
+    rzeka = Column(String, nullable=False)
+    lag_hours = Column(Float, nullable=False)
+    korelacja = Column(Float, nullable=False)
+    overlap_hours = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("station_a", "station_b"),
+        Index("ix_station_lags_rzeka", "rzeka"),
+    )
+
+    def __repr__(self):
+        return f"<StationLag(station_a='{self.station_a}', station_b='{self.station_b}', lag_hours={self.lag_hours})>"
+
+
+class RiverStation(Base):
+    """Położenie stacji na rzece: kolejność od źródła do ujścia i kilometraż (km od
+    najwyżej położonej stacji rzeki). metoda: "linia" (rzut na linię rzeki z pliku)
+    albo "heurystyka" (oś rozrzutu stacji, kierunek z opóźnień fali).
+    """
+
+    __tablename__ = "river_stations"
+
+    station_id = Column(String, ForeignKey("stations.id_stacji"), primary_key=True)
+    rzeka = Column(String, nullable=False)
+    kolejnosc = Column(Integer, nullable=False)
+    kilometraz = Column(Float, nullable=False)
+    metoda = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (Index("ix_river_stations_rzeka_kolejnosc", "rzeka", "kolejnosc"),)
+
+    def __repr__(self):
+        return f"<RiverStation(station_id='{self.station_id}', rzeka='{self.rzeka}', kolejnosc={self.kolejnosc})>"
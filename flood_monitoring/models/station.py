@@ -1,5 +1,8 @@
+from datetime import datetime
+
 from geoalchemy2 import Geometry
-from sqlalchemy import Column, Float, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, PrimaryKeyConstraint, String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from flood_monitoring.core.database import Base
@@ -16,11 +19,92 @@ class Station(Base):
     lon = Column(Float, nullable=False)
     geom = Column(Geometry("POINT", srid=4326), nullable=False)
     wojewodztwo = Column(String, nullable=False)
+    # Kod zlewni stacji (jeśli znany) - dopasowanie do obszarów ostrzeżeń
+    kod_zlewni = Column(String)
 
     stan_measurements = relationship("StanMeasurement", back_populates="station")
     przeplyw_measurements = relationship(
         "PrzeplywMeasurement", back_populates="station"
     )
+    state = relationship("StationState", back_populates="station", uselist=False)
+    threshold = relationship("StationThreshold", back_populates="station", uselist=False)
 
     def __repr__(self):
         return f"<Station(id_stacji='{self.id_stacji}', stacja='{self.stacja}')>"
+
+
+class StationState(Base):
+    """Bieżący stan stacji aktualizowany przyrostowo przy każdym nowym odczycie.
+
+    Tempo zmian w cm/h; bufor_stanu to odczyty [epoch, stan] z ostatnich ~24 h,
+    z których liczone są tempa bez ponownego skanowania historii. detektor to stan
+    detektora podejrzanych odczytów, osobno dla stanu i przepływu.
+    """
+
+    __tablename__ = "station_state"
+
+    station_id = Column(String, ForeignKey("stations.id_stacji"), primary_key=True)
+    stan_wody = Column(Float)
+    stan_wody_data_pomiaru = Column(DateTime)
+    tempo_1h = Column(Float)
+    tempo_3h = Column(Float)
+    tempo_6h = Column(Float)
+    tempo_24h = Column(Float)
+    trend_3h = Column(Float)
+    # alarm / warning / active / inactive - przeliczany zbiorczo po każdej synchronizacji
+    status = Column(String)
+    bufor_stanu = Column(JSONB, nullable=False, default=list)
+    detektor = Column(JSONB, nullable=False, default=dict)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    station = relationship("Station", back_populates="state")
+
+    __table_args__ = (
+        Index("ix_station_state_tempo_1h", "tempo_1h"),
+        Index("ix_station_state_tempo_3h", "tempo_3h"),
+        Index("ix_station_state_tempo_6h", "tempo_6h"),
+        Index("ix_station_state_tempo_24h", "tempo_24h"),
+        Index("ix_station_state_status", "status"),
+    )
+
+    def __repr__(self):
+        return f"<StationState(station_id='{self.station_id}', tempo_1h={self.tempo_1h})>"
+
+
+class StationThreshold(Base):
+    """Stany ostrzegawczy i alarmowy stacji [cm], wczytywane z pliku (scripts/load_thresholds.py)"""
+
+    __tablename__ = "station_thresholds"
+
+    station_id = Column(String, ForeignKey("stations.id_stacji"), primary_key=True)
+    stan_ostrzegawczy = Column(Float)
+    stan_alarmowy = Column(Float)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    station = relationship("Station", back_populates="threshold")
+
+    def __repr__(self):
+        return f"<StationThreshold(station_id='{self.station_id}', stan_alarmowy={self.stan_alarmowy})>"
+
+
+class StationForecast(Base):
+    """Prognoza stanu wody na horyzont godzin do przodu, przeliczana po każdej synchronizacji.
+
+    dolna / gorna to przybliżony 95% przedział z reszt modelu. wygenerowano to
+    czas ostatniego punktu siatki godzinowej, od którego liczona jest prognoza.
+    """
+
+    __tablename__ = "station_forecasts"
+
+    station_id = Column(String, ForeignKey("stations.id_stacji"), nullable=False)
+    horyzont = Column(Integer, nullable=False)
+    czas = Column(DateTime, nullable=False)
+    stan_wody = Column(Float, nullable=False)
+    dolna = Column(Float, nullable=False)
+    gorna = Column(Float, nullable=False)
+    wygenerowano = Column(DateTime, nullable=False)
+
+    __table_args__ = (PrimaryKeyConstraint("station_id", "horyzont"),)
+
+    def __repr__(self):
+        return f"<StationForecast(station_id='{self.station_id}', horyzont={self.horyzont}, stan_wody={self.stan_wody})>"
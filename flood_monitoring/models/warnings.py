@@ -1,10 +1,19 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, PrimaryKeyConstraint, String, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 
 from flood_monitoring.core.database import Base
 
 
+def kod_zlewni_prefixes(kody: list[str]) -> list[str]:
+    """Zwraca wszystkie prefiksy kodów zlewni (np. 2118 -> 2, 21, 211, 2118)"""
+    prefixes = set()
+    for kod in kody or []:
+        for i in range(1, len(kod) + 1):
+            prefixes.add(kod[:i])
+    return sorted(prefixes)
+
+
 class HydroWarning(Base):
 
     __tablename__ = "hydro_warnings"
@@ -36,8 +45,45 @@ class WarningArea(Base):
     wojewodztwo = Column(String, nullable=False)
     opis = Column(String, nullable=False)
     kod_zlewni = Column(ARRAY(String), nullable=False)
+    # Wszystkie prefiksy kodów z kod_zlewni - filtr po prefiksie jako lookup w indeksie GIN
+    kod_zlewni_prefiksy = Column(ARRAY(String), nullable=False, default=list)
 
     warning = relationship("HydroWarning", back_populates="areas")
 
+    __table_args__ = (
+        Index("ix_warning_areas_warning_id", "warning_id"),
+        Index("ix_warning_areas_wojewodztwo", "wojewodztwo"),
+        Index("ix_warning_areas_kod_zlewni", "kod_zlewni", postgresql_using="gin"),
+        Index(
+            "ix_warning_areas_kod_zlewni_prefiksy",
+            "kod_zlewni_prefiksy",
+            postgresql_using="gin",
+        ),
+    )
+
+    def __repr__(self):
+        return f"<WarningArea(wojewodztwo='{self.wojewodztwo}', opis='{self.opis}')>"
+
+
+class StationWarning(Base):
+    """Powiązanie stacji z aktywnym ostrzeżeniem, odświeżane przy synchronizacji ostrzeżeń.
+
+    dopasowanie: "zlewnia" (kod zlewni stacji leży w obszarze ostrzeżenia) albo
+    "wojewodztwo" (stacja bez kodu zlewni, dopasowana po województwie).
+    """
+
+    __tablename__ = "station_warnings"
+
+    station_id = Column(String, ForeignKey("stations.id_stacji"), nullable=False)
+    warning_id = Column(Integer, ForeignKey("hydro_warnings.id"), nullable=False)
+    stopien = Column(String, nullable=False)
+    data_do = Column(DateTime, nullable=False)
+    dopasowanie = Column(String, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("station_id", "warning_id"),
+        Index("ix_station_warnings_warning_id", "warning_id"),
+    )
+
     def __repr__(self):
-        return f"<WarningArea(wojewodztwo='{self.wojewodztwo}', opis='{self.opis}')>"
\ No newline at end of file
+        return f"<StationWarning(station_id='{self.station_id}', warning_id={self.warning_id})>"
@@ -0,0 +1,38 @@
+"""
+Zbudowanie indeksu rzek: kolejność stacji od źródła do ujścia i kilometraż.
+
+Jeśli istnieje plik RIVER_LINES_FILE (linie rzek z kolumną nazwy
+RIVER_LINES_NAME_COLUMN), stacje są rzutowane na linię rzeki; w przeciwnym razie
+porządkowane heurystycznie. Kierunek biegu rzeki wynika z opóźnień fali
+(station_lags), jeśli zostały policzone.
+"""
+import os
+
+from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.database import SessionLocal
+from flood_monitoring.services.database import DatabaseService
+from flood_monitoring.services.rivers import build_river_index, load_river_lines
+
+
+def build_index() -> int:
+    """Przelicz i zapisz indeks rzek. Zwraca liczbę zapisanych stacji."""
+    settings = get_settings()
+    lines = None
+    if os.path.exists(settings.RIVER_LINES_FILE):
+        lines = load_river_lines(settings.RIVER_LINES_FILE, settings.RIVER_LINES_NAME_COLUMN)
+    with SessionLocal() as db:
+        db_service = DatabaseService(db)
+        rows = build_river_index(
+            db_service.get_river_station_points(),
+            db_service.get_lag_pairs(),
+            lines,
+            settings.RIVER_LINE_MAX_DISTANCE_M,
+        )
+        count = db_service.replace_river_index(rows)
+    on_lines = sum(1 for row in rows if row["metoda"] == "linia")
+    print(f"Zapisano indeks rzek dla {count} stacji ({on_lines} wg linii rzek)")
+    return count
+
+
+if __name__ == "__main__":
+    build_index()
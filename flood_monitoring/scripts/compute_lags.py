@@ -0,0 +1,37 @@
+"""
+Przeliczenie opóźnień fali między stacjami na tych samych rzekach.
+
+Korelacja wzajemna zmian stanu z ostatnich LAG_WINDOW_DAYS dni, rzeki liczone
+równolegle w puli procesów; wynik zastępuje zawartość tabeli station_lags.
+Na koniec przebudowywany jest indeks rzek, którego kierunek zależy od opóźnień.
+"""
+import time
+
+from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.database import SessionLocal
+from flood_monitoring.scripts.build_river_index import build_index
+from flood_monitoring.services.database import DatabaseService
+from flood_monitoring.services.rivers import compute_river_lags
+
+
+def compute_lags() -> int:
+    """Policz i zapisz opóźnienia. Zwraca liczbę zapisanych par stacji."""
+    settings = get_settings()
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        db_service = DatabaseService(db)
+        rows = compute_river_lags(
+            db_service,
+            days=settings.LAG_WINDOW_DAYS,
+            max_lag_hours=settings.LAG_MAX_HOURS,
+            min_overlap_hours=settings.LAG_MIN_OVERLAP_HOURS,
+            workers=settings.ANALYSIS_WORKERS,
+        )
+        count = db_service.replace_station_lags(rows)
+    print(f"Zapisano opóźnienia dla {count} par stacji w {time.perf_counter() - started:.1f}s")
+    return count
+
+
+if __name__ == "__main__":
+    compute_lags()
+    build_index()
@@ -1,12 +1,44 @@
+import os
 import time
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
 
-from flood_monitoring.core.database import Base, engine
+from flood_monitoring.core.database import Base, SessionLocal, engine
 from flood_monitoring.models.measurements import PrzeplywMeasurement, StanMeasurement
-from flood_monitoring.models.station import Station
+from flood_monitoring.core.config import get_settings
+from flood_monitoring.models.rivers import RiverStation, StationLag
+from flood_monitoring.models.station import Station, StationForecast, StationState, StationThreshold
 from flood_monitoring.models.warnings import HydroWarning, WarningArea
+from flood_monitoring.scripts.build_river_index import build_index
+from flood_monitoring.scripts.load_thresholds import load_thresholds
+from flood_monitoring.services.database import DatabaseService
+
+# create_all nie zmienia istniejących tabel - kolumny i indeksy dodane do nich
+# później dokładamy idempotentnie, żeby baza sprzed zmian nadal działała
+SCHEMA_UPGRADES = [
+    "ALTER TABLE warning_areas ADD COLUMN IF NOT EXISTS kod_zlewni_prefiksy VARCHAR[] NOT NULL DEFAULT '{}'",
+    # Prefiksy dla obszarów zapisanych przed dodaniem kolumny (jak kod_zlewni_prefixes)
+    """UPDATE warning_areas SET kod_zlewni_prefiksy = ARRAY(
+        SELECT DISTINCT left(kod, n) FROM unnest(kod_zlewni) AS kod, generate_series(1, length(kod)) AS n
+        ORDER BY 1
+    ) WHERE kod_zlewni_prefiksy = '{}' AND cardinality(kod_zlewni) > 0""",
+    "CREATE INDEX IF NOT EXISTS ix_warning_areas_warning_id ON warning_areas (warning_id)",
+    "CREATE INDEX IF NOT EXISTS ix_warning_areas_wojewodztwo ON warning_areas (wojewodztwo)",
+    "CREATE INDEX IF NOT EXISTS ix_warning_areas_kod_zlewni ON warning_areas USING gin (kod_zlewni)",
+    "CREATE INDEX IF NOT EXISTS ix_warning_areas_kod_zlewni_prefiksy ON warning_areas USING gin (kod_zlewni_prefiksy)",
+    "ALTER TABLE stan_measurements ADD COLUMN IF NOT EXISTS flaga VARCHAR",
+    "ALTER TABLE przeplyw_measurements ADD COLUMN IF NOT EXISTS flaga VARCHAR",
+    "ALTER TABLE stations ADD COLUMN IF NOT EXISTS kod_zlewni VARCHAR",
+]
+
+
+def upgrade_schema():
+    """Dodaj do istniejących tabel brakujące kolumny i indeksy (bezpieczne przy każdym uruchomieniu)"""
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+
 
 def wait_for_db(max_retries=5, retry_interval=5):
     """Czeka na gotowość bazy danych"""
@@ -35,12 +67,33 @@ def init_db():
     try:
         # Tworzymy wszystkie tabele
         Base.metadata.create_all(bind=engine)
+        upgrade_schema()
         print("Tabele zostały pomyślnie utworzone!")
-        return True
     except Exception as e:
         print(f"Wystąpił błąd podczas tworzenia tabel: {str(e)}")
         return False
 
+    try:
+        # Tempo zmian stanu liczone z odczytów zapisanych przed uruchomieniem
+        with SessionLocal() as db:
+            count = DatabaseService(db).rebuild_station_states()
+        print(f"Odbudowano stan {count} stacji")
+
+        # Progi ostrzegawcze/alarmowe z pliku (opcjonalnie) i statusy stacji
+        settings = get_settings()
+        if os.path.exists(settings.STATION_THRESHOLDS_FILE):
+            load_thresholds(settings.STATION_THRESHOLDS_FILE)
+        else:
+            with SessionLocal() as db:
+                DatabaseService(db).refresh_station_statuses(settings.STATION_INACTIVE_AFTER_HOURS)
+
+        # Kolejność stacji wzdłuż rzek
+        build_index()
+        return True
+    except Exception as e:
+        print(f"Wystąpił błąd podczas odbudowy stanu stacji: {str(e)}")
+        return False
+
 
 if __name__ == "__main__":
     print("Inicjalizacja bazy danych...")
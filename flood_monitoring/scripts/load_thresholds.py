@@ -0,0 +1,54 @@
+"""
+Wczytanie stanów ostrzegawczych i alarmowych stacji z pliku CSV.
+
+Format pliku (nagłówek wymagany, puste pole = brak progu):
+    id_stacji,stan_ostrzegawczy,stan_alarmowy
+    150160180,450,520
+"""
+import csv
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.database import SessionLocal
+from flood_monitoring.services.database import DatabaseService
+
+
+def _parse_level(value: Optional[str]) -> Optional[float]:
+    value = (value or "").strip().replace(",", ".")
+    return float(value) if value else None
+
+
+def read_thresholds(path: str) -> List[Dict[str, Any]]:
+    """Odczytaj plik CSV z progami do listy słowników dla DatabaseService.upsert_thresholds"""
+    with open(path, newline="", encoding="utf-8") as file:
+        return [
+            {
+                "station_id": row["id_stacji"].strip(),
+                "stan_ostrzegawczy": _parse_level(row.get("stan_ostrzegawczy")),
+                "stan_alarmowy": _parse_level(row.get("stan_alarmowy")),
+            }
+            for row in csv.DictReader(file)
+            if row.get("id_stacji")
+        ]
+
+
+def load_thresholds(path: str) -> int:
+    """Wczytaj progi z pliku i przelicz statusy stacji. Zwraca liczbę zapisanych progów."""
+    settings = get_settings()
+    rows = read_thresholds(path)
+    with SessionLocal() as db:
+        db_service = DatabaseService(db)
+        count = db_service.upsert_thresholds(rows)
+        db_service.refresh_station_statuses(settings.STATION_INACTIVE_AFTER_HOURS)
+    print(f"Wczytano progi dla {count} stacji (pominięto {len(rows) - count} nieznanych)")
+    return count
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else get_settings().STATION_THRESHOLDS_FILE
+    if not os.path.exists(path):
+        print(f"Nie znaleziono pliku z progami: {path}")
+        sys.exit(1)
+    load_thresholds(path)
@@ -0,0 +1,147 @@
+"""
+Wykrywanie podejrzanych odczytów w strumieniu pomiarów (stała pamięć na stację)
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Flagi jakości zapisywane w kolumnie flaga (NULL = odczyt poprawny)
+FLAG_SPIKE = "pik"
+FLAG_FLATLINE = "linia_plaska"
+FLAG_UNIT_JUMP = "skok_jednostek"
+
+# Długość okna dla mediany / MAD i liczba odczytów potrzebna do rozpoczęcia oceny
+WINDOW_SIZE = 15
+MIN_READINGS = 5
+
+# Odczyt odbiegający od mediany o więcej niż K_MAD * MAD (przeskalowane do odchylenia
+# standardowego) i K_EW odchyleń ze średniej wykładniczej jest pikiem
+K_MAD = 6.0
+K_EW = 6.0
+EW_ALPHA = 0.05
+MAD_SCALE = 1.4826
+
+# Stosunek do mediany, od którego zakładamy zmianę jednostki (np. cm -> m) - tylko
+# dla stanu; przepływ w czasie wezbrania rośnie naturalnie o rząd wielkości
+UNIT_RATIO = 10.0
+UNIT_JUMP_KINDS = ("stan",)
+
+# Największa wiarygodna zmiana względem prognozy z ostatniego odczytu i bieżącego
+# tempa: stan w cm na godzinę, przepływ jako krotność na godzinę. Szybsza zmiana
+# odbiegająca od mediany okna jest pikiem; wolniejsza to wezbranie/opadanie
+MAX_RISE_PER_HOUR = 100.0
+MAX_FLOW_RATIO_PER_HOUR = 20.0
+
+# Minimalna zmiana uznawana za pik (w jednostkach pomiaru) i liczba identycznych
+# odczytów z rzędu, od której seria jest podejrzanie płaska (flagowany jest tylko
+# odczyt, który osiąga tę liczbę - spokojna rzeka o stałym stanie nie jest
+# oznaczana w nieskończoność)
+MIN_DELTA = {"stan": 10.0, "przeplyw": 1.0}
+FLATLINE_READINGS = 48
+
+# Tyle flag z rzędu oznacza rzeczywistą zmianę poziomu - detektor zaczyna od nowa
+MAX_CONSECUTIVE_FLAGS = 3
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def new_detector_state() -> Dict[str, Any]:
+    return {
+        "okno": [],
+        "srednia": None,
+        "wariancja": 0.0,
+        "ostatnia": None,
+        "ostatnia_czas": None,
+        "tempo": 0.0,
+        "czas": None,
+        "powtorzenia": 0,
+        "flagi_z_rzedu": 0,
+    }
+
+
+def _allowed_change(state: Dict[str, Any], kind: str, timestamp: float) -> Tuple[Optional[float], float]:
+    """Prognoza odczytu z ostatniej wartości i tempa oraz dopuszczalne odchylenie od niej"""
+    last, last_time = state["ostatnia"], state.get("ostatnia_czas")
+    if last is None or last_time is None or timestamp <= last_time:
+        return None, 0.0
+    hours = (timestamp - last_time) / 3600
+    predicted = last + state.get("tempo", 0.0) * hours
+    if kind == "przeplyw":
+        return predicted, abs(predicted) * (MAX_FLOW_RATIO_PER_HOUR ** hours - 1)
+    return predicted, MAX_RISE_PER_HOUR * hours
+
+
+def _classify(state: Dict[str, Any], value: float, kind: str, timestamp: float) -> Optional[str]:
+    window = state["okno"]
+    if state["ostatnia"] is not None and value == state["ostatnia"]:
+        if state["powtorzenia"] + 1 == FLATLINE_READINGS:
+            return FLAG_FLATLINE
+    if len(window) < MIN_READINGS:
+        return None
+
+    median = _median(window)
+    if kind in UNIT_JUMP_KINDS and median > 0 and (value <= median / UNIT_RATIO or value >= median * UNIT_RATIO):
+        return FLAG_UNIT_JUMP
+
+    mad = _median([abs(v - median) for v in window]) * MAD_SCALE
+    threshold = max(K_MAD * mad, K_EW * math.sqrt(state["wariancja"]), MIN_DELTA.get(kind, 0.0))
+    if abs(value - median) <= threshold:
+        return None
+    # Odstaje od okna - pik tylko wtedy, gdy nie da się tego wyjaśnić trendem
+    predicted, allowed = _allowed_change(state, kind, timestamp)
+    if predicted is not None and abs(value - predicted) <= max(threshold, allowed):
+        return None
+    return FLAG_SPIKE
+
+
+def check_reading(
+    state: Optional[Dict[str, Any]], timestamp: float, value: float, kind: str = "stan"
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Oceń nowy odczyt i zwróć (flaga lub None, nowy stan detektora).
+
+    Stan to mały słownik (okno WINDOW_SIZE wartości, średnia i wariancja
+    wykładnicza, ostatni odczyt z tempem zmian, licznik powtórzeń), więc koszt
+    i pamięć są stałe. Odczyt odstający od mediany okna jest pikiem tylko wtedy,
+    gdy odbiega też od prognozy z ostatniego odczytu i tempa o więcej, niż pozwala
+    MAX_RISE_PER_HOUR / MAX_FLOW_RATIO_PER_HOUR - wezbranie nie jest flagowane. Odczyty
+    oflagowane nie wchodzą do statystyk, żeby pik nie zaburzał kolejnych ocen.
+    Odczyt starszy niż ostatni oceniany jest bez aktualizacji stanu.
+    """
+    state = dict(state) if state else new_detector_state()
+    state["okno"] = list(state["okno"])
+    flag = _classify(state, value, kind, timestamp)
+
+    if state["czas"] is not None and timestamp <= state["czas"]:
+        return flag, state
+
+    if flag in (FLAG_SPIKE, FLAG_UNIT_JUMP):
+        state["flagi_z_rzedu"] += 1
+        if state["flagi_z_rzedu"] < MAX_CONSECUTIVE_FLAGS:
+            state["czas"] = timestamp
+            return flag, state
+        # Utrzymująca się zmiana - nowy poziom odniesienia, zaczynamy od tego odczytu
+        state = new_detector_state()
+        flag = None
+
+    state["powtorzenia"] = state["powtorzenia"] + 1 if value == state["ostatnia"] else 0
+    state["flagi_z_rzedu"] = 0
+    if state["ostatnia"] is not None and state.get("ostatnia_czas") is not None:
+        state["tempo"] = (value - state["ostatnia"]) / ((timestamp - state["ostatnia_czas"]) / 3600)
+    state["ostatnia"] = value
+    state["ostatnia_czas"] = timestamp
+    state["czas"] = timestamp
+    state["okno"] = (state["okno"] + [value])[-WINDOW_SIZE:]
+
+    if state["srednia"] is None:
+        state["srednia"] = value
+    else:
+        diff = value - state["srednia"]
+        increment = EW_ALPHA * diff
+        state["srednia"] += increment
+        state["wariancja"] = (1 - EW_ALPHA) * (state["wariancja"] + diff * increment)
+    return flag, state
@@ -1,18 +1,94 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 
 from geoalchemy2.shape import from_shape
 from shapely.geometry import Point
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.orm import Session, aliased, selectinload
+from sqlalchemy import Float, Integer, case, cast, func, and_, literal, or_, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, aggregate_order_by, array, insert as pg_insert
 
 from flood_monitoring.models.measurements import PrzeplywMeasurement, StanMeasurement
-from flood_monitoring.models.station import Station
-from flood_monitoring.models.warnings import HydroWarning, WarningArea
+from flood_monitoring.models.rivers import RiverStation, StationLag
+from flood_monitoring.models.station import Station, StationForecast, StationState, StationThreshold
+from flood_monitoring.models.warnings import HydroWarning, StationWarning, WarningArea
+from flood_monitoring.core.metrics import INGEST_FLAGGED
+from flood_monitoring.services.anomalies import check_reading
+from flood_monitoring.services.rivers import normalize_river_name
+from flood_monitoring.services.trends import BUFFER_SECONDS, add_reading, compute_rates, to_epoch
 logger = logging.getLogger(__name__)
 
+# Stacje z kodem zlewni: obszar ostrzeżenia obejmuje stację, gdy któryś kod obszaru jest
+# prefiksem kodu stacji (operator && na indeksie GIN warning_areas.kod_zlewni).
+# Stacje bez kodu zlewni: dopasowanie po województwie (indeks B-tree).
+REFRESH_STATION_WARNINGS_SQL = text("""
+    INSERT INTO station_warnings (station_id, warning_id, stopien, data_do, dopasowanie)
+    SELECT DISTINCT s.id_stacji, w.id, w.stopien, w.data_do, 'zlewnia'
+    FROM stations s
+    JOIN warning_areas a ON a.kod_zlewni && ARRAY(
+        SELECT left(s.kod_zlewni, n) FROM generate_series(1, length(s.kod_zlewni)) AS n
+    )
+    JOIN hydro_warnings w ON w.id = a.warning_id
+    WHERE s.kod_zlewni IS NOT NULL AND w.data_do >= :now
+    UNION
+    SELECT DISTINCT s.id_stacji, w.id, w.stopien, w.data_do, 'wojewodztwo'
+    FROM stations s
+    JOIN warning_areas a ON a.wojewodztwo = s.wojewodztwo
+    JOIN hydro_warnings w ON w.id = a.warning_id
+    WHERE s.kod_zlewni IS NULL AND w.data_do >= :now
+""")
+
+
+# Luki w seriach: oczekiwany rytm stacji to mediana odstępów między jej odczytami w oknie.
+# generate_series wyznacza oczekiwane sloty, NOT EXISTS (indeks station_id + czas) znajduje
+# puste, a kolejne puste sloty są sklejane w przedziały (gaps-and-islands przez row_number).
+GAPS_SQL = """
+    WITH readings AS (
+        SELECT station_id, {time_column} AS t
+        FROM {table}
+        WHERE {time_column} >= :start AND {time_column} < :end
+    ),
+    cadence AS (
+        SELECT station_id, percentile_cont(0.5) WITHIN GROUP (ORDER BY diff) AS seconds
+        FROM (
+            SELECT station_id, extract(epoch FROM t - lag(t) OVER (PARTITION BY station_id ORDER BY t)) AS diff
+            FROM readings
+        ) diffs
+        WHERE diff > 0
+        GROUP BY station_id
+    ),
+    station_cadence AS (
+        SELECT s.id_stacji AS station_id,
+               make_interval(secs => GREATEST(COALESCE(c.seconds, :default_seconds), :min_seconds)) AS step
+        FROM stations s
+        LEFT JOIN cadence c ON c.station_id = s.id_stacji
+        {station_filter}
+    ),
+    missing AS (
+        SELECT sc.station_id, sc.step, slot,
+               slot - sc.step * (row_number() OVER (PARTITION BY sc.station_id ORDER BY slot) - 1) AS island
+        FROM station_cadence sc
+        CROSS JOIN LATERAL generate_series(CAST(:start AS timestamp), CAST(:end AS timestamp) - sc.step, sc.step) AS slot
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} m
+            WHERE m.station_id = sc.station_id
+              AND m.{time_column} >= slot AND m.{time_column} < slot + sc.step
+        )
+    )
+    SELECT station_id, min(slot) AS gap_start, max(slot) + min(step) AS gap_end,
+           count(*) AS missing_slots, CAST(extract(epoch FROM min(step)) / 60 AS integer) AS cadence_minutes
+    FROM missing
+    GROUP BY station_id, island
+    HAVING count(*) >= :min_slots
+    ORDER BY station_id, gap_start
+"""
+
+GAP_SOURCES = {
+    "stan": ("stan_measurements", "stan_wody_data_pomiaru"),
+    "przeplyw": ("przeplyw_measurements", "przeplyw_data"),
+}
+
 
 class DatabaseService:
     def __init__(self, db_session: Session):
@@ -24,11 +100,74 @@ class DatabaseService:
 
     def get_all_warnings(self):
         """Pobierz wszystkie ostrzeżenia"""
-        return self.db.query(HydroWarning).all()
+        return self.get_warnings()
+
+    def get_warnings(
+        self,
+        wojewodztwo: Optional[str] = None,
+        kod_zlewni: Optional[str] = None,
+        kod_zlewni_prefix: Optional[str] = None,
+    ) -> List[HydroWarning]:
+        """Pobierz ostrzeżenia, opcjonalnie filtrowane po województwie i zlewni.
+
+        Filtry są sprawdzane przez EXISTS na warning_areas: województwo przez
+        indeks B-tree, kod zlewni i prefiks kodu przez indeksy GIN (operator @>).
+        """
+        query = self.db.query(HydroWarning).options(selectinload(HydroWarning.areas))
+
+        if wojewodztwo:
+            query = query.filter(
+                HydroWarning.areas.any(WarningArea.wojewodztwo == wojewodztwo)
+            )
+        if kod_zlewni:
+            query = query.filter(
+                HydroWarning.areas.any(WarningArea.kod_zlewni.contains([kod_zlewni]))
+            )
+        if kod_zlewni_prefix:
+            query = query.filter(
+                HydroWarning.areas.any(
+                    WarningArea.kod_zlewni_prefiksy.contains([kod_zlewni_prefix])
+                )
+            )
+
+        return query.order_by(HydroWarning.opublikowano.desc()).all()
+
+    def refresh_station_warnings(self) -> None:
+        """Przebuduj powiązania stacji z aktywnymi ostrzeżeniami (bez commita - w transakcji synchronizacji)"""
+        self.db.query(StationWarning).delete(synchronize_session=False)
+        self.db.execute(REFRESH_STATION_WARNINGS_SQL, {"now": datetime.now()})
+
+    def get_station_warning_levels(self) -> Dict[str, str]:
+        """Najwyższy stopień aktywnego ostrzeżenia dla każdej objętej stacji.
+
+        Stopień jest tekstem, więc porównujemy go liczbowo ("10" > "2"); stopnie
+        nieliczbowe mają najniższy priorytet.
+        """
+        level = case(
+            (StationWarning.stopien.op("~")("^[0-9]{1,9}$"), cast(StationWarning.stopien, Integer))
+        )
+        rows = self.db.execute(
+            select(StationWarning.station_id, StationWarning.stopien)
+            .distinct(StationWarning.station_id)
+            .where(StationWarning.data_do >= datetime.now())
+            .order_by(StationWarning.station_id, level.desc().nulls_last(), StationWarning.stopien.desc())
+        )
+        return {station_id: stopien for station_id, stopien in rows}
+
+    def get_warning_stations(self, warning_id: int) -> List[Tuple[Station, str]]:
+        """Stacje objęte ostrzeżeniem wraz ze sposobem dopasowania (lookup po indeksie warning_id)"""
+        return (
+            self.db.query(Station, StationWarning.dopasowanie)
+            .join(StationWarning, StationWarning.station_id == Station.id_stacji)
+            .filter(StationWarning.warning_id == warning_id)
+            .order_by(Station.stacja)
+            .all()
+        )
 
     def get_warning_by_id(self, warning_id: int):
         """Pobierz ostrzeżenie po ID"""
         return self.db.query(HydroWarning).filter(HydroWarning.id == warning_id).first()
+
     def get_or_create_station(
         self,
         id_stacji: str,
@@ -36,11 +175,14 @@ class DatabaseService:
         lat: float,
         lon: float,
         rzeka: str,
-        wojewodztwo: str
-
+        wojewodztwo: str,
+        kod_zlewni: Optional[str] = None
     ) -> Station:
-        """Pobierz lub utwórz stację"""
+        """Pobierz lub utwórz stację; istniejącej uzupełnia kod zlewni, jeśli się pojawił lub zmienił"""
         station = self.db.query(Station).filter_by(id_stacji=id_stacji).first()
+        if station and kod_zlewni and station.kod_zlewni != kod_zlewni:
+            station.kod_zlewni = kod_zlewni
+            self.db.commit()
         if not station:
             # Tworzymy punkt geometryczny
             point = Point(lon, lat)
@@ -53,7 +195,8 @@ class DatabaseService:
                 lon=lon,
                 rzeka=rzeka,
                 geom=geom,
-                wojewodztwo=wojewodztwo
+                wojewodztwo=wojewodztwo,
+                kod_zlewni=kod_zlewni
             )
             self.db.add(station)
             try:
@@ -76,11 +219,15 @@ class DatabaseService:
         if existing:
             return False
 
+        state = self._get_station_state(station_id)
+        flaga = self._check_quality(state, "stan", stan_wody_data_pomiaru, stan_wody)
         measurement_id = f"{station_id}_{stan_wody_data_pomiaru.isoformat()}"
         measurement = StanMeasurement(
-            id=measurement_id, station_id=station_id, stan_wody_data_pomiaru=stan_wody_data_pomiaru, stan_wody=stan_wody
+            id=measurement_id, station_id=station_id, stan_wody_data_pomiaru=stan_wody_data_pomiaru, stan_wody=stan_wody,
+            flaga=flaga
         )
         self.db.add(measurement)
+        self.update_station_state(state, stan_wody_data_pomiaru, stan_wody, flagged=flaga is not None)
         try:
             self.db.commit()
             return True
@@ -88,6 +235,307 @@ class DatabaseService:
             self.db.rollback()
             return False
 
+    def _get_station_state(self, station_id: str) -> StationState:
+        state = self.db.get(StationState, station_id)
+        if state is None:
+            state = StationState(station_id=station_id, bufor_stanu=[], detektor={})
+            self.db.add(state)
+        return state
+
+    def _check_quality(self, state: StationState, kind: str, measured_at: datetime, value: float) -> Optional[str]:
+        """Oceń odczyt detektorem podejrzanych wartości i zapisz jego stan w station_state"""
+        detectors = dict(state.detektor or {})
+        flaga, detectors[kind] = check_reading(detectors.get(kind), to_epoch(measured_at), value, kind)
+        state.detektor = detectors
+        if flaga is not None:
+            INGEST_FLAGGED.labels(kind, flaga).inc()
+            logger.debug("Reading %s=%s for station %s flagged as %s", kind, value, state.station_id, flaga)
+        return flaga
+
+    def update_station_state(
+        self, state: StationState, stan_wody_data_pomiaru: datetime, stan_wody: float, flagged: bool = False
+    ) -> StationState:
+        """Uwzględnij nowy odczyt stanu w station_state (bez commita - w transakcji pomiaru).
+
+        Ostatni stan i czas odczytu (świeżość stacji) przesuwane są zawsze; odczyt
+        oflagowany przez detektor nie trafia tylko do bufora, z którego liczone są tempa.
+        Koszt nie zależy od długości historii: tempo liczone jest z bufora 24 h.
+        """
+        if state.stan_wody_data_pomiaru is None or stan_wody_data_pomiaru >= state.stan_wody_data_pomiaru:
+            state.stan_wody = stan_wody
+            state.stan_wody_data_pomiaru = stan_wody_data_pomiaru
+        if flagged:
+            return state
+        state.bufor_stanu = add_reading(state.bufor_stanu or [], stan_wody_data_pomiaru, stan_wody)
+        for column, value in compute_rates(state.bufor_stanu).items():
+            setattr(state, column, value)
+        return state
+
+    def rebuild_station_states(self) -> int:
+        """Odbuduj station_state z ostatnich odczytów (np. po utworzeniu tabeli). Zwraca liczbę stacji."""
+        start_date = datetime.now() - timedelta(seconds=BUFFER_SECONDS)
+        rows = self.db.execute(
+            select(
+                StanMeasurement.station_id,
+                StanMeasurement.stan_wody_data_pomiaru,
+                StanMeasurement.stan_wody,
+                StanMeasurement.flaga,
+            )
+            .where(StanMeasurement.stan_wody_data_pomiaru >= start_date)
+            .order_by(StanMeasurement.station_id, StanMeasurement.stan_wody_data_pomiaru)
+        ).all()
+
+        stations = {}
+        for station_id, measured_at, value, flaga in rows:
+            stations.setdefault(station_id, []).append((measured_at, value, flaga))
+
+        for station_id, readings in stations.items():
+            state = self.db.get(StationState, station_id) or StationState(station_id=station_id)
+            buffer = []
+            for measured_at, value, flaga in readings:
+                if flaga is None:
+                    buffer = add_reading(buffer, measured_at, value)
+            state.bufor_stanu = buffer
+            state.stan_wody_data_pomiaru, state.stan_wody, _ = readings[-1]
+            for column, value in compute_rates(buffer).items():
+                setattr(state, column, value)
+            self.db.add(state)
+
+        self.db.commit()
+        return len(stations)
+
+    def upsert_thresholds(self, rows: List[Dict[str, Any]]) -> int:
+        """Zapisz stany ostrzegawcze/alarmowe [{station_id, stan_ostrzegawczy, stan_alarmowy}].
+
+        Wiersze dla nieznanych stacji są pomijane. Zwraca liczbę zapisanych wierszy.
+        """
+        known = {station_id for (station_id,) in self.db.execute(select(Station.id_stacji))}
+        rows = [row for row in rows if row["station_id"] in known]
+        if not rows:
+            return 0
+        statement = pg_insert(StationThreshold).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[StationThreshold.station_id],
+            set_={
+                "stan_ostrzegawczy": statement.excluded.stan_ostrzegawczy,
+                "stan_alarmowy": statement.excluded.stan_alarmowy,
+                "updated_at": func.now(),
+            },
+        )
+        self.db.execute(statement)
+        self.db.commit()
+        return len(rows)
+
+    def refresh_station_statuses(self, inactive_after_hours: int = 6) -> None:
+        """Przelicz status wszystkich stacji jednym INSERT ... SELECT ... ON CONFLICT.
+
+        inactive - brak odczytu stanu w ostatnich inactive_after_hours godzinach,
+        alarm / warning - ostatni stan >= stanu alarmowego / ostrzegawczego,
+        active - pozostałe. Aktualizowane są tylko wiersze, których status się zmienił.
+        """
+        fresh_after = datetime.now() - timedelta(hours=inactive_after_hours)
+        status = case(
+            (
+                or_(
+                    StationState.stan_wody_data_pomiaru.is_(None),
+                    StationState.stan_wody_data_pomiaru < fresh_after,
+                ),
+                "inactive",
+            ),
+            (StationState.stan_wody >= StationThreshold.stan_alarmowy, "alarm"),
+            (StationState.stan_wody >= StationThreshold.stan_ostrzegawczy, "warning"),
+            else_="active",
+        )
+        source = (
+            select(
+                Station.id_stacji,
+                status,
+                literal([], JSONB),
+                literal({}, JSONB),
+            )
+            .outerjoin(StationState, StationState.station_id == Station.id_stacji)
+            .outerjoin(StationThreshold, StationThreshold.station_id == Station.id_stacji)
+        )
+        statement = pg_insert(StationState).from_select(
+            ["station_id", "status", "bufor_stanu", "detektor"], source
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[StationState.station_id],
+            set_={"status": statement.excluded.status},
+            where=StationState.status.is_distinct_from(statement.excluded.status),
+        )
+        self.db.execute(statement)
+        self.db.commit()
+
+    def find_gaps(
+        self,
+        kind: str = "stan",
+        hours: int = 24,
+        station_ids: Optional[List[str]] = None,
+        default_cadence_minutes: int = 60,
+        min_cadence_minutes: int = 10,
+        min_slots: int = 1,
+    ) -> List[Dict[str, Any]]:
+        """Znajdź brakujące przedziały w seriach wszystkich stacji jednym zapytaniem.
+
+        Okno to pełne godziny [teraz - hours, teraz). Stacja bez odczytów w oknie ma
+        jedną lukę na całe okno w rytmie domyślnym.
+        """
+        table, time_column = GAP_SOURCES[kind]
+        end = datetime.now().replace(minute=0, second=0, microsecond=0)
+        start = end - timedelta(hours=hours)
+        params = {
+            "start": start,
+            "end": end,
+            "default_seconds": default_cadence_minutes * 60,
+            "min_seconds": min_cadence_minutes * 60,
+            "min_slots": min_slots,
+        }
+        station_filter = ""
+        if station_ids:
+            station_filter = "WHERE s.id_stacji = ANY(:station_ids)"
+            params["station_ids"] = list(station_ids)
+
+        statement = text(
+            GAPS_SQL.format(table=table, time_column=time_column, station_filter=station_filter)
+        )
+        return [dict(row._mapping) for row in self.db.execute(statement, params)]
+
+    def get_station_states(self) -> Dict[str, StationState]:
+        """Stan (tempo zmian) wszystkich stacji"""
+        return {state.station_id: state for state in self.db.query(StationState).all()}
+
+    def get_rising_stations(self, window: str = "3h", limit: int = 20) -> List[Tuple[Station, StationState]]:
+        """Stacje o najszybciej rosnącym stanie wody w danym oknie (sortowanie po indeksie)"""
+        column = getattr(StationState, f"tempo_{window}")
+        return (
+            self.db.query(Station, StationState)
+            .join(StationState, StationState.station_id == Station.id_stacji)
+            .filter(column.isnot(None))
+            .order_by(column.desc())
+            .limit(limit)
+            .all()
+        )
+
+    def get_river_stations(self) -> Dict[str, List[str]]:
+        """Identyfikatory stacji pogrupowane po znormalizowanej nazwie rzeki"""
+        rivers: Dict[str, List[str]] = {}
+        rows = self.db.execute(
+            select(Station.id_stacji, Station.rzeka)
+            .where(Station.rzeka.isnot(None))
+            .order_by(Station.id_stacji)
+        )
+        for station_id, rzeka in rows:
+            river = normalize_river_name(rzeka)
+            if river:
+                rivers.setdefault(river, []).append(station_id)
+        return rivers
+
+    def replace_station_lags(self, rows: List[Dict[str, Any]]) -> int:
+        """Zastąp wszystkie opóźnienia między stacjami nowym wynikiem analizy (jedna transakcja)"""
+        computed_at = datetime.now()
+        self.db.execute(StationLag.__table__.delete())
+        if rows:
+            self.db.execute(
+                StationLag.__table__.insert(),
+                [{**row, "computed_at": computed_at} for row in rows],
+            )
+        self.db.commit()
+        return len(rows)
+
+    def get_station_lags(self, river: str, min_correlation: float = 0.0) -> List[Tuple[StationLag, Station, Station]]:
+        """Opóźnienia między stacjami rzeki (nazwa normalizowana) razem ze stacjami obu końców"""
+        upstream = aliased(Station)
+        downstream = aliased(Station)
+        return (
+            self.db.query(StationLag, upstream, downstream)
+            .join(upstream, upstream.id_stacji == StationLag.station_a)
+            .join(downstream, downstream.id_stacji == StationLag.station_b)
+            .filter(
+                StationLag.rzeka == normalize_river_name(river),
+                StationLag.korelacja >= min_correlation,
+            )
+            .order_by(StationLag.korelacja.desc())
+            .all()
+        )
+
+    def get_river_station_points(self) -> List[Tuple[str, str, float, float]]:
+        """Stacje z nazwą rzeki jako krotki (id, rzeka, lat, lon)"""
+        return [
+            tuple(row)
+            for row in self.db.execute(
+                select(Station.id_stacji, Station.rzeka, Station.lat, Station.lon).where(Station.rzeka.isnot(None))
+            )
+        ]
+
+    def get_lag_pairs(self, min_correlation: float = 0.5) -> List[Tuple[str, str]]:
+        """Pary (stacja wcześniejsza, stacja późniejsza) z wystarczająco silną korelacją"""
+        return [
+            tuple(row)
+            for row in self.db.execute(
+                select(StationLag.station_a, StationLag.station_b).where(StationLag.korelacja >= min_correlation)
+            )
+        ]
+
+    def replace_river_index(self, rows: List[Dict[str, Any]]) -> int:
+        """Zastąp indeks rzek nowym uporządkowaniem stacji (jedna transakcja)"""
+        updated_at = datetime.now()
+        self.db.execute(RiverStation.__table__.delete())
+        if rows:
+            self.db.execute(
+                RiverStation.__table__.insert(),
+                [{**row, "updated_at": updated_at} for row in rows],
+            )
+        self.db.commit()
+        return len(rows)
+
+    def get_river_index(self, river: str) -> List[Tuple[RiverStation, Station]]:
+        """Stacje rzeki od źródła do ujścia (jedno zapytanie po indeksie rzeka, kolejnosc)"""
+        return (
+            self.db.query(RiverStation, Station)
+            .join(Station, Station.id_stacji == RiverStation.station_id)
+            .filter(RiverStation.rzeka == normalize_river_name(river))
+            .order_by(RiverStation.kolejnosc)
+            .all()
+        )
+
+    def get_forecast_station_ids(self) -> List[str]:
+        """Stacje, dla których jest choć jeden odczyt stanu (mają wiersz w station_state)"""
+        return list(
+            self.db.scalars(
+                select(StationState.station_id)
+                .where(StationState.stan_wody.isnot(None))
+                .order_by(StationState.station_id)
+            )
+        )
+
+    def get_upstream_neighbours(self, min_correlation: float = 0.5) -> Dict[str, Tuple[str, float]]:
+        """Dla każdej stacji najsilniej skorelowana stacja powyżej: {station_b: (station_a, lag_hours)}"""
+        rows = self.db.execute(
+            select(StationLag.station_b, StationLag.station_a, StationLag.lag_hours)
+            .where(StationLag.korelacja >= min_correlation)
+            .order_by(StationLag.station_b, StationLag.korelacja.desc())
+            .distinct(StationLag.station_b)
+        )
+        return {station_b: (station_a, lag_hours) for station_b, station_a, lag_hours in rows}
+
+    def replace_forecasts(self, rows: List[Dict[str, Any]]) -> int:
+        """Zastąp prognozy wszystkich stacji nowym przebiegiem (jedna transakcja)"""
+        self.db.execute(StationForecast.__table__.delete())
+        if rows:
+            self.db.execute(StationForecast.__table__.insert(), rows)
+        self.db.commit()
+        return len(rows)
+
+    def get_station_forecast(self, station_id: str) -> List[StationForecast]:
+        """Prognoza stacji uporządkowana po horyzoncie"""
+        return (
+            self.db.query(StationForecast)
+            .filter(StationForecast.station_id == station_id)
+            .order_by(StationForecast.horyzont)
+            .all()
+        )
+
     def add_przeplyw_measurement(
         self, station_id: str, przeplyw_data: datetime, przelyw: float
     ) -> bool:
@@ -101,12 +549,14 @@ class DatabaseService:
         if existing:
             return False
 
+        state = self._get_station_state(station_id)
         measurement_id = f"{station_id}_{przeplyw_data.isoformat()}"
         measurement = PrzeplywMeasurement(
             id=measurement_id,
             station_id=station_id,
             przeplyw_data=przeplyw_data,
-            przelyw=przelyw
+            przelyw=przelyw,
+            flaga=self._check_quality(state, "przeplyw", przeplyw_data, przelyw)
         )
         self.db.add(measurement)
         try:
@@ -116,8 +566,8 @@ class DatabaseService:
             self.db.rollback()
             return False
 
-    def get_station_measurements(self, station_id: str, days: int = 1):
-        """Pobierz pomiary z konkretnej stacji z ostatnich X dni"""
+    def get_station_measurements(self, station_id: str, days: int = 1, exclude_flagged: bool = False):
+        """Pobierz pomiary z konkretnej stacji z ostatnich X dni (opcjonalnie bez odczytów oflagowanych)"""
         from datetime import timedelta
 
         start_date = datetime.now() - timedelta(days=days)
@@ -129,6 +579,7 @@ class DatabaseService:
             .filter(
                 StanMeasurement.station_id == station_id,
                 StanMeasurement.stan_wody_data_pomiaru >= start_date,
+                *([StanMeasurement.flaga.is_(None)] if exclude_flagged else []),
             )
             .order_by(StanMeasurement.stan_wody_data_pomiaru.asc())
             .all()
@@ -139,6 +590,7 @@ class DatabaseService:
             .filter(
                 PrzeplywMeasurement.station_id == station_id,
                 PrzeplywMeasurement.przeplyw_data >= start_date,
+                *([PrzeplywMeasurement.flaga.is_(None)] if exclude_flagged else []),
             )
             .order_by(PrzeplywMeasurement.przeplyw_data.asc())
             .all()
@@ -146,10 +598,10 @@ class DatabaseService:
 
         result = {
             "stan": [
-                {"stan_wody_data_pomiaru": m.stan_wody_data_pomiaru, "stan_wody": m.stan_wody} for m in stan_measurements
+                {"stan_wody_data_pomiaru": m.stan_wody_data_pomiaru, "stan_wody": m.stan_wody, "flaga": m.flaga} for m in stan_measurements
             ],
             "przelyw": [
-                {"przeplyw_data": m.przeplyw_data, "przelyw": m.przelyw}
+                {"przeplyw_data": m.przeplyw_data, "przelyw": m.przelyw, "flaga": m.flaga}
                 for m in przeplyw_measurements
             ],
         }
@@ -158,7 +610,7 @@ class DatabaseService:
 
         return result
 
-    def get_station_measurements_extended(self, station_id: str, days: int = 1, limit: int = 100) -> Dict[str, List[Dict[str, Any]]]:
+    def get_station_measurements_extended(self, station_id: str, days: int = 1, limit: int = 100, exclude_flagged: bool = False) -> Dict[str, List[Dict[str, Any]]]:
         """Pobierz rozszerzone pomiary z konkretnej stacji z większą ilością punktów danych dla wykresów"""
         start_date = datetime.now() - timedelta(days=days)
 
@@ -167,6 +619,7 @@ class DatabaseService:
             .filter(
                 StanMeasurement.station_id == station_id,
                 StanMeasurement.stan_wody_data_pomiaru >= start_date,
+                *([StanMeasurement.flaga.is_(None)] if exclude_flagged else []),
             )
             .order_by(StanMeasurement.stan_wody_data_pomiaru.desc())
             .limit(limit)
@@ -178,6 +631,7 @@ class DatabaseService:
             .filter(
                 PrzeplywMeasurement.station_id == station_id,
                 PrzeplywMeasurement.przeplyw_data >= start_date,
+                *([PrzeplywMeasurement.flaga.is_(None)] if exclude_flagged else []),
             )
             .order_by(PrzeplywMeasurement.przeplyw_data.desc())
             .limit(limit)
@@ -189,10 +643,10 @@ class DatabaseService:
 
         result = {
             "stan": [
-                {"stan_wody_data_pomiaru": m.stan_wody_data_pomiaru, "stan_wody": m.stan_wody} for m in stan_measurements
+                {"stan_wody_data_pomiaru": m.stan_wody_data_pomiaru, "stan_wody": m.stan_wody, "flaga": m.flaga} for m in stan_measurements
             ],
             "przelyw": [
-                {"przeplyw_data": m.przeplyw_data, "przelyw": m.przelyw}
+                {"przeplyw_data": m.przeplyw_data, "przelyw": m.przelyw, "flaga": m.flaga}
                 for m in przeplyw_measurements
             ],
         }
@@ -234,10 +688,10 @@ class DatabaseService:
 
         result = {
             "stan": [
-                {"stan_wody_data_pomiaru": m.stan_wody_data_pomiaru, "stan_wody": m.stan_wody} for m in stan_measurements
+                {"stan_wody_data_pomiaru": m.stan_wody_data_pomiaru, "stan_wody": m.stan_wody, "flaga": m.flaga} for m in stan_measurements
             ],
             "przelyw": [
-                {"przeplyw_data": m.przeplyw_data, "przelyw": m.przelyw}
+                {"przeplyw_data": m.przeplyw_data, "przelyw": m.przelyw, "flaga": m.flaga}
                 for m in przeplyw_measurements
             ],
             "has_more": len(stan_measurements) == batch_size or len(przeplyw_measurements) == batch_size,
@@ -248,6 +702,126 @@ class DatabaseService:
 
         return result
 
+    def get_station_series(
+        self, station_id: str, days: int = 1, limit: Optional[int] = None, exclude_flagged: bool = False
+    ) -> Dict[str, Tuple[List[datetime], List[float]]]:
+        """Pobierz serie stanu i przepływu jako kolumny (czasy, wartości), bez obiektów ORM.
+
+        Przy podanym limicie zwraca najnowsze pomiary, jak get_station_measurements_extended.
+        """
+        start_date = datetime.now() - timedelta(days=days)
+        result = {}
+
+        for name, model, time_column, value_column in (
+            ("stan", StanMeasurement, StanMeasurement.stan_wody_data_pomiaru, StanMeasurement.stan_wody),
+            ("przelyw", PrzeplywMeasurement, PrzeplywMeasurement.przeplyw_data, PrzeplywMeasurement.przelyw),
+        ):
+            statement = select(time_column, value_column).where(
+                model.station_id == station_id, time_column >= start_date
+            )
+            if exclude_flagged:
+                statement = statement.where(model.flaga.is_(None))
+            if limit:
+                rows = self.db.execute(statement.order_by(time_column.desc()).limit(limit)).all()
+                rows.reverse()
+            else:
+                rows = self.db.execute(statement.order_by(time_column.asc())).all()
+            result[name] = ([row[0] for row in rows], [row[1] for row in rows])
+
+        return result
+
+    STATS_PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+    def get_station_stats(
+        self,
+        station_ids: Optional[List[str]] = None,
+        days: int = 7,
+        exclude_flagged: bool = False,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Dict[str, Optional[Dict[str, Any]]]]:
+        """Policz statystyki serii stanu i przepływu w oknie czasowym agregatami SQL.
+
+        Jedno zapytanie GROUP BY na rodzaj pomiaru, niezależnie od liczby stacji.
+        Przy podanym limicie liczy tylko najnowsze pomiary każdej stacji - to samo
+        okno, które zwraca get_station_series z tym limitem.
+        Zwraca {station_id: {"stan": {...} | None, "przelyw": {...} | None}}.
+        """
+        start_date = datetime.now() - timedelta(days=days)
+        result: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+
+        for name, model, time_column, value_column in (
+            ("stan", StanMeasurement, StanMeasurement.stan_wody_data_pomiaru, StanMeasurement.stan_wody),
+            ("przelyw", PrzeplywMeasurement, PrzeplywMeasurement.przeplyw_data, PrzeplywMeasurement.przelyw),
+        ):
+            columns = [model.station_id.label("station_id"), time_column.label("czas"), value_column.label("wartosc")]
+            if limit:
+                columns.append(
+                    func.row_number().over(partition_by=model.station_id, order_by=time_column.desc()).label("nr")
+                )
+            readings = select(*columns).where(time_column >= start_date)
+            if station_ids:
+                readings = readings.where(model.station_id.in_(station_ids))
+            if exclude_flagged:
+                readings = readings.where(model.flaga.is_(None))
+            readings = readings.subquery()
+
+            statement = (
+                select(
+                    readings.c.station_id,
+                    func.count(),
+                    func.min(readings.c.wartosc),
+                    func.max(readings.c.wartosc),
+                    func.avg(readings.c.wartosc),
+                    func.stddev_samp(readings.c.wartosc),
+                    func.percentile_cont(
+                        array(self.STATS_PERCENTILES), type_=ARRAY(Float)
+                    ).within_group(readings.c.wartosc),
+                    func.array_agg(
+                        aggregate_order_by(readings.c.wartosc, readings.c.czas.desc()), type_=ARRAY(Float)
+                    )[1],
+                    func.max(readings.c.czas),
+                )
+                .group_by(readings.c.station_id)
+            )
+            if limit:
+                statement = statement.where(readings.c.nr <= limit)
+
+            for station_id, count, minimum, maximum, mean, std, percentiles, latest, latest_time in self.db.execute(statement):
+                stats = {
+                    "count": count,
+                    "min": minimum,
+                    "max": maximum,
+                    "mean": mean,
+                    "std": std,
+                    "p10": percentiles[0],
+                    "p25": percentiles[1],
+                    "median": percentiles[2],
+                    "p75": percentiles[3],
+                    "p90": percentiles[4],
+                    "latest": latest,
+                    "latest_time": latest_time,
+                    "delta_mean": latest - mean,
+                    "z_score": (latest - mean) / std if std else None,
+                }
+                result.setdefault(station_id, {"stan": None, "przelyw": None})[name] = stats
+
+        return result
+
+    def get_last_ingest_time(self, station_id: Optional[str] = None) -> Optional[datetime]:
+        """Czas najnowszego zapisanego pomiaru (stacji lub globalnie) - tani klucz wersji dla cache"""
+        latest = []
+        for model, time_column in (
+            (StanMeasurement, StanMeasurement.stan_wody_data_pomiaru),
+            (PrzeplywMeasurement, PrzeplywMeasurement.przeplyw_data),
+        ):
+            statement = select(func.max(time_column))
+            if station_id:
+                statement = statement.where(model.station_id == station_id)
+            value = self.db.execute(statement).scalar()
+            if value is not None:
+                latest.append(value)
+        return max(latest) if latest else None
+
     def get_latest_measurements_for_all_stations(self) -> Dict[str, Dict[str, Any]]:
         """Pobierz najnowsze pomiary dla wszystkich stacji"""
         latest_stan_subquery = (
@@ -308,3 +882,51 @@ class DatabaseService:
         
         logger.info(f"Retrieved latest measurements for {len(result)} stations")
         return result
+
+    def iter_measurements(
+        self,
+        kind: str = "stan",
+        station_ids: Optional[List[str]] = None,
+        wojewodztwo: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        batch_size: int = 5000,
+        exclude_flagged: bool = False,
+    ) -> Iterator[List[Tuple[str, datetime, float]]]:
+        """Strumieniuj pomiary (station_id, data, wartość) partiami przez kursor po stronie serwera.
+
+        Zwraca kolejne listy krotek o długości co najwyżej batch_size, bez tworzenia
+        obiektów ORM, więc zużycie pamięci nie zależy od rozmiaru eksportu.
+        """
+        if kind == "przeplyw":
+            model = PrzeplywMeasurement
+            time_column = PrzeplywMeasurement.przeplyw_data
+            value_column = PrzeplywMeasurement.przelyw
+        else:
+            model = StanMeasurement
+            time_column = StanMeasurement.stan_wody_data_pomiaru
+            value_column = StanMeasurement.stan_wody
+
+        statement = select(model.station_id, time_column, value_column)
+        if wojewodztwo:
+            statement = statement.join(Station, Station.id_stacji == model.station_id).where(
+                Station.wojewodztwo == wojewodztwo
+            )
+        if station_ids:
+            statement = statement.where(model.station_id.in_(station_ids))
+        if date_from:
+            statement = statement.where(time_column >= date_from)
+        if date_to:
+            statement = statement.where(time_column < date_to)
+        if exclude_flagged:
+            statement = statement.where(model.flaga.is_(None))
+        statement = statement.order_by(model.station_id, time_column).execution_options(
+            yield_per=batch_size
+        )
+
+        result = self.db.execute(statement)
+        try:
+            for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+        finally:
+            result.close()
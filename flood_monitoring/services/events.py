@@ -0,0 +1,222 @@
+"""
+Kanał zdarzeń o nowych danych (publikacja z ingestii, subskrypcja przez SSE)
+"""
+import asyncio
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from flood_monitoring.core.cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "flood_events"
+
+
+class EventBroker:
+    """Prosty broker publish/subscribe w obrębie procesu.
+
+    Każdy subskrybent ma własną ograniczoną kolejkę - wolny klient traci najstarsze
+    zdarzenia zamiast blokować ingestię. Ostatnie zdarzenia są trzymane w buforze,
+    żeby klient wznawiający połączenie (Last-Event-ID) mógł nadrobić zaległości.
+    Metody publish/subscribe wywołujemy z pętli zdarzeń.
+
+    Identyfikator zdarzenia to znacznik czasu w mikrosekundach - rośnie monotonicznie
+    i jest porównywalny między workerami, więc Last-Event-ID działa także po
+    ponownym połączeniu z innym workerem.
+    """
+
+    def __init__(self, queue_size: int = 256, history_size: int = 512):
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._last_id = 0
+        self._bridge: Optional["PgNotifyBridge"] = None
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+    def use_bridge(self, bridge: Optional["PgNotifyBridge"]):
+        """Publikuj przez most między procesami zamiast bezpośrednio do subskrybentów"""
+        self._bridge = bridge
+
+    def handle(self, event_type: str, handler: Callable[[Dict[str, Any]], None]):
+        """Zdarzenia tego typu są wewnętrzne: w każdym workerze wywołują handler(data)
+        zamiast trafiać do subskrybentów SSE"""
+        self._handlers[event_type] = handler
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        event = {"id": self._last_id, "type": event_type, "data": data}
+        if self._bridge is not None:
+            # Zdarzenie wróci przez LISTEN (także do tego procesu) i wtedy trafi do dispatch()
+            self._bridge.send(event)
+        else:
+            self.dispatch(event)
+        return event
+
+    def dispatch(self, event: Dict[str, Any]):
+        """Dostarcz zdarzenie lokalnym subskrybentom"""
+        self._last_id = max(self._last_id, event["id"])
+        handler = self._handlers.get(event["type"])
+        if handler is not None:
+            handler(event["data"])
+            return event
+        self._history.append(event)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+        return event
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id is not None:
+            for event in self.history_since(last_event_id)[-self.queue_size:]:
+                queue.put_nowait(event)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def history_since(self, last_event_id: int) -> List[Dict[str, Any]]:
+        return [event for event in self._history if event["id"] > last_event_id]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+class PgNotifyBridge:
+    """Rozsyła zdarzenia do wszystkich workerów przez LISTEN/NOTIFY PostgreSQL.
+
+    Przy kilku workerach ingestia działa tylko w jednym z nich, a klienci SSE są
+    podłączeni do dowolnego. Każdy worker nasłuchuje na kanale w osobnym wątku
+    (na dedykowanym połączeniu spoza puli) i przekazuje zdarzenia do swojego
+    brokera w pętli zdarzeń.
+
+    Wysyłka też nie blokuje pętli zdarzeń: send() tylko wkłada zdarzenie do
+    kolejki, a osobny wątek wysyła zebrane zdarzenia w jednej transakcji.
+    Przy przepełnionej kolejce (baza niedostępna) najnowsze zdarzenia są gubione.
+    """
+
+    POLL_TIMEOUT = 5
+    RECONNECT_DELAY = 5
+    OUTBOX_SIZE = 10000
+    SEND_BATCH = 500
+
+    def __init__(self, broker: EventBroker, engine: Engine, channel: str = EVENTS_CHANNEL):
+        self.broker = broker
+        self.engine = engine
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sender: Optional[threading.Thread] = None
+        self._outbox: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=self.OUTBOX_SIZE)
+
+    def send(self, event: Dict[str, Any]):
+        try:
+            self._outbox.put_nowait(event)
+        except queue.Full:
+            logger.warning("Event outbox full - dropping event %s", event["id"])
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, args=(loop,), name="events-listen", daemon=True
+        )
+        self._thread.start()
+        self._sender = threading.Thread(target=self._send_loop, name="events-send", daemon=True)
+        self._sender.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sender is not None:
+            self._outbox.put(None)
+            self._sender.join(timeout=self.POLL_TIMEOUT + 1)
+            self._sender = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.POLL_TIMEOUT + 1)
+            self._thread = None
+
+    def _send_loop(self):
+        while True:
+            event = self._outbox.get()
+            batch = []
+            while event is not None:
+                batch.append(event)
+                if len(batch) >= self.SEND_BATCH:
+                    break
+                try:
+                    event = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._notify(batch)
+            if event is None:
+                return
+
+    def _notify(self, events: List[Dict[str, Any]]):
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    [
+                        {
+                            "channel": self.channel,
+                            "payload": json.dumps(event, ensure_ascii=False, separators=(",", ":")),
+                        }
+                        for event in events
+                    ],
+                )
+        except Exception as e:
+            logger.warning("Failed to send %d events: %s", len(events), e)
+
+    def _listen(self, loop: asyncio.AbstractEventLoop):
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                logger.debug("Listening for events on channel %s", self.channel)
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], self.POLL_TIMEOUT) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        loop.call_soon_threadsafe(self.broker.dispatch, json.loads(notify.payload))
+            except Exception as e:
+                logger.warning("Event listener connection failed: %s", e)
+                self._stop.wait(self.RECONNECT_DELAY)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+event_broker = EventBroker()
+event_broker.handle("cache_invalidate", lambda data: response_cache.invalidate(data["prefix"]))
+
+
+def invalidate_response_cache(*prefixes: str):
+    """Unieważnij cache odpowiedzi we wszystkich workerach (domyślnie cały).
+
+    Lokalny cache jest czyszczony od razu, pozostałe workery dostają zdarzenie
+    przez most LISTEN/NOTIFY. Bez EVENTS_PG_NOTIFY pozostałe workery odświeżą
+    wpisy dopiero po RESPONSE_CACHE_TTL.
+    """
+    for prefix in prefixes or ("",):
+        response_cache.invalidate(prefix)
+        event_broker.publish("cache_invalidate", {"prefix": prefix})
@@ -0,0 +1,178 @@
+"""
+Serializacja pomiarów: eksport strumieniowy (CSV / NDJSON / Parquet) i Arrow IPC
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+Row = Tuple[str, object, float]
+
+EXPORT_COLUMNS = {
+    "stan": ("station_id", "stan_wody_data_pomiaru", "stan_wody"),
+    "przeplyw": ("station_id", "przeplyw_data", "przelyw"),
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def batch_to_arrow(batch: List[Row], columns: Tuple[str, str, str]) -> pa.RecordBatch:
+    """Zamień partię krotek na kolumnowy RecordBatch"""
+    station_ids, timestamps, values = zip(*batch) if batch else ((), (), ())
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(station_ids, type=pa.string()),
+            pa.array(timestamps, type=pa.timestamp("s")),
+            pa.array(values, type=pa.float64()),
+        ],
+        names=list(columns),
+    )
+
+
+def iter_csv(batches: Iterable[List[Row]], kind: str) -> Iterator[bytes]:
+    """Generuj CSV partiami - jeden fragment odpowiedzi na partię z bazy"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS[kind])
+    for batch in batches:
+        writer.writerows(
+            (station_id, timestamp.isoformat(), value)
+            for station_id, timestamp, value in batch
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(batches: Iterable[List[Row]], kind: str) -> Iterator[bytes]:
+    """Generuj NDJSON partiami (jeden obiekt JSON na linię)"""
+    id_column, time_column, value_column = EXPORT_COLUMNS[kind]
+    for batch in batches:
+        lines = [
+            json.dumps(
+                {
+                    id_column: station_id,
+                    time_column: timestamp.isoformat(),
+                    value_column: value,
+                },
+                ensure_ascii=False,
+            )
+            for station_id, timestamp, value in batch
+        ]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """Minimalny obiekt plikowy zbierający bajty zapisane przez ParquetWriter"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_parquet(batches: Iterable[List[Row]], kind: str) -> Iterator[bytes]:
+    """Generuj Parquet - każda partia z bazy to osobna grupa wierszy (row group)"""
+    columns = EXPORT_COLUMNS[kind]
+    schema = batch_to_arrow([], columns).schema
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            writer.write_batch(batch_to_arrow(batch, columns))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS = {
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+    "parquet": iter_parquet,
+}
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def wants_arrow(accept_header: Optional[str]) -> bool:
+    """Sprawdź, czy klient zaakceptuje odpowiedź w formacie Arrow IPC"""
+    return bool(accept_header) and ARROW_STREAM_MEDIA_TYPE in accept_header
+
+
+def series_to_arrow_ipc(series: Dict[str, Tuple[list, list]]) -> bytes:
+    """Zserializuj serie czasowe do strumienia Arrow IPC.
+
+    Każda seria to osobny RecordBatch (czas: timestamp[s], wartosc: float64)
+    w kolejności kluczy słownika; nazwy serii i liczby wierszy są zapisane
+    w metadanych schematu ("serie"), więc klient może pociąć tabelę bez kopiowania.
+    """
+    schema = pa.schema(
+        [("czas", pa.timestamp("s")), ("wartosc", pa.float64())],
+        metadata={
+            "serie": json.dumps({name: len(times) for name, (times, _) in series.items()})
+        },
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for times, values in series.values():
+            writer.write_batch(
+                pa.RecordBatch.from_arrays(
+                    [
+                        pa.array(times, type=pa.timestamp("s")),
+                        pa.array(values, type=pa.float64()),
+                    ],
+                    schema=schema,
+                )
+            )
+    return sink.getvalue().to_pybytes()
+
+
+def matrix_to_arrow_ipc(grid: Iterable, columns: Dict[str, Iterable[float]]) -> bytes:
+    """Zserializuj wyrównaną macierz (czas x stacja) jako jeden RecordBatch Arrow IPC.
+
+    Kolumna czas: timestamp[s], dalej po jednej kolumnie float64 na stację
+    (nazwą kolumny jest id stacji); NaN zapisywane są jako null.
+    """
+    arrays = [pa.array(grid, type=pa.timestamp("s"))]
+    arrays += [pa.array(values, type=pa.float64(), from_pandas=True) for values in columns.values()]
+    batch = pa.RecordBatch.from_arrays(arrays, names=["czas", *columns.keys()])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
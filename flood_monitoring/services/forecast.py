@@ -0,0 +1,212 @@
+"""
+Krótkoterminowa prognoza stanu wody dla wszystkich stacji naraz (modele AR + stacja powyżej)
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from flood_monitoring.services.resample import resample_stations
+
+logger = logging.getLogger(__name__)
+
+FORECAST_STEP = "1h"
+# Luki w siatce godzinowej uzupełniane interpolacją do 3 h; stacje z danymi
+# opóźnionymi o więcej niż MAX_DELAY_HOURS nie dostają prognozy
+MAX_GAP_HOURS = 3
+MAX_DELAY_HOURS = 3
+RIDGE = 1e-2
+Z_95 = 1.96
+
+
+def align_to_last(levels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Przesuń każdą kolumnę w dół tak, by jej ostatnia znana wartość była w ostatnim wierszu.
+
+    Zwraca (macierz wyrównana, opóźnienie każdej stacji w krokach). Nic nie jest
+    dopełniane - stacja z danymi opóźnionymi o d godzin prognozuje od swojego
+    ostatniego odczytu, d kroków dłużej. Kolumny bez danych mają opóźnienie = liczba wierszy.
+    """
+    rows = levels.shape[0]
+    valid = ~np.isnan(levels)
+    delay = np.where(valid.any(axis=0), np.argmax(valid[::-1], axis=0), rows)
+    source = np.arange(rows)[:, None] - delay[None, :]
+    aligned = levels[np.clip(source, 0, rows - 1), np.arange(levels.shape[1])[None, :]]
+    return np.where(source >= 0, aligned, np.nan), delay
+
+
+def upstream_regressor(diffs: np.ndarray, upstream: np.ndarray, lags: np.ndarray) -> np.ndarray:
+    """Zmiana stanu stacji powyżej przesunięta o czas dojścia fali: U[t, s] = D[t - lag_s, up_s].
+
+    Stacje bez stacji powyżej mają kolumnę zer; brak danych to NaN.
+    """
+    rows = np.arange(diffs.shape[0])[:, None] - lags[None, :]
+    has_upstream = upstream >= 0
+    values = diffs[np.clip(rows, 0, None), np.maximum(upstream, 0)[None, :]]
+    values = np.where(rows >= 0, values, np.nan)
+    return np.where(has_upstream[None, :], values, 0.0)
+
+
+def fit_batched(diffs: np.ndarray, exogenous: np.ndarray, order: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Dopasuj modele dla wszystkich stacji jednym układem równań normalnych.
+
+    Model stacji s: D[t] = c + sum_k a_k D[t-k] + b U[t] (D - zmiana godzinowa stanu).
+    Wiersze z brakami mają wagę 0; X^T X wszystkich stacji liczone jest przez einsum,
+    a układy rozwiązywane razem przez np.linalg.solve z małą regularyzacją grzbietową.
+    Zwraca (współczynniki S x P, odchylenie reszt S, liczba wierszy S).
+    """
+    steps, stations = diffs.shape
+    samples = steps - order
+    lagged = [diffs[order - k: steps - k] for k in range(1, order + 1)]
+    features = np.stack(
+        [np.ones((samples, stations)), *lagged, exogenous[order:]], axis=-1
+    ).transpose(1, 0, 2)
+    target = diffs[order:].T
+
+    valid = np.isfinite(target) & np.isfinite(features).all(axis=-1)
+    features = np.where(valid[..., None], features, 0.0)
+    target = np.where(valid, target, 0.0)
+    counts = valid.sum(axis=1)
+
+    parameters = features.shape[-1]
+    gram = np.einsum("snp,snq->spq", features, features)
+    gram += RIDGE * np.maximum(counts, 1)[:, None, None] * np.eye(parameters)
+    moments = np.einsum("snp,sn->sp", features, target)
+    coefficients = np.linalg.solve(gram, moments[..., None])[..., 0]
+
+    residuals = np.where(valid, target - np.einsum("snp,sp->sn", features, coefficients), 0.0)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / np.maximum(counts - parameters, 1))
+    return coefficients, sigma, counts
+
+
+def forecast_batched(
+    diffs: np.ndarray,
+    coefficients: np.ndarray,
+    upstream: np.ndarray,
+    lags: np.ndarray,
+    order: int,
+    horizon: int,
+) -> np.ndarray:
+    """Prognoza rekurencyjna zmian stanu (horizon x S), krok po kroku dla wszystkich stacji.
+
+    Zmiana stacji powyżej jest brana z obserwacji, dopóki opóźnienie na to pozwala,
+    a dalej z jej własnej prognozy z wcześniejszego kroku. Prognozowane zmiany są
+    ograniczane do zakresu zaobserwowanego na stacji, żeby model niestabilny nie uciekł.
+    """
+    steps, stations = diffs.shape
+    history = np.nan_to_num(diffs[-order:][::-1])
+    lower = np.nan_to_num(np.nanmin(diffs, axis=0, initial=0.0))
+    upper = np.nan_to_num(np.nanmax(diffs, axis=0, initial=0.0))
+    has_upstream = upstream >= 0
+    up = np.maximum(upstream, 0)
+
+    forecast = np.zeros((horizon, stations))
+    for step in range(1, horizon + 1):
+        source = step - lags
+        observed = np.nan_to_num(diffs[np.clip(steps - 1 + source, 0, steps - 1), up])
+        predicted = forecast[np.clip(source - 1, 0, horizon - 1), up]
+        exogenous = np.where(has_upstream, np.where(source <= 0, observed, predicted), 0.0)
+
+        features = np.concatenate([np.ones((1, stations)), history, exogenous[None, :]])
+        change = np.clip(np.einsum("ps,sp->s", features, coefficients), lower, upper)
+        forecast[step - 1] = change
+        history = np.concatenate([change[None, :], history[:-1]])
+    return forecast
+
+
+def forecast_from_last(
+    levels: np.ndarray,
+    coefficients: np.ndarray,
+    sigma: np.ndarray,
+    upstream: np.ndarray,
+    lags: np.ndarray,
+    order: int,
+    horizon: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Prognoza stanu na 1..horizon kroków po ostatnim wierszu siatki (horizon x S).
+
+    Każda stacja startuje od swojego ostatniego odczytu: historia i punkt wyjścia
+    pochodzą z wyrównanej macierzy (align_to_last), a prognoza opóźnionej stacji
+    jest o jej opóźnienie dłuższa. Opóźnienie fali ze stacji powyżej jest
+    przeliczane na przesunięcie między wyrównanymi kolumnami.
+    Zwraca (stan, połowa szerokości 95% przedziału, maska stacji z prognozą).
+    """
+    aligned, delay = align_to_last(levels)
+    usable = delay <= MAX_DELAY_HOURS
+    shift = np.where(usable, delay, 0)
+    steps = horizon + int(shift.max(initial=0))
+
+    aligned_lags = np.maximum(1, lags + shift - delay[np.maximum(upstream, 0)])
+    changes = forecast_batched(np.diff(aligned, axis=0), coefficients, upstream, aligned_lags, order, steps)
+
+    columns = np.arange(levels.shape[1])
+    ahead = shift[None, :] + np.arange(1, horizon + 1)[:, None]
+    predicted = aligned[-1] + np.cumsum(changes, axis=0)[ahead - 1, columns]
+    spread = Z_95 * sigma[None, :] * np.sqrt(ahead)
+    return predicted, spread, usable & np.isfinite(aligned[-1])
+
+
+def compute_forecasts(
+    db_service,
+    horizon: int = 12,
+    order: int = 3,
+    days: int = 7,
+) -> List[Dict[str, Any]]:
+    """Prognozy stanu wody na 1..horizon godzin dla wszystkich stacji.
+
+    Stan z ostatnich days dni jest wyrównywany do siatki godzinowej, stacją powyżej
+    jest najsilniej skorelowana stacja z station_lags. Stacje z danymi starszymi niż
+    MAX_DELAY_HOURS albo zbyt krótką historią są pomijane.
+    """
+    started = time.perf_counter()
+    station_ids = db_service.get_forecast_station_ids()
+    if not station_ids:
+        return []
+    neighbours = db_service.get_upstream_neighbours()
+
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    batches = db_service.iter_measurements("stan", station_ids, date_from=start, exclude_flagged=True)
+    grid, columns = resample_stations(batches, station_ids, start, end, FORECAST_STEP, "mean", MAX_GAP_HOURS)
+    if len(grid) <= order + 2:
+        return []
+
+    levels = np.column_stack([columns[station_id] for station_id in station_ids])
+    diffs = np.diff(levels, axis=0)
+
+    position = {station_id: i for i, station_id in enumerate(station_ids)}
+    upstream = np.full(len(station_ids), -1)
+    lags = np.ones(len(station_ids), dtype=int)
+    for station_id, (upstream_id, lag_hours) in neighbours.items():
+        if station_id in position and upstream_id in position:
+            upstream[position[station_id]] = position[upstream_id]
+            lags[position[station_id]] = max(1, int(round(lag_hours)))
+
+    exogenous = upstream_regressor(diffs, upstream, lags)
+    coefficients, sigma, counts = fit_batched(diffs, exogenous, order)
+    predicted, spread, usable = forecast_from_last(levels, coefficients, sigma, upstream, lags, order, horizon)
+    usable &= counts >= 4 * coefficients.shape[1]
+
+    generated_at = grid[-1].to_pydatetime()
+    rows = [
+        {
+            "station_id": station_ids[s],
+            "horyzont": step + 1,
+            "czas": generated_at + timedelta(hours=step + 1),
+            "stan_wody": round(float(predicted[step, s]), 1),
+            "dolna": round(float(predicted[step, s] - spread[step, s]), 1),
+            "gorna": round(float(predicted[step, s] + spread[step, s]), 1),
+            "wygenerowano": generated_at,
+        }
+        for s in np.flatnonzero(usable)
+        for step in range(horizon)
+    ]
+    logger.info(
+        "Computed %dh forecasts for %d of %d stations in %.1fs",
+        horizon,
+        int(usable.sum()),
+        len(station_ids),
+        time.perf_counter() - started,
+    )
+    return rows
@@ -0,0 +1,79 @@
+"""
+Sprawdzanie dostępności API IMGW w tle (wynik trzymany w pamięci)
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamProbe:
+    """Okresowo sprawdza dostępność URL i zapamiętuje ostatni wynik.
+
+    Endpointy zdrowia odczytują tylko zapamiętany wynik, więc nie generują ruchu
+    do IMGW i nie czekają na jego odpowiedź.
+    """
+
+    def __init__(self, url: str, interval: float = 60, timeout: float = 10):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.ok: Optional[bool] = None
+        self.detail = "not checked yet"
+        self.latency: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self) -> bool:
+        started = time.monotonic()
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout) as session:
+                async with session.get(self.url) as response:
+                    self.ok = response.status == 200
+                    self.detail = f"status {response.status}"
+        except Exception as e:
+            self.ok = False
+            self.detail = f"error: {str(e) or type(e).__name__}"
+        self.latency = time.monotonic() - started
+        self.checked_at = time.monotonic()
+        if not self.ok:
+            logger.warning("IMGW API probe failed: %s", self.detail)
+        return self.ok
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        age = None if self.checked_at is None else round(time.monotonic() - self.checked_at, 1)
+        if self.ok is None:
+            state = "unknown"
+        else:
+            state = "connected" if self.ok else "unreachable"
+        if age is not None and age > 3 * self.interval:
+            state = "stale"
+        return {
+            "status": state,
+            "detail": self.detail,
+            "age_seconds": age,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+        }
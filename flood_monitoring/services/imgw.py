@@ -2,19 +2,81 @@
 Serwis do pobierania danych z IMGW
 """
 import logging
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import aiohttp
 
 from flood_monitoring.core.config import get_settings
+from flood_monitoring.core.metrics import (
+    IMGW_REQUEST_ERRORS,
+    INGEST_READINGS,
+    INGEST_STATIONS_FETCHED,
+    track_imgw_request,
+)
 from flood_monitoring.services.database import DatabaseService
-from flood_monitoring.models.warnings import WarningArea, HydroWarning
+from flood_monitoring.services.events import event_broker
+from flood_monitoring.models.warnings import WarningArea, HydroWarning, kod_zlewni_prefixes
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+@dataclass
+class SyncStats:
+    """Zagregowane liczniki jednego przebiegu synchronizacji.
+
+    Zdarzenia per stacja są tylko zliczane; na koniec przebiegu zapisywany jest
+    jeden rekord podsumowania. Indywidualnie logowanych jest tylko kilka
+    pierwszych błędów.
+    """
+
+    MAX_LOGGED_ERRORS = 5
+
+    started: float = field(default_factory=time.monotonic)
+    stations: int = 0
+    inserted: Dict[str, int] = field(default_factory=lambda: {"stan": 0, "przeplyw": 0})
+    skipped: Dict[str, int] = field(default_factory=lambda: {"stan": 0, "przeplyw": 0})
+    invalid: int = 0
+    errors: int = 0
+
+    def record_reading(self, kind: str, inserted: bool):
+        INGEST_READINGS.labels(kind, "inserted" if inserted else "skipped").inc()
+        if inserted:
+            self.inserted[kind] += 1
+        else:
+            self.skipped[kind] += 1
+
+    def record_error(self, station_id: str, error: Any):
+        self.errors += 1
+        if self.errors <= self.MAX_LOGGED_ERRORS:
+            logger.warning("Sync failed for station %s: %s", station_id, error)
+        elif self.errors == self.MAX_LOGGED_ERRORS + 1:
+            logger.warning("Further per-station sync errors suppressed until the run summary")
+
+    def log_summary(self, run: str):
+        duration = time.monotonic() - self.started
+        logger.info(
+            "Sync run '%s' finished in %.1f s: %d stations, inserted %d stan / %d przeplyw, "
+            "skipped %d stan / %d przeplyw, %d invalid, %d errors",
+            run, duration, self.stations,
+            self.inserted["stan"], self.inserted["przeplyw"],
+            self.skipped["stan"], self.skipped["przeplyw"],
+            self.invalid, self.errors,
+            extra={
+                "sync_run": run,
+                "duration_s": round(duration, 2),
+                "stations": self.stations,
+                "inserted": self.inserted,
+                "skipped": self.skipped,
+                "invalid": self.invalid,
+                "errors": self.errors,
+            },
+        )
+
+
 class IMGWService:
     """Serwis do obsługi danych z IMGW"""
 
@@ -22,34 +84,48 @@ class IMGWService:
         self.db_service = db_service
         self.base_url = settings.IMGW_API_URL
         self.warnings_url = settings.IMGW_WARNINGS_URL
+        self.stats = SyncStats()
+
+    def start_sync_run(self) -> SyncStats:
+        """Rozpocznij nowy przebieg synchronizacji z wyzerowanymi licznikami"""
+        self.stats = SyncStats()
+        return self.stats
+
+    async def _fetch_json(self, url: str, endpoint: str) -> Optional[Any]:
+        """Pobierz JSON z API IMGW, mierząc czas odpowiedzi. Zwraca None przy statusie innym niż 200."""
+        with track_imgw_request(endpoint):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        IMGW_REQUEST_ERRORS.labels(endpoint).inc()
+                        logger.debug("IMGW API returned status %s for %s", response.status, url)
+                        return None
+                    return await response.json()
 
     async def get_stations(self) -> List[Dict[str, Any]]:
         """Pobierz listę stacji pomiarowych i zaktualizuj bazę danych"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}") as response:
-                    if response.status == 200:
-                        stations = await response.json()
-                        for station in stations:
-                            try:
-                                self.db_service.get_or_create_station(
-                                    id_stacji=station["id_stacji"],
-                                    stacja=station["stacja"],
-                                    lat=float(station["lat"]),
-                                    lon=float(station["lon"]),
-                                    rzeka=station.get("rzeka"),
-                                    wojewodztwo=station.get("wojewodztwo")
-                                )
-                            except Exception as e:
-                                logger.error(
-                                    f"Error saving station {station['id_stacji']}: {str(e)}"
-                                )
-                        return stations
-                    else:
-                        logger.error(f"IMGW API returned status {response.status}")
-                        return []
+            stations = await self._fetch_json(f"{self.base_url}", "stations")
+            if stations is None:
+                return []
+            INGEST_STATIONS_FETCHED.inc(len(stations))
+            self.stats.stations = len(stations)
+            for station in stations:
+                try:
+                    self.db_service.get_or_create_station(
+                        id_stacji=station["id_stacji"],
+                        stacja=station["stacja"],
+                        lat=float(station["lat"]),
+                        lon=float(station["lon"]),
+                        rzeka=station.get("rzeka"),
+                        wojewodztwo=station.get("wojewodztwo"),
+                        kod_zlewni=station.get("kod_zlewni")
+                    )
+                except Exception as e:
+                    self.stats.record_error(station["id_stacji"], e)
+            return stations
         except Exception as e:
-            logger.error(f"Error fetching stations: {str(e)}")
+            logger.error("Error fetching stations: %s", e)
             return []
 
     def _parse_datetime(self, date_str: str) -> datetime:
@@ -81,154 +157,146 @@ class IMGWService:
 
             now = datetime.now()
             if parsed_date.date() > now.date():
-                logger.warning(f"Found future date: {date_str}, skipping")
+                logger.debug("Found future date: %s, skipping", date_str)
                 return None
             elif parsed_date.date() == now.date() and parsed_date.time() > now.time():
-                logger.warning(
-                    f"Found future time on current date: {date_str}, skipping"
-                )
+                logger.debug("Found future time on current date: %s, skipping", date_str)
                 return None
 
             return parsed_date
         except Exception as e:
-            logger.error(f"Error parsing date {date_str}: {str(e)}")
+            logger.debug("Error parsing date %s: %s", date_str, e)
             return None
 
     async def get_station_data_przelyw(self, station_id: str, days: int = 7) -> Dict[str, Any]:
         """Pobierz dane z konkretnej stacji i zaktualizuj bazę danych"""
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info(f"Fetching data for station {station_id} from IMGW API")
-                async with session.get(f"{self.base_url}/id/{station_id}") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(
-                            f"Received raw data from IMGW API for station {station_id}: {data}"
-                        )
+            logger.debug("Fetching przeplyw for station %s from IMGW API", station_id)
+            data = await self._fetch_json(f"{self.base_url}/id/{station_id}", "station")
+            if data is None:
+                self.stats.record_error(station_id, "IMGW API error")
+                return {"przeplyw_data": []}
 
-                        if not data or len(data) == 0:
-                            logger.warning(f"No data received for station {station_id}")
-                            return {"stan_wody": []}
-
-                        measurement = data[0]
-
-                        if (
-                            "przeplyw_data" in measurement
-                            and "przelyw" in measurement
-                            and measurement["przelyw"] is not None
-                        ):
-                            przeplyw_data = self._parse_datetime(measurement["przeplyw_data"])
-                            if przeplyw_data:
-                                if self.db_service.add_przeplyw_measurement(
-                                    station_id=station_id,
-                                    przeplyw_data=przeplyw_data,
-                                    przelyw=float(measurement["przelyw"]),
-                                ):
-                                    logger.info(
-                                        f"Dodano nowy pomiar dla stacji {station_id}"
-                                    )
-                                else:
-                                    logger.info(
-                                        f"Pomiar dla stacji {station_id} już istnieje w bazie"
-                                    )
-                                return {
-                                    "przelyw": [
-                                        {
-                                            "przeplyw_data": measurement["przeplyw_data"],
-                                            "przelyw": float(measurement["przelyw"]),
-                                        }
-                                    ]
-                                }
-
-                        logger.warning(
-                            f"Invalid measurement data for station {station_id}"
-                        )
-                        return {"przeplyw_data": []}
+            if not data or len(data) == 0:
+                self.stats.invalid += 1
+                logger.debug("No data received for station %s", station_id)
+                return {"stan_wody": []}
+
+            measurement = data[0]
+
+            if (
+                "przeplyw_data" in measurement
+                and "przelyw" in measurement
+                and measurement["przelyw"] is not None
+            ):
+                przeplyw_data = self._parse_datetime(measurement["przeplyw_data"])
+                if przeplyw_data:
+                    if self.db_service.add_przeplyw_measurement(
+                        station_id=station_id,
+                        przeplyw_data=przeplyw_data,
+                        przelyw=float(measurement["przelyw"]),
+                    ):
+                        self.stats.record_reading("przeplyw", inserted=True)
+                        logger.debug("Dodano nowy pomiar przeplywu dla stacji %s", station_id)
+                        event_broker.publish("measurement", {
+                            "station_id": station_id,
+                            "przeplyw": float(measurement["przelyw"]),
+                            "przeplyw_data": przeplyw_data.isoformat(),
+                        })
                     else:
-                        logger.error(
-                            f"IMGW API returned status {response.status} for station {station_id}"
-                        )
-                        return {"przeplyw_data": []}
+                        self.stats.record_reading("przeplyw", inserted=False)
+                    return {
+                        "przelyw": [
+                            {
+                                "przeplyw_data": measurement["przeplyw_data"],
+                                "przelyw": float(measurement["przelyw"]),
+                            }
+                        ]
+                    }
+
+            self.stats.invalid += 1
+            logger.debug("Invalid przeplyw data for station %s", station_id)
+            return {"przeplyw_data": []}
         except Exception as e:
-            logger.error(f"Error fetching data for station {station_id}: {str(e)}")
+            self.stats.record_error(station_id, e)
             return {"przelyw": []}
 
 
     async def get_station_data_stan(self, station_id: str, days: int = 7) -> Dict[str, Any]:
         """Pobierz dane z konkretnej stacji i zaktualizuj bazę danych"""
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info(f"Fetching data for station {station_id} from IMGW API")
-                async with session.get(f"{self.base_url}/id/{station_id}") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(
-                            f"Received raw data from IMGW API for station {station_id}: {data}"
-                        )
+            logger.debug("Fetching stan for station %s from IMGW API", station_id)
+            data = await self._fetch_json(f"{self.base_url}/id/{station_id}", "station")
+            if data is None:
+                self.stats.record_error(station_id, "IMGW API error")
+                return {"stan_wody_data_pomiaru": []}
 
-                        if not data or len(data) == 0:
-                            logger.warning(f"No data received for station {station_id}")
-                            return {"stan_wody": []}
-
-                        measurement = data[0]
-
-                        if (
-                            "stan_wody_data_pomiaru" in measurement
-                            and "stan_wody" in measurement
-                            and measurement["stan_wody"] is not None
-                        ):
-                            stan_wody_data_pomiaru = self._parse_datetime(measurement["stan_wody_data_pomiaru"])
-                            if stan_wody_data_pomiaru:
-                                if self.db_service.add_stan_measurement(
-                                    station_id=station_id,
-                                    stan_wody_data_pomiaru=stan_wody_data_pomiaru,
-                                    stan_wody=float(measurement["stan_wody"]),
-                                ):
-                                    logger.info(
-                                        f"Dodano nowy pomiar dla stacji {station_id}"
-                                    )
-                                else:
-                                    logger.info(
-                                        f"Pomiar dla stacji {station_id} już istnieje w bazie"
-                                    )
-
-                                return {
-                                    "stan_wody": [
-                                        {
-                                            "stan_wody_data_pomiaru": measurement["stan_wody_data_pomiaru"],
-                                            "stan_wody": float(measurement["stan_wody"]),
-                                        }
-                                    ]
-                                }
-
-                        logger.warning(
-                            f"Invalid measurement data for station {station_id}"
-                        )
-                        return {"stan_wody_data_pomiaru": []}
+            if not data or len(data) == 0:
+                self.stats.invalid += 1
+                logger.debug("No data received for station %s", station_id)
+                return {"stan_wody": []}
+
+            measurement = data[0]
+
+            if (
+                "stan_wody_data_pomiaru" in measurement
+                and "stan_wody" in measurement
+                and measurement["stan_wody"] is not None
+            ):
+                stan_wody_data_pomiaru = self._parse_datetime(measurement["stan_wody_data_pomiaru"])
+                if stan_wody_data_pomiaru:
+                    if self.db_service.add_stan_measurement(
+                        station_id=station_id,
+                        stan_wody_data_pomiaru=stan_wody_data_pomiaru,
+                        stan_wody=float(measurement["stan_wody"]),
+                    ):
+                        self.stats.record_reading("stan", inserted=True)
+                        logger.debug("Dodano nowy pomiar stanu dla stacji %s", station_id)
+                        event_broker.publish("measurement", {
+                            "station_id": station_id,
+                            "stan_wody": float(measurement["stan_wody"]),
+                            "stan_wody_data_pomiaru": stan_wody_data_pomiaru.isoformat(),
+                        })
                     else:
-                        logger.error(
-                            f"IMGW API returned status {response.status} for station {station_id}"
-                        )
-                        return {"stan_wody_data_pomiaru": []}
+                        self.stats.record_reading("stan", inserted=False)
+
+                    return {
+                        "stan_wody": [
+                            {
+                                "stan_wody_data_pomiaru": measurement["stan_wody_data_pomiaru"],
+                                "stan_wody": float(measurement["stan_wody"]),
+                            }
+                        ]
+                    }
+
+            self.stats.invalid += 1
+            logger.debug("Invalid stan data for station %s", station_id)
+            return {"stan_wody_data_pomiaru": []}
         except Exception as e:
-            logger.error(f"Error fetching data for station {station_id}: {str(e)}")
+            self.stats.record_error(station_id, e)
             return {"stan_wody": []}
 
+    async def get_station_data(self, station_id: str, days: int = 7) -> Dict[str, Any]:
+        """Pobierz stan wody i przepływ dla stacji i zaktualizuj bazę danych"""
+        measurement_stan = await self.get_station_data_stan(station_id, days=days)
+        measurement_przelyw = await self.get_station_data_przelyw(station_id, days=days)
+        return {
+            "stan_wody": measurement_stan.get("stan_wody", []),
+            "przelyw": measurement_przelyw.get("przelyw", []),
+        }
+
     async def get_warnings(self) -> List[Dict[str, Any]]:
         """Pobierz ostrzeżenia hydrologiczne z API IMGW"""
-        url = f"{self.warnings_url}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    raise Exception(f"Error fetching warnings: {response.status}")
+        data = await self._fetch_json(f"{self.warnings_url}", "warnings")
+        if data is None:
+            raise Exception("Error fetching warnings from IMGW API")
+        return data
 
     async def sync_warnings(self):
         """Synchronizuj ostrzeżenia hydrologiczne do bazy danych"""
         try:
             warnings = await self.get_warnings()
+            new_events = []
             for warning_data in warnings:
                 warning_data['opublikowano'] = datetime.strptime(warning_data['opublikowano'], '%Y-%m-%d %H:%M:%S')
                 warning_data['data_od'] = datetime.strptime(warning_data['data_od'], '%Y-%m-%d %H:%M:%S')
@@ -261,13 +329,27 @@ class IMGWService:
                             warning_id=new_warning.id,
                             wojewodztwo=area['wojewodztwo'],
                             opis=area['opis'],
-                            kod_zlewni=area['kod_zlewni']
+                            kod_zlewni=area['kod_zlewni'],
+                            kod_zlewni_prefiksy=kod_zlewni_prefixes(area['kod_zlewni'])
                         )
                         self.db_service.db.add(new_area)
 
-                self.db_service.db.commit()
-                logger.info(f"Synchronized {len(warnings)} warnings")
+                    new_events.append({
+                        "id": new_warning.id,
+                        "numer": warning_data['numer'],
+                        "stopien": warning_data['stopień'],
+                        "zdarzenie": warning_data['zdarzenie'],
+                        "data_od": warning_data['data_od'].isoformat(),
+                        "data_do": warning_data['data_do'].isoformat(),
+                        "wojewodztwa": sorted({area['wojewodztwo'] for area in warning_data['obszary']}),
+                    })
+
+            self.db_service.refresh_station_warnings()
+            self.db_service.db.commit()
+            for event in new_events:
+                event_broker.publish("warning", event)
+            logger.info("Synchronized %d warnings (%d new)", len(warnings), len(new_events))
         except Exception as e:
             self.db_service.db.rollback()
-            logger.error(f"Error syncing warnings: {str(e)}")
+            logger.error("Error syncing warnings: %s", e)
             raise
@@ -0,0 +1,99 @@
+"""
+Wyrównanie serii wielu stacji do wspólnej siatki czasu (macierz czas x stacja)
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+AGGREGATIONS = ("mean", "median", "min", "max", "first", "last")
+STEP_PATTERN = "^[1-9][0-9]*(min|h|d)$"
+# Górna granica liczby wierszy siatki - chroni przed krokiem 1min na 365 dniach
+MAX_GRID_POINTS = 20000
+
+
+def parse_step(step: str) -> pd.Timedelta:
+    """Krok siatki w zapisie 15min / 1h / 1d"""
+    return pd.Timedelta(step)
+
+
+def build_grid(start: datetime, end: datetime, step: pd.Timedelta) -> pd.DatetimeIndex:
+    """Siatka od start (zaokrąglonego w dół do kroku) do end włącznie"""
+    first = pd.Timestamp(start).floor(step)
+    count = int((pd.Timestamp(end) - first) // step) + 1
+    if count > MAX_GRID_POINTS:
+        raise ValueError(f"Siatka miałaby {count} punktów (limit {MAX_GRID_POINTS}) - zwiększ krok")
+    return pd.date_range(first, periods=max(count, 0), freq=step)
+
+
+def interpolate_gaps(matrix: np.ndarray, max_gap: int) -> np.ndarray:
+    """Liniowo uzupełnij wewnętrzne luki o długości co najwyżej max_gap kroków.
+
+    Działa na całej macierzy naraz: dla każdej komórki wyznacza indeks poprzedniej
+    i następnej wartości w kolumnie (akumulowane maksimum/minimum), dłuższe luki
+    oraz braki na brzegach serii zostają jako NaN.
+    """
+    if max_gap <= 0 or matrix.size == 0:
+        return matrix
+
+    rows = matrix.shape[0]
+    valid = ~np.isnan(matrix)
+    positions = np.arange(rows)[:, None]
+    previous = np.maximum.accumulate(np.where(valid, positions, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, positions, rows)[::-1], axis=0)[::-1]
+
+    fill = ~valid & (previous >= 0) & (following < rows) & (following - previous - 1 <= max_gap)
+    if not fill.any():
+        return matrix
+
+    columns = np.broadcast_to(np.arange(matrix.shape[1]), matrix.shape)
+    row_index, column_index = np.nonzero(fill)
+    lower = previous[fill]
+    upper = following[fill]
+    lower_values = matrix[lower, columns[fill]]
+    upper_values = matrix[upper, columns[fill]]
+    weight = (row_index - lower) / (upper - lower)
+
+    result = matrix.copy()
+    result[row_index, column_index] = lower_values + (upper_values - lower_values) * weight
+    return result
+
+
+def resample_stations(
+    batches: Iterable[List[Tuple[str, datetime, float]]],
+    station_ids: List[str],
+    start: datetime,
+    end: datetime,
+    step: str = "1h",
+    agg: str = "mean",
+    max_gap: int = 0,
+) -> Tuple[pd.DatetimeIndex, Dict[str, np.ndarray]]:
+    """Zagreguj pomiary (station_id, czas, wartość) do siatki o kroku step.
+
+    Pomiary z jednego przedziału [t, t + step) są łączone funkcją agg, luki do
+    max_gap kroków uzupełniane interpolacją liniową. Zwraca (siatka, {station_id:
+    wartości float64 z NaN tam, gdzie brak danych}) w kolejności station_ids.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Nieznana agregacja: {agg}")
+
+    delta = parse_step(step)
+    grid = build_grid(start, end, delta)
+    matrix = np.full((len(grid), len(station_ids)), np.nan)
+
+    rows = [row for batch in batches for row in batch]
+    if rows and len(grid):
+        frame = pd.DataFrame.from_records(rows, columns=["station_id", "czas", "wartosc"])
+        slot = (pd.to_datetime(frame["czas"]) - grid[0]) // delta
+        column = pd.Categorical(frame["station_id"], categories=station_ids).codes
+        inside = (slot >= 0) & (slot < len(grid)) & (column >= 0) & frame["wartosc"].notna()
+        frame = frame.assign(slot=slot, column=column)[inside]
+
+        binned = frame.groupby(["slot", "column"], sort=False)["wartosc"].agg(agg)
+        slots = binned.index.get_level_values("slot").to_numpy(dtype=np.int64)
+        columns = binned.index.get_level_values("column").to_numpy(dtype=np.int64)
+        matrix[slots, columns] = binned.to_numpy(dtype=float)
+
+    matrix = interpolate_gaps(matrix, max_gap)
+    return grid, {station_id: matrix[:, i] for i, station_id in enumerate(station_ids)}
@@ -0,0 +1,261 @@
+"""
+Analiza stacji na tej samej rzece: opóźnienia fali wezbraniowej między wodowskazami
+"""
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from flood_monitoring.services.resample import resample_stations
+
+logger = logging.getLogger(__name__)
+
+# Układ PUWG 1992 - metryczny układ współrzędnych dla obszaru Polski
+METRIC_CRS = "EPSG:2180"
+
+LAG_STEP = "1h"
+# Luki w siatce godzinowej uzupełniane interpolacją (w godzinach)
+LAG_MAX_GAP = 3
+
+
+def normalize_river_name(name: Optional[str]) -> Optional[str]:
+    """Klucz rzeki: małe litery, bez dopisków w nawiasach i nadmiarowych spacji"""
+    if not name:
+        return None
+    name = re.sub(r"\(.*?\)", " ", name)
+    name = re.sub(r"\s+", " ", name).strip(" .,-").casefold()
+    return name or None
+
+
+def lagged_correlation(matrix: np.ndarray, max_lag: int, min_overlap: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Korelacja wzajemna wszystkich par kolumn dla opóźnień -max_lag..max_lag przez FFT.
+
+    Korelowane są zmiany godzinowe (różnice), nie same stany - trend i sezonowość
+    poziomu zdominowałyby szczyt. Braki danych są zerowane po standaryzacji,
+    a sumy dzielone przez liczbę wspólnych punktów, liczoną tym samym splotem masek.
+    Zwraca (lag, korelacja, overlap) jako macierze N x N; lag[i, j] > 0 oznacza, że
+    zmiany w j następują po zmianach w i. Pary z overlap < min_overlap mają NaN.
+    """
+    diffs = np.diff(matrix, axis=0)
+    valid = ~np.isnan(diffs)
+    counts = valid.sum(axis=0)
+    means = np.where(counts > 0, np.nansum(diffs, axis=0) / np.maximum(counts, 1), 0.0)
+    centered = np.where(valid, diffs - means, 0.0)
+    stds = np.sqrt((centered ** 2).sum(axis=0) / np.maximum(counts, 1))
+    standardized = np.where(stds > 0, centered / np.where(stds > 0, stds, 1.0), 0.0)
+
+    length = diffs.shape[0]
+    n_fft = 1 << int(np.ceil(np.log2(max(2 * length, 2))))
+    spectrum = np.fft.rfft(standardized, n_fft, axis=0)
+    mask_spectrum = np.fft.rfft(valid.astype(float), n_fft, axis=0)
+
+    # cross[k, i, j] = sum_t z_i(t) * z_j(t + k) dla wszystkich par naraz
+    cross = np.fft.irfft(np.conj(spectrum)[:, :, None] * spectrum[:, None, :], n_fft, axis=0)
+    overlap = np.fft.irfft(np.conj(mask_spectrum)[:, :, None] * mask_spectrum[:, None, :], n_fft, axis=0)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    cross = cross[lags % n_fft]
+    overlap = np.rint(overlap[lags % n_fft])
+    correlation = np.where(overlap >= min_overlap, cross / np.maximum(overlap, 1), np.nan)
+
+    scores = np.where(np.isnan(correlation), -np.inf, correlation)
+    best = scores.argmax(axis=0)
+    rows, columns = np.indices(best.shape)
+    peak = correlation[best, rows, columns]
+
+    # Interpolacja paraboliczna wokół szczytu - opóźnienie z dokładnością poniżej kroku
+    inner = (best > 0) & (best < len(lags) - 1)
+    before = correlation[np.clip(best - 1, 0, len(lags) - 1), rows, columns]
+    after = correlation[np.clip(best + 1, 0, len(lags) - 1), rows, columns]
+    curvature = before - 2 * peak + after
+    shift = np.where(inner & (curvature < 0), 0.5 * (before - after) / np.where(curvature < 0, curvature, -1.0), 0.0)
+    shift = np.nan_to_num(np.clip(shift, -0.5, 0.5))
+
+    lag = np.where(np.isnan(peak), np.nan, lags[best] + shift)
+    # Standaryzacja po całej kolumnie, a nie po części wspólnej, może dać |r| nieco > 1
+    return lag, np.clip(peak, -1.0, 1.0), overlap[best, rows, columns].astype(int)
+
+
+def analyze_river(task: Tuple[str, List[str], np.ndarray, int, int]) -> List[Dict[str, Any]]:
+    """Opóźnienia dla wszystkich par stacji jednej rzeki (wywoływane w procesie puli).
+
+    Każda para zapisywana jest raz, w kierunku dodatniego opóźnienia: station_a
+    reaguje wcześniej niż station_b.
+    """
+    river, station_ids, matrix, max_lag, min_overlap = task
+    lag, correlation, overlap = lagged_correlation(matrix, max_lag, min_overlap)
+
+    results = []
+    for i, j in zip(*np.triu_indices(len(station_ids), 1)):
+        if np.isnan(correlation[i, j]):
+            continue
+        a, b, hours = station_ids[i], station_ids[j], float(lag[i, j])
+        if hours < 0:
+            a, b, hours = b, a, -hours
+        results.append(
+            {
+                "station_a": a,
+                "station_b": b,
+                "rzeka": river,
+                "lag_hours": round(hours, 2),
+                "korelacja": round(float(correlation[i, j]), 4),
+                "overlap_hours": int(overlap[i, j]),
+            }
+        )
+    return results
+
+
+def compute_river_lags(
+    db_service,
+    days: int = 30,
+    max_lag_hours: int = 72,
+    min_overlap_hours: int = 48,
+    workers: int = 0,
+) -> List[Dict[str, Any]]:
+    """Policz opóźnienia fali dla wszystkich rzek z co najmniej dwiema stacjami.
+
+    Pomiary stanu z okna days są raz wyrównywane do siatki godzinowej dla całej
+    sieci, potem kolumny stacji każdej rzeki trafiają do puli procesów
+    (workers=0 - tyle procesów, ile rdzeni).
+    """
+    started = time.perf_counter()
+    rivers = {
+        river: station_ids
+        for river, station_ids in db_service.get_river_stations().items()
+        if len(station_ids) > 1
+    }
+    station_ids = [station_id for ids in rivers.values() for station_id in ids]
+    if not station_ids:
+        return []
+
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    batches = db_service.iter_measurements(
+        "stan", station_ids, date_from=start, exclude_flagged=True
+    )
+    _, columns = resample_stations(batches, station_ids, start, end, LAG_STEP, "mean", LAG_MAX_GAP)
+
+    tasks = [
+        (river, ids, np.column_stack([columns[station_id] for station_id in ids]), max_lag_hours, min_overlap_hours)
+        for river, ids in sorted(rivers.items(), key=lambda item: -len(item[1]))
+    ]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = [row for rows in pool.map(analyze_river, tasks) for row in rows]
+
+    logger.info(
+        "Computed lags for %d station pairs on %d rivers in %.1fs",
+        len(results),
+        len(rivers),
+        time.perf_counter() - started,
+    )
+    return results
+
+
+def load_river_lines(path: str, name_column: str = "nazwa") -> Dict[str, Any]:
+    """Wczytaj linie rzek (dowolny format obsługiwany przez geopandas) w układzie metrycznym.
+
+    Odcinki jednej rzeki są scalane w jedną geometrię; klucz to znormalizowana nazwa.
+    """
+    import geopandas as gpd
+    import shapely
+
+    frame = gpd.read_file(path).to_crs(METRIC_CRS)
+    frame["rzeka"] = frame[name_column].map(normalize_river_name)
+    frame = frame.dropna(subset=["rzeka"])
+    return {
+        river: shapely.line_merge(shapely.union_all(group.geometry.values))
+        for river, group in frame.groupby("rzeka")
+    }
+
+
+def chainage_along_line(line: Any, lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Położenie stacji wzdłuż linii rzeki i odległość od niej (metry, rzut na najbliższy punkt)"""
+    import geopandas as gpd
+    import shapely
+
+    points = gpd.GeoSeries.from_xy(lon, lat, crs="EPSG:4326").to_crs(METRIC_CRS).values
+    return shapely.line_locate_point(line, points), shapely.distance(line, points)
+
+
+def chainage_along_axis(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Heurystyka bez linii rzeki: rzut stacji na główną oś rozrzutu punktów (PCA), w km.
+
+    Współrzędne są przybliżane lokalnie płaskim układem km. Domyślnie kilometraż
+    rośnie na północ - rzeki w Polsce w większości płyną do Bałtyku; kierunek
+    poprawia potem orient_chainage na podstawie opóźnień fali.
+    """
+    lat0 = np.radians(lat.mean())
+    coords = np.column_stack([lon * 111.32 * np.cos(lat0), lat * 110.57])
+    coords = coords - coords.mean(axis=0)
+    if len(coords) < 2 or not coords.any():
+        return np.zeros(len(coords))
+    axis = np.linalg.svd(coords, full_matrices=False)[2][0]
+    if axis[1] < 0:
+        axis = -axis
+    return coords @ axis
+
+
+def orient_chainage(chainage: np.ndarray, station_ids: List[str], lag_pairs: List[Tuple[str, str]]) -> np.ndarray:
+    """Odwróć kilometraż, jeśli opóźnienia fali (station_a przed station_b) wskazują przeciwny kierunek"""
+    position = {station_id: i for i, station_id in enumerate(station_ids)}
+    votes = sum(
+        np.sign(chainage[position[b]] - chainage[position[a]])
+        for a, b in lag_pairs
+        if a in position and b in position
+    )
+    return chainage.max() - chainage if votes < 0 else chainage
+
+
+def build_river_index(
+    stations: List[Tuple[str, str, float, float]],
+    lag_pairs: List[Tuple[str, str]],
+    lines: Optional[Dict[str, Any]] = None,
+    max_line_distance: float = 2000,
+) -> List[Dict[str, Any]]:
+    """Uporządkuj stacje (id, rzeka, lat, lon) każdej rzeki od źródła do ujścia.
+
+    Metoda "linia": rzut na linię rzeki, gdy większość stacji leży bliżej niż
+    max_line_distance metrów od niej; w przeciwnym razie "heurystyka" (oś PCA).
+    kilometraz liczony jest od najwyżej położonej stacji.
+    """
+    groups: Dict[str, List[Tuple[str, float, float]]] = {}
+    for station_id, rzeka, lat, lon in stations:
+        river = normalize_river_name(rzeka)
+        if river:
+            groups.setdefault(river, []).append((station_id, lat, lon))
+
+    rows = []
+    for river, members in groups.items():
+        station_ids = [member[0] for member in members]
+        lat = np.array([member[1] for member in members], dtype=float)
+        lon = np.array([member[2] for member in members], dtype=float)
+
+        method = "heurystyka"
+        chainage = None
+        if lines and river in lines:
+            along, distance = chainage_along_line(lines[river], lon, lat)
+            if np.median(distance) <= max_line_distance:
+                method = "linia"
+                chainage = along / 1000.0
+        if chainage is None:
+            chainage = chainage_along_axis(lon, lat)
+
+        chainage = orient_chainage(chainage, station_ids, lag_pairs)
+        chainage = chainage - chainage.min()
+        order = np.lexsort((station_ids, chainage))
+        for position, i in enumerate(order):
+            rows.append(
+                {
+                    "station_id": station_ids[i],
+                    "rzeka": river,
+                    "kolejnosc": position,
+                    "kilometraz": round(float(chainage[i]), 3),
+                    "metoda": method,
+                }
+            )
+    return rows
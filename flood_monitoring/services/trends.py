@@ -0,0 +1,82 @@
+"""
+Tempo zmian stanu wody liczone przyrostowo przy ingestii
+"""
+import bisect
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Okna tempa zmian (godziny) i okno krótkoterminowego trendu liniowego
+RATE_WINDOWS_HOURS = (1, 3, 6, 24)
+TREND_WINDOW_HOURS = 3
+
+# Bufor trzyma odczyty z ostatnich 24 h (+ zapas, żeby znaleźć punkt odniesienia dla 24 h)
+BUFFER_SECONDS = (max(RATE_WINDOWS_HOURS) + 1) * 3600
+
+# Tempo liczymy tylko, gdy dostępne dane pokrywają co najmniej połowę okna
+MIN_WINDOW_COVERAGE = 0.5
+
+RATE_COLUMNS = tuple(f"tempo_{hours}h" for hours in RATE_WINDOWS_HOURS) + (
+    f"trend_{TREND_WINDOW_HOURS}h",
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+Buffer = List[List[float]]
+
+
+def to_epoch(timestamp: datetime) -> float:
+    return (timestamp - _EPOCH).total_seconds()
+
+
+def add_reading(buffer: Buffer, timestamp: datetime, value: float) -> Buffer:
+    """Dodaj odczyt do bufora [[epoch, wartość], ...] posortowanego po czasie.
+
+    Zwraca nową listę (kolumna JSONB wykrywa zmianę po podmianie obiektu)
+    i odrzuca odczyty starsze niż BUFFER_SECONDS od najnowszego.
+    """
+    epoch = to_epoch(timestamp)
+    points = [point for point in buffer if point[0] != epoch]
+    bisect.insort(points, [epoch, float(value)])
+    cutoff = points[-1][0] - BUFFER_SECONDS
+    start = bisect.bisect_left(points, [cutoff])
+    return points[start:]
+
+
+def _reference_point(buffer: Buffer, target: float) -> List[float]:
+    """Odczyt najbliższy chwili target"""
+    index = bisect.bisect_left(buffer, [target])
+    candidates = buffer[max(index - 1, 0):index + 1]
+    return min(candidates, key=lambda point: abs(point[0] - target))
+
+
+def _slope_per_hour(points: Buffer) -> Optional[float]:
+    """Nachylenie prostej najmniejszych kwadratów w jednostkach na godzinę"""
+    if len(points) < 3:
+        return None
+    n = len(points)
+    t0 = points[0][0]
+    mean_t = sum(point[0] - t0 for point in points) / n
+    mean_v = sum(point[1] for point in points) / n
+    covariance = sum((point[0] - t0 - mean_t) * (point[1] - mean_v) for point in points)
+    variance = sum((point[0] - t0 - mean_t) ** 2 for point in points)
+    if variance == 0:
+        return None
+    return covariance / variance * 3600
+
+
+def compute_rates(buffer: Buffer) -> Dict[str, Optional[float]]:
+    """Tempo zmian (jednostki na godzinę) dla okien 1/3/6/24 h i trend z ostatnich 3 h"""
+    rates: Dict[str, Optional[float]] = dict.fromkeys(RATE_COLUMNS)
+    if not buffer:
+        return rates
+
+    latest_time, latest_value = buffer[-1]
+    for hours in RATE_WINDOWS_HOURS:
+        reference_time, reference_value = _reference_point(buffer, latest_time - hours * 3600)
+        span = latest_time - reference_time
+        if span >= hours * 3600 * MIN_WINDOW_COVERAGE:
+            rates[f"tempo_{hours}h"] = (latest_value - reference_value) / (span / 3600)
+
+    trend_start = bisect.bisect_left(buffer, [latest_time - TREND_WINDOW_HOURS * 3600])
+    rates[f"trend_{TREND_WINDOW_HOURS}h"] = _slope_per_hour(buffer[trend_start:])
+    return rates
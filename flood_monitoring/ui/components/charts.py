@@ -1,5 +1,5 @@
 """Komponenty do wizualizacji danych hydrologicznych"""
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 import plotly.express as px
@@ -11,30 +11,65 @@ import hashlib
 import json
 
 
+# Powyżej tej liczby punktów serie rysowane są przez WebGL (Scattergl) i bez znaczników
+WEBGL_MIN_POINTS = 1000
+
+
+def compute_series_stats(values) -> Optional[Dict[str, float]]:
+    """Statystyki serii liczone lokalnie (gdy backend nie zwrócił /stats)"""
+    array = np.asarray(values, dtype=float)
+    if not array.size:
+        return None
+    p25, median, p75 = np.percentile(array, [25, 50, 75])
+    return {
+        "count": int(array.size),
+        "min": float(array.min()),
+        "max": float(array.max()),
+        "mean": float(array.mean()),
+        "std": float(array.std(ddof=1)) if array.size > 1 else None,
+        "p25": float(p25),
+        "median": float(median),
+        "p75": float(p75),
+        "latest": float(array[-1]),
+    }
+
+
+def series_key(station_id: str, days: int, times: np.ndarray) -> Tuple[Any, ...]:
+    """Tani klucz cache wykresu: stacja, okno, liczba punktów i ostatni znacznik czasu"""
+    return (station_id, days, len(times), str(times[-1]) if len(times) else None)
+
+
+def series_trace(times: np.ndarray, values: np.ndarray, **kwargs) -> go.Scatter:
+    """Linia serii: SVG ze znacznikami dla krótkich serii, WebGL bez znaczników dla długich"""
+    if len(times) > WEBGL_MIN_POINTS:
+        kwargs.pop("marker", None)
+        return go.Scattergl(x=times, y=values, mode="lines", **kwargs)
+    return go.Scatter(x=times, y=values, mode="lines+markers", **kwargs)
+
+
 @st.cache_data(ttl=300)  # Cache na 5 minut
-def create_water_level_chart(data: Dict[str, List[Dict[str, Any]]], station_name: str = "") -> go.Figure:
-    """Utwórz zaawansowany wykres poziomu wody z trendami i alertami"""
-    if not data.get("stan"):
+def create_water_level_chart(key: Tuple[Any, ...], _times: np.ndarray, _values: np.ndarray, station_name: str = "", stats: Optional[Dict[str, Any]] = None) -> go.Figure:
+    """Utwórz zaawansowany wykres poziomu wody z trendami i alertami.
+
+    Serie są przekazywane jako kolumny NumPy posortowane po czasie; cache
+    rozróżnia wykresy po kluczu z series_key, tablic nie hashuje.
+    """
+    if not len(_times):
         return None
 
-    df = pd.DataFrame(data["stan"])
-    df["stan_wody_data_pomiaru"] = pd.to_datetime(df["stan_wody_data_pomiaru"])
-    df = df.sort_values("stan_wody_data_pomiaru")
-    
-    # Oblicz statystyki
-    mean_level = df["stan_wody"].mean()
-    std_level = df["stan_wody"].std()
-    max_level = df["stan_wody"].max()
-    min_level = df["stan_wody"].min()
+    # Statystyki z backendu (całe okno) albo liczone lokalnie
+    stats = stats or compute_series_stats(_values)
+    mean_level = stats["mean"]
+    std_level = stats["std"] or 0.0
+    max_level = stats["max"]
     
     # Utwórz wykres
     fig = go.Figure()
     
     # Główna linia poziomu wody
-    fig.add_trace(go.Scatter(
-        x=df["stan_wody_data_pomiaru"],
-        y=df["stan_wody"],
-        mode='lines+markers',
+    fig.add_trace(series_trace(
+        _times,
+        _values,
         name='Poziom wody',
         line=dict(color='#1f77b4', width=2),
         marker=dict(size=4),
@@ -69,15 +104,14 @@ def create_water_level_chart(data: Dict[str, List[Dict[str, Any]]], station_name
             annotation_position="top left"
         )
     
-    # Trend (regresja liniowa)
-    if len(df) > 2:
-        x_numeric = pd.to_numeric(df["stan_wody_data_pomiaru"])
-        z = np.polyfit(x_numeric, df["stan_wody"], 1)
-        trend_line = np.poly1d(z)(x_numeric)
+    # Trend (regresja liniowa) - prosta, więc wystarczą jej dwa końce
+    if len(_times) > 2:
+        hours = (_times - _times[0]) / np.timedelta64(1, "h")
+        z = np.polyfit(hours, _values, 1)
         
         fig.add_trace(go.Scatter(
-            x=df["stan_wody_data_pomiaru"],
-            y=trend_line,
+            x=_times[[0, -1]],
+            y=np.poly1d(z)(hours[[0, -1]]),
             mode='lines',
             name='Trend',
             line=dict(color='red', width=1, dash='dash'),
@@ -98,28 +132,23 @@ def create_water_level_chart(data: Dict[str, List[Dict[str, Any]]], station_name
 
 
 @st.cache_data(ttl=300)  # Cache na 5 minut
-def create_flow_chart(data: Dict[str, List[Dict[str, Any]]], station_name: str = "") -> go.Figure:
-    """Utwórz zaawansowany wykres przepływu z analizą statystyczną"""
-    if not data.get("przelyw"):
+def create_flow_chart(key: Tuple[Any, ...], _times: np.ndarray, _values: np.ndarray, station_name: str = "", stats: Optional[Dict[str, Any]] = None) -> go.Figure:
+    """Utwórz zaawansowany wykres przepływu z analizą statystyczną (kolumny NumPy, jak create_water_level_chart)"""
+    if not len(_times):
         return None
 
-    df = pd.DataFrame(data["przelyw"])
-    df["przeplyw_data"] = pd.to_datetime(df["przeplyw_data"])
-    df = df.sort_values("przeplyw_data")
-    
-    # Oblicz statystyki
-    mean_flow = df["przelyw"].mean()
-    median_flow = df["przelyw"].median()
-    q75 = df["przelyw"].quantile(0.75)
-    q25 = df["przelyw"].quantile(0.25)
+    stats = stats or compute_series_stats(_values)
+    mean_flow = stats["mean"]
+    median_flow = stats["median"]
+    q75 = stats["p75"]
+    q25 = stats["p25"]
     
     fig = go.Figure()
     
     # Główna linia przepływu z wypełnieniem
-    fig.add_trace(go.Scatter(
-        x=df["przeplyw_data"],
-        y=df["przelyw"],
-        mode='lines+markers',
+    fig.add_trace(series_trace(
+        _times,
+        _values,
         name='Przepływ',
         line=dict(color='#2ca02c', width=2),
         marker=dict(size=4),
@@ -167,16 +196,37 @@ def create_flow_chart(data: Dict[str, List[Dict[str, Any]]], station_name: str =
     return fig
 
 
-def display_station_charts(data: Dict[str, List[Dict[str, Any]]], station_name: str = ""):
-    """Wyświetl zaawansowane wykresy dla stacji z dodatkowymi analizami"""
+def display_station_charts(
+    series: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    station_name: str = "",
+    stats: Optional[Dict[str, Any]] = None,
+    station_id: str = "",
+    days: int = 0,
+):
+    """Wyświetl zaawansowane wykresy dla stacji z dodatkowymi analizami.
+
+    series to kolumny {"stan" / "przelyw": (czasy, wartości)} z get_station_series,
+    stats to odpowiedź /stations/{id}/stats; bez niej statystyki są liczone
+    lokalnie, raz dla każdej serii, i używane przez metryki i oba wykresy.
+    """
     try:
-        has_water_data = bool(data.get("stan"))
-        has_flow_data = bool(data.get("przelyw"))
+        water_times, water_values = series.get("stan") or (np.array([], dtype="datetime64[s]"), np.array([]))
+        flow_times, flow_values = series.get("przelyw") or (np.array([], dtype="datetime64[s]"), np.array([]))
+        has_water_data = bool(len(water_times))
+        has_flow_data = bool(len(flow_times))
         
         if not has_water_data and not has_flow_data:
             st.warning("️ Brak danych dla wybranej stacji")
             return
 
+        stats = stats or {}
+        water_stats = stats.get("stan") or (compute_series_stats(water_values) if has_water_data else None)
+        flow_stats = stats.get("przelyw") or (compute_series_stats(flow_values) if has_flow_data else None)
+        has_water_data = has_water_data and water_stats is not None
+        has_flow_data = has_flow_data and flow_stats is not None
+        water_key = series_key(station_id, days, water_times)
+        flow_key = series_key(station_id, days, flow_times)
+
         if station_name:
             st.subheader(f" Analiza danych - {station_name}")
 
@@ -184,9 +234,8 @@ def display_station_charts(data: Dict[str, List[Dict[str, Any]]], station_name:
             col1, col2, col3, col4 = st.columns(4)
             
             if has_water_data:
-                water_df = pd.DataFrame(data["stan"])
-                latest_water = water_df.iloc[-1]["stan_wody"] if len(water_df) > 0 else 0
-                avg_water = water_df["stan_wody"].mean() if len(water_df) > 0 else 0
+                latest_water = water_stats["latest"]
+                avg_water = water_stats["mean"]
                 
                 with col1:
                     st.metric(
@@ -203,9 +252,8 @@ def display_station_charts(data: Dict[str, List[Dict[str, Any]]], station_name:
                     )
             
             if has_flow_data:
-                flow_df = pd.DataFrame(data["przelyw"])
-                latest_flow = flow_df.iloc[-1]["przelyw"] if len(flow_df) > 0 else 0
-                avg_flow = flow_df["przelyw"].mean() if len(flow_df) > 0 else 0
+                latest_flow = flow_stats["latest"]
+                avg_flow = flow_stats["mean"]
                 
                 with col3:
                     st.metric(
@@ -225,23 +273,23 @@ def display_station_charts(data: Dict[str, List[Dict[str, Any]]], station_name:
             col1, col2 = st.columns(2)
             
             with col1:
-                water_level_fig = create_water_level_chart(data, station_name)
+                water_level_fig = create_water_level_chart(water_key, water_times, water_values, station_name, water_stats)
                 if water_level_fig:
                     st.plotly_chart(water_level_fig, use_container_width=True)
             
             with col2:
-                flow_fig = create_flow_chart(data, station_name)
+                flow_fig = create_flow_chart(flow_key, flow_times, flow_values, station_name, flow_stats)
                 if flow_fig:
                     st.plotly_chart(flow_fig, use_container_width=True)
         else:
             if has_water_data:
-                water_level_fig = create_water_level_chart(data, station_name)
+                water_level_fig = create_water_level_chart(water_key, water_times, water_values, station_name, water_stats)
                 if water_level_fig:
                     st.plotly_chart(water_level_fig, use_container_width=True)
                 else:
                     st.info(" Brak danych o poziomie wody")
             if has_flow_data:
-                flow_fig = create_flow_chart(data, station_name)
+                flow_fig = create_flow_chart(flow_key, flow_times, flow_values, station_name, flow_stats)
                 if flow_fig:
                     st.plotly_chart(flow_fig, use_container_width=True)
                 else:
@@ -253,81 +301,87 @@ def display_station_charts(data: Dict[str, List[Dict[str, Any]]], station_name:
         if has_water_data:
             with col1:
                 st.markdown("** Poziom wody:**")
-                water_df = pd.DataFrame(data["stan"])
-                st.write(f"• Minimum: {water_df['stan_wody'].min():.1f} cm")
-                st.write(f"• Maksimum: {water_df['stan_wody'].max():.1f} cm")
-                st.write(f"• Odchylenie std: {water_df['stan_wody'].std():.1f} cm")
-                st.write(f"• Liczba pomiarów: {len(water_df)}")
+                st.write(f"• Minimum: {water_stats['min']:.1f} cm")
+                st.write(f"• Maksimum: {water_stats['max']:.1f} cm")
+                st.write(f"• Odchylenie std: {water_stats['std'] or 0:.1f} cm")
+                st.write(f"• Liczba pomiarów: {water_stats['count']}")
         
         if has_flow_data:
             with col2:
                 st.markdown("** Przepływ:**")
-                flow_df = pd.DataFrame(data["przelyw"])
-                st.write(f"• Minimum: {flow_df['przelyw'].min():.2f} m³/s")
-                st.write(f"• Maksimum: {flow_df['przelyw'].max():.2f} m³/s")
-                st.write(f"• Odchylenie std: {flow_df['przelyw'].std():.2f} m³/s")
-                st.write(f"• Liczba pomiarów: {len(flow_df)}")
+                st.write(f"• Minimum: {flow_stats['min']:.2f} m³/s")
+                st.write(f"• Maksimum: {flow_stats['max']:.2f} m³/s")
+                st.write(f"• Odchylenie std: {flow_stats['std'] or 0:.2f} m³/s")
+                st.write(f"• Liczba pomiarów: {flow_stats['count']}")
 
     except Exception as e:
         st.error(f"❌ Błąd podczas przetwarzania danych: {str(e)}")
         st.markdown("** Szczegóły błędu (dla deweloperów):**")
-        st.write("Raw data:", data)
+        st.write("Raw data:", series)
         st.exception(e)
 
 
-@st.cache_data(ttl=300)
-def create_comparison_chart(stations_data: Dict[str, Dict]) -> go.Figure:
-    """Utwórz zaawansowany wykres porównawczy poziomów wody dla wielu stacji"""
-    if not stations_data:
+def _comparison_chart(
+    block: Dict[str, Any],
+    station_names: Dict[str, str],
+    colors: List[str],
+    unit: str,
+    precision: int,
+    title: str,
+    yaxis_title: str,
+    fill: bool = False,
+) -> Optional[go.Figure]:
+    """Wykres porównawczy z bloku /stations/resample - wszystkie serie na jednej osi czasu"""
+    serie = block.get("serie") or {}
+    if not block.get("czas") or not serie:
         return None
 
+    times = pd.to_datetime(block["czas"])
     fig = go.Figure()
-    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
-    
-    station_stats = {}
-    
-    for i, (station_name, data) in enumerate(stations_data.items()):
-        if data.get("stan"):
-            df = pd.DataFrame(data["stan"])
-            df["stan_wody_data_pomiaru"] = pd.to_datetime(df["stan_wody_data_pomiaru"])
-            df = df.sort_values("stan_wody_data_pomiaru")
-
-            mean_level = df["stan_wody"].mean()
-            max_level = df["stan_wody"].max()
-            min_level = df["stan_wody"].min()
-            station_stats[station_name] = {'mean': mean_level, 'max': max_level, 'min': min_level}
-            
-            color = colors[i % len(colors)]
-
-            fig.add_trace(
-                go.Scatter(
-                    x=df["stan_wody_data_pomiaru"],
-                    y=df["stan_wody"],
-                    mode="lines+markers",
-                    name=f"{station_name} (śr: {mean_level:.1f}cm)",
-                    marker=dict(size=4),
-                    line=dict(color=color, width=2),
-                    hovertemplate=f'<b>{station_name}</b><br>Data: %{{x}}<br>Poziom: %{{y}} cm<extra></extra>'
-                )
+
+    for i, (station_id, values) in enumerate(serie.items()):
+        y = np.array(values, dtype=float)
+        if np.isnan(y).all():
+            continue
+        station_name = station_names.get(station_id, station_id)
+        mean_value = float(np.nanmean(y))
+        color = colors[i % len(colors)]
+
+        fig.add_trace(
+            go.Scatter(
+                x=times,
+                y=y,
+                mode="lines+markers",
+                name=f"{station_name} (śr: {mean_value:.{precision}f}{unit})",
+                marker=dict(size=4),
+                line=dict(color=color, width=2),
+                connectgaps=False,
+                fill='tonexty' if fill and i > 0 else None,
+                fillcolor=f'rgba{tuple(list(px.colors.hex_to_rgb(color)) + [0.1])}' if fill and i > 0 else None,
+                hovertemplate=f'<b>{station_name}</b><br>Data: %{{x}}<br>%{{y:.{precision}f}} {unit}<extra></extra>'
             )
+        )
 
-            fig.add_trace(
-                go.Scatter(
-                    x=df["stan_wody_data_pomiaru"],
-                    y=[mean_level] * len(df),
-                    mode="lines",
-                    name=f"{station_name} - średnia",
-                    line=dict(color=color, width=1, dash='dash'),
-                    opacity=0.5,
-                    showlegend=False,
-                    hovertemplate=f'<b>{station_name} - średnia</b><br>%{{y:.1f}} cm<extra></extra>'
-                )
+        fig.add_trace(
+            go.Scatter(
+                x=[times[0], times[-1]],
+                y=[mean_value, mean_value],
+                mode="lines",
+                name=f"{station_name} - średnia",
+                line=dict(color=color, width=1, dash='dash'),
+                opacity=0.5,
+                showlegend=False,
+                hovertemplate=f'<b>{station_name} - średnia</b><br>%{{y:.{precision}f}} {unit}<extra></extra>'
             )
+        )
+
+    if not fig.data:
+        return None
 
     fig.update_layout(
-        title=" Porównanie poziomów wody między stacjami",
+        title=title,
         xaxis_title="Data i czas",
-        yaxis_title="Poziom wody [cm]",
+        yaxis_title=yaxis_title,
         hovermode="x unified",
         template='plotly_white',
         height=500,
@@ -345,71 +399,33 @@ def create_comparison_chart(stations_data: Dict[str, Dict]) -> go.Figure:
 
 
 @st.cache_data(ttl=300)
-def create_flow_comparison_chart(stations_data: Dict[str, Dict]) -> go.Figure:
-    """Utwórz zaawansowany wykres porównawczy przepływów dla wielu stacji"""
-    if not stations_data:
-        return None
+def create_comparison_chart(block: Dict[str, Any], station_names: Dict[str, str]) -> go.Figure:
+    """Utwórz wykres porównawczy poziomów wody dla wielu stacji.
 
-    fig = go.Figure()
-    colors = ['#2ca02c', '#ff7f0e', '#1f77b4', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
-    
-    station_stats = {}
-    
-    for i, (station_name, data) in enumerate(stations_data.items()):
-        if data.get("przelyw"):
-            df = pd.DataFrame(data["przelyw"])
-            df["przeplyw_data"] = pd.to_datetime(df["przeplyw_data"])
-            df = df.sort_values("przeplyw_data")
-
-            mean_flow = df["przelyw"].mean()
-            max_flow = df["przelyw"].max()
-            min_flow = df["przelyw"].min()
-            station_stats[station_name] = {'mean': mean_flow, 'max': max_flow, 'min': min_flow}
-            
-            color = colors[i % len(colors)]
-
-            fig.add_trace(
-                go.Scatter(
-                    x=df["przeplyw_data"],
-                    y=df["przelyw"],
-                    mode="lines+markers",
-                    name=f"{station_name} (śr: {mean_flow:.2f}m³/s)",
-                    marker=dict(size=4),
-                    line=dict(color=color, width=2),
-                    fill='tonexty' if i > 0 else None,
-                    fillcolor=f'rgba{tuple(list(px.colors.hex_to_rgb(color)) + [0.1])}' if i > 0 else None,
-                    hovertemplate=f'<b>{station_name}</b><br>Data: %{{x}}<br>Przepływ: %{{y}} m³/s<extra></extra>'
-                )
-            )
+    block to odpowiedź /stations/resample?kind=stan: serie wyrównane do wspólnej
+    siatki czasu, więc wartości stacji w jednym punkcie osi x są porównywalne.
+    """
+    return _comparison_chart(
+        block,
+        station_names,
+        colors=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f'],
+        unit="cm",
+        precision=1,
+        title=" Porównanie poziomów wody między stacjami",
+        yaxis_title="Poziom wody [cm]",
+    )
 
-            fig.add_trace(
-                go.Scatter(
-                    x=df["przeplyw_data"],
-                    y=[mean_flow] * len(df),
-                    mode="lines",
-                    name=f"{station_name} - średnia",
-                    line=dict(color=color, width=1, dash='dot'),
-                    opacity=0.6,
-                    showlegend=False,
-                    hovertemplate=f'<b>{station_name} - średnia</b><br>%{{y:.2f}} m³/s<extra></extra>'
-                )
-            )
 
-    fig.update_layout(
+@st.cache_data(ttl=300)
+def create_flow_comparison_chart(block: Dict[str, Any], station_names: Dict[str, str]) -> go.Figure:
+    """Utwórz wykres porównawczy przepływów dla wielu stacji (block z /stations/resample?kind=przeplyw)"""
+    return _comparison_chart(
+        block,
+        station_names,
+        colors=['#2ca02c', '#ff7f0e', '#1f77b4', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f'],
+        unit="m³/s",
+        precision=2,
         title=" Porównanie przepływów między stacjami",
-        xaxis_title="Data i czas",
         yaxis_title="Przepływ [m³/s]",
-        hovermode="x unified",
-        template='plotly_white',
-        height=500,
-        showlegend=True,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
+        fill=True,
     )
-
-    return fig
@@ -5,10 +5,13 @@ from typing import Any, Dict
 
 import folium
 import streamlit as st
-from streamlit_folium import folium_static, st_folium
+import streamlit.components.v1 as components
 import hashlib
 import json
 
+# Ile wyrenderowanych wariantów mapy (HTML) trzymać w cache
+MAP_CACHE_ENTRIES = 16
+
 
 def get_wojewodztwo_emoji(wojewodztwo: str) -> str:
     """Zwraca emoji dla danego województwa."""
@@ -47,8 +50,174 @@ def get_status_emoji_and_text(status: str) -> tuple:
         return "❓", "Nieznany"
 
 
-def create_stations_map(stations_data: list, map_style: str = "OpenStreetMap", cluster_markers: bool = False, responsive: bool = True) -> folium.Map:
-    """Utwórz mapę z lokalizacjami stacji pomiarowych z ulepszonymi funkcjonalnościami OSM"""
+# Kolor i ikona markera wg statusu: (kolor folium.Icon, ikona Font Awesome, kolor HEX)
+STATUS_MARKERS = {
+    "alarm": ("red", "exclamation-triangle", "#d63e2a"),
+    "warning": ("orange", "exclamation-circle", "#f69730"),
+    "active": ("green", "tint", "#72b026"),
+}
+DEFAULT_MARKER = ("gray", "question", "#575757")
+
+# Powyżej tylu stacji tryb "auto" rysuje jedną warstwę GeoJSON zamiast osobnych markerów
+MARKERS_MODE_LIMIT = 100
+
+CLUSTER_ICON_JS = """
+function(cluster) {
+    return L.divIcon({
+        html: '<div style="background-color: #3498db; color: white; border-radius: 50%; width: 30px; height: 30px; display: flex; align-items: center; justify-content: center; font-weight: bold; font-size: 12px;">' + cluster.getChildCount() + '</div>',
+        className: 'marker-cluster-custom',
+        iconSize: L.point(30, 30)
+    });
+}
+"""
+
+# Pola popupu: (klucz w danych stacji, etykieta) - wspólne dla markerów i warstwy GeoJSON
+POPUP_FIELDS = [
+    ("code", "Kod"),
+    ("river", "Rzeka"),
+    ("wojewodztwo", "Województwo"),
+    ("status", "Status"),
+    ("stan_wody", "Stan wody"),
+    ("przeplyw", "Przepływ"),
+    ("ostatnia_aktualizacja", "Ostatnia aktualizacja"),
+]
+
+# Popup budowany w przeglądarce z pól wiersza FastMarkerCluster: [lat, lon, kolor, nazwa, *POPUP_FIELDS]
+FAST_CLUSTER_CALLBACK = """
+function (row) {
+    var labels = %s;
+    var escape = function (value) {
+        return String(value).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    };
+    var html = '<div style="width: 280px; font-family: Arial, sans-serif;"><h4 style="margin: 0 0 10px 0; color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 5px;">' + escape(row[3]) + '</h4>';
+    for (var i = 0; i < labels.length; i++) {
+        html += '<p style="margin: 5px 0;"><strong>' + labels[i] + ':</strong> ' + escape(row[i + 4]) + '</p>';
+    }
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 6, color: row[2], fillColor: row[2], fillOpacity: 0.8, weight: 1
+    });
+    marker.bindPopup(html + '</div>', {maxWidth: 300});
+    marker.bindTooltip(escape(row[3]) + ' - ' + escape(row[5]));
+    return marker;
+}
+""" % json.dumps([label for _, label in POPUP_FIELDS], ensure_ascii=False)
+
+
+def station_location(station: Dict[str, Any]):
+    """(lat, lon) stacji albo None, gdy brak poprawnych współrzędnych"""
+    try:
+        lat = float(station.get('lat', 0))
+        lon = float(station.get('lon', 0))
+    except (ValueError, TypeError):
+        return None
+    if lat == 0 or lon == 0:
+        return None
+    return lat, lon
+
+
+def station_popup_html(station: Dict[str, Any], color: str) -> str:
+    """Popup markera stacji (tryb markerów, HTML generowany po stronie Pythona)"""
+    status = station.get('status', 'unknown')
+    return f"""
+    <div style="width: 280px; font-family: Arial, sans-serif;">
+        <h4 style="margin: 0 0 10px 0; color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 5px;">{station.get('name', 'Nieznana stacja')}</h4>
+        <p style="margin: 5px 0;"><strong>Kod:</strong> {station.get('code', 'N/A')}</p>
+        <p style="margin: 5px 0;"><strong>Rzeka:</strong> {station.get('river', 'N/A')}</p>
+        <p style="margin: 5px 0;"><strong>Województwo:</strong> {station.get('wojewodztwo', 'N/A')}</p>
+        <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: {color}; font-weight: bold;">{status.upper()}</span></p>
+        <hr style="margin: 10px 0; border: none; border-top: 1px solid #ecf0f1;">
+        <p style="margin: 5px 0;"><strong> Stan wody:</strong> {station.get('stan_wody', 'Brak danych')}</p>
+        <p style="margin: 5px 0;"><strong> Przepływ:</strong> {station.get('przeplyw', 'Brak danych')}</p>
+        <p style="margin: 5px 0; font-size: 0.9em; color: #7f8c8d;"><strong> Ostatnia aktualizacja:</strong><br>{station.get('ostatnia_aktualizacja', 'Brak danych')}</p>
+    </div>
+    """
+
+
+def add_station_markers(target, stations_data: list):
+    """Osobny folium.Marker z ikoną i popupem dla każdej stacji (mapa albo klaster)"""
+    for station in stations_data:
+        location = station_location(station)
+        if location is None:
+            continue
+        color, icon, _ = STATUS_MARKERS.get(station.get('status'), DEFAULT_MARKER)
+        folium.Marker(
+            location=location,
+            popup=folium.Popup(station_popup_html(station, color), max_width=300),
+            tooltip=f"{station.get('name', 'Nieznana stacja')} - {station.get('river', 'N/A')}",
+            icon=folium.Icon(color=color, icon=icon, prefix='fa'),
+        ).add_to(target)
+
+
+def stations_geojson(stations_data: list) -> Dict[str, Any]:
+    """Stacje jako FeatureCollection; kolor markera i pola popupu w properties"""
+    features = []
+    for station in stations_data:
+        location = station_location(station)
+        if location is None:
+            continue
+        properties = {key: str(station.get(key, 'Brak danych')) for key, _ in POPUP_FIELDS}
+        properties["name"] = station.get('name', 'Nieznana stacja')
+        properties["color"] = STATUS_MARKERS.get(station.get('status'), DEFAULT_MARKER)[2]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [location[1], location[0]]},
+            "properties": properties,
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def add_stations_layer(m: folium.Map, stations_data: list, cluster_markers: bool = False):
+    """Wszystkie stacje jako jedna warstwa; popupy i style powstają w przeglądarce z properties.
+
+    Z klastrowaniem: FastMarkerCluster z danymi w tablicy i funkcją tworzącą marker,
+    bez klastrowania: warstwa GeoJson z CircleMarker i GeoJsonPopup.
+    """
+    collection = stations_geojson(stations_data)
+    if cluster_markers:
+        from folium.plugins import FastMarkerCluster
+        rows = [
+            [
+                *reversed(feature["geometry"]["coordinates"]),
+                feature["properties"]["color"],
+                feature["properties"]["name"],
+                *(feature["properties"][key] for key, _ in POPUP_FIELDS),
+            ]
+            for feature in collection["features"]
+        ]
+        FastMarkerCluster(
+            rows,
+            callback=FAST_CLUSTER_CALLBACK,
+            name="Stacje hydrologiczne",
+            icon_create_function=CLUSTER_ICON_JS,
+        ).add_to(m)
+        return
+
+    folium.GeoJson(
+        collection,
+        name="Stacje hydrologiczne",
+        marker=folium.CircleMarker(radius=6, weight=1, fill=True, fill_opacity=0.8),
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "fillColor": feature["properties"]["color"],
+        },
+        popup=folium.GeoJsonPopup(
+            fields=["name", *(key for key, _ in POPUP_FIELDS)],
+            aliases=["Stacja", *(label for _, label in POPUP_FIELDS)],
+            max_width=300,
+        ),
+        tooltip=folium.GeoJsonTooltip(fields=["name", "river"], aliases=["Stacja", "Rzeka"]),
+    ).add_to(m)
+
+
+def create_stations_map(stations_data: list, map_style: str = "OpenStreetMap", cluster_markers: bool = False, render_mode: str = "auto") -> folium.Map:
+    """Utwórz mapę z lokalizacjami stacji pomiarowych z ulepszonymi funkcjonalnościami OSM.
+
+    render_mode: "markers" - osobny marker z ikoną na stację, "geojson" - jedna
+    warstwa dla wszystkich stacji (tysiące punktów przy małym HTML), "auto" - markery
+    do MARKERS_MODE_LIMIT stacji, powyżej warstwa GeoJSON.
+    """
     center_lat, center_lon = 52.0, 19.0
 
     tile_options = {
@@ -142,129 +311,22 @@ def create_stations_map(stations_data: list, map_style: str = "OpenStreetMap", c
         folium.LayerControl(position='topright').add_to(m)
 
     if stations_data:
-        max_markers = 500
-        limited_stations = stations_data[:max_markers] if len(stations_data) > max_markers else stations_data
-        
-        if cluster_markers and len(limited_stations) > 50:
-            try:
-                from folium.plugins import MarkerCluster
-                marker_cluster = MarkerCluster(
-                    name="Stacje hydrologiczne",
-                    overlay=True,
-                    control=True,
-                    icon_create_function="""
-                    function(cluster) {
-                        return L.divIcon({
-                            html: '<div style="background-color: #3498db; color: white; border-radius: 50%; width: 30px; height: 30px; display: flex; align-items: center; justify-content: center; font-weight: bold; font-size: 12px;">' + cluster.getChildCount() + '</div>',
-                            className: 'marker-cluster-custom',
-                            iconSize: L.point(30, 30)
-                        });
-                    }
-                    """
-                ).add_to(m)
-
-                for station in limited_stations:
-                    try:
-                        lat = float(station.get('lat', 0))
-                        lon = float(station.get('lon', 0))
-                        
-                        if lat != 0 and lon != 0:
-                            status = station.get('status', 'unknown')
-                            if status == 'alarm':
-                                color = 'red'
-                                icon = 'exclamation-triangle'
-                            elif status == 'warning':
-                                color = 'orange'
-                                icon = 'exclamation-circle'
-                            elif status == 'active':
-                                color = 'green'
-                                icon = 'tint'
-                            else:
-                                color = 'gray'
-                                icon = 'question'
-
-                            popup_html = f"""
-                            <div style="width: 280px; font-family: Arial, sans-serif;">
-                                <h4 style="margin: 0 0 10px 0; color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 5px;">{station.get('name', 'Nieznana stacja')}</h4>
-                                <p style="margin: 5px 0;"><strong>Kod:</strong> {station.get('code', 'N/A')}</p>
-                                <p style="margin: 5px 0;"><strong>Rzeka:</strong> {station.get('river', 'N/A')}</p>
-                                <p style="margin: 5px 0;"><strong>Województwo:</strong> {station.get('wojewodztwo', 'N/A')}</p>
-                                <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: {color}; font-weight: bold;">{status.upper()}</span></p>
-                                <hr style="margin: 10px 0; border: none; border-top: 1px solid #ecf0f1;">
-                                <p style="margin: 5px 0;"><strong> Stan wody:</strong> {station.get('stan_wody', 'Brak danych')}</p>
-                                <p style="margin: 5px 0;"><strong> Przepływ:</strong> {station.get('przeplyw', 'Brak danych')}</p>
-                                <p style="margin: 5px 0; font-size: 0.9em; color: #7f8c8d;"><strong> Ostatnia aktualizacja:</strong><br>{station.get('ostatnia_aktualizacja', 'Brak danych')}</p>
-                            </div>
-                            """
-                            
-                            folium.Marker(
-                                location=[lat, lon],
-                                popup=folium.Popup(popup_html, max_width=300),
-                                tooltip=f"{station.get('name', 'Nieznana stacja')} - {station.get('river', 'N/A')}",
-                                icon=folium.Icon(
-                                    color=color,
-                                    icon=icon,
-                                    prefix='fa'
-                                )
-                            ).add_to(marker_cluster)
-                    except (ValueError, TypeError) as e:
-                        print(f"Błąd przy dodawaniu markera dla stacji {station.get('name', 'Unknown')}: {e}")
-                        continue
-            except ImportError:
-                print("MarkerCluster nie jest dostępny, używam zwykłych markerów")
-                cluster_markers = False
-        
-        if not cluster_markers:
-            for station in limited_stations:
-                try:
-                    lat = float(station.get('lat', 0))
-                    lon = float(station.get('lon', 0))
-                    
-                    if lat != 0 and lon != 0:
-                        status = station.get('status', 'unknown')
-                        if status == 'alarm':
-                            color = 'red'
-                            icon = 'exclamation-triangle'
-                        elif status == 'warning':
-                            color = 'orange'
-                            icon = 'exclamation-circle'
-                        elif status == 'active':
-                            color = 'green'
-                            icon = 'tint'
-                        else:
-                            color = 'gray'
-                            icon = 'question'
-
-                        popup_html = f"""
-                        <div style="width: 280px; font-family: Arial, sans-serif;">
-                            <h4 style="margin: 0 0 10px 0; color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 5px;">{station.get('name', 'Nieznana stacja')}</h4>
-                            <p style="margin: 5px 0;"><strong>Kod:</strong> {station.get('code', 'N/A')}</p>
-                            <p style="margin: 5px 0;"><strong>Rzeka:</strong> {station.get('river', 'N/A')}</p>
-                            <p style="margin: 5px 0;"><strong>Województwo:</strong> {station.get('wojewodztwo', 'N/A')}</p>
-                            <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: {color}; font-weight: bold;">{status.upper()}</span></p>
-                            <hr style="margin: 10px 0; border: none; border-top: 1px solid #ecf0f1;">
-                            <p style="margin: 5px 0;"><strong> Stan wody:</strong> {station.get('stan_wody', 'Brak danych')}</p>
-                            <p style="margin: 5px 0;"><strong> Przepływ:</strong> {station.get('przeplyw', 'Brak danych')}</p>
-                            <p style="margin: 5px 0; font-size: 0.9em; color: #7f8c8d;"><strong> Ostatnia aktualizacja:</strong><br>{station.get('ostatnia_aktualizacja', 'Brak danych')}</p>
-                        </div>
-                        """
-                        
-                        folium.Marker(
-                            location=[lat, lon],
-                            popup=folium.Popup(popup_html, max_width=300),
-                            tooltip=f"{station.get('name', 'Nieznana stacja')} - {station.get('river', 'N/A')}",
-                            icon=folium.Icon(
-                                color=color,
-                                icon=icon,
-                                prefix='fa'
-                            )
-                        ).add_to(m)
-                except (ValueError, TypeError) as e:
-                    print(f"Błąd przy dodawaniu markera dla stacji {station.get('name', 'Unknown')}: {e}")
-                    continue
-
-        if len(stations_data) > max_markers:
-            print(f"Wyświetlono {max_markers} z {len(stations_data)} stacji dla lepszej wydajności")
+        if render_mode == "auto":
+            render_mode = "markers" if len(stations_data) <= MARKERS_MODE_LIMIT else "geojson"
+
+        if render_mode == "geojson":
+            add_stations_layer(m, stations_data, cluster_markers)
+        elif cluster_markers and len(stations_data) > 50:
+            from folium.plugins import MarkerCluster
+            marker_cluster = MarkerCluster(
+                name="Stacje hydrologiczne",
+                overlay=True,
+                control=True,
+                icon_create_function=CLUSTER_ICON_JS,
+            ).add_to(m)
+            add_station_markers(marker_cluster, stations_data)
+        else:
+            add_station_markers(m, stations_data)
 
     try:
         from folium.plugins import Fullscreen
@@ -288,63 +350,45 @@ def create_stations_map(stations_data: list, map_style: str = "OpenStreetMap", c
     return m
 
 
-def display_map(stations_data: list, map_style: str = "OpenStreetMap", cluster_markers: bool = False, width: int = None, height: int = None, responsive: bool = True):
-    """Wyświetl mapę w aplikacji Streamlit z responsywnym interfejsem"""
+def map_cache_key(stations_data: list, map_style: str, cluster_markers: bool, render_mode: str = "auto") -> str:
+    """Skrót treści mapy: dane stacji, styl i opcje - nic innego nie zmienia wyrenderowanego HTML"""
+    payload = json.dumps(
+        [stations_data, map_style, cluster_markers, render_mode],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@st.cache_data(max_entries=MAP_CACHE_ENTRIES, show_spinner=False)
+def render_stations_map_html(content_key: str, _stations_data: list, map_style: str, cluster_markers: bool, render_mode: str = "auto") -> str:
+    """HTML mapy stacji; cache po content_key, bez hashowania listy stacji przy każdym wywołaniu"""
+    stations_map = create_stations_map(_stations_data, map_style, cluster_markers, render_mode)
+    return folium.Figure().add_child(stations_map).render()
+
+
+def display_map(stations_data: list, map_style: str = "OpenStreetMap", cluster_markers: bool = False, width: int = None, height: int = None, responsive: bool = True, render_mode: str = "auto"):
+    """Wyświetl mapę w aplikacji Streamlit (render_mode jak w create_stations_map).
+
+    Mapa responsywna zajmuje całą szerokość kolumny, w przeciwnym razie ma stałą szerokość.
+    """
     if stations_data:
-        if width is None:
-            width = 1200 if responsive else 1000
+        if width is None and not responsive:
+            width = 1000
         if height is None:
             height = 700 if responsive else 600
 
-        stations_map = create_stations_map(stations_data, map_style, cluster_markers, responsive)
+        map_html = render_stations_map_html(
+            map_cache_key(stations_data, map_style, cluster_markers, render_mode),
+            stations_data,
+            map_style,
+            cluster_markers,
+            render_mode,
+        )
 
-        if responsive:
-            st.markdown("""
-            <style>
-            /* Optymalizacja pozycjonowania mapy */
-            .stApp > div:first-child {
-                padding-top: 0rem !important;
-            }
-            
-            div[data-testid="stVerticalBlock"] > div:has(iframe[title="streamlit_folium.st_folium"]) {
-                margin-top: -1rem !important;
-                margin-bottom: 0rem !important;
-            }
-            
-            /* Poprawki z-index dla markerów Folium */
-            .folium-map {
-                z-index: 1 !important;
-                margin: 0 !important;
-                padding: 0 !important;
-            }
-            
-            .leaflet-marker-icon {
-                z-index: 1000 !important;
-            }
-            
-            .leaflet-marker-shadow {
-                z-index: 999 !important;
-            }
-            
-            .leaflet-popup {
-                z-index: 1001 !important;
-            }
-            
-            .leaflet-tooltip {
-                z-index: 1002 !important;
-            }
-            
-            /* Optymalizacja responsywności */
-            iframe[title="streamlit_folium.st_folium"] {
-                border-radius: 8px;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            }
-            </style>
-            """, unsafe_allow_html=True)
-            
-            folium_static(stations_map, width=width, height=height)
-        else:
-            folium_static(stations_map, width=width, height=height)
+        # Ten sam HTML przy kolejnym przebiegu = ten sam element, Streamlit nie przeładowuje ramki
+        components.html(map_html, width=width, height=height + 10)
 
         with st.expander("️ Informacje o mapie i funkcjonalności", expanded=False):
             col1, col2, col3 = st.columns(3)
@@ -4,10 +4,14 @@ from datetime import datetime
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
-import os
 
-# Pobierz URL backendu z zmiennej środowiskowej
-BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+from flood_monitoring.ui.services.api_service import (
+    DEFAULT_TIMEOUT,
+    api_get,
+    api_post,
+    get_stations,
+    get_warnings,
+)
 
 def show_home():
     """Wyświetl stronę główną aplikacji"""
@@ -163,18 +167,12 @@ def show_home():
     st.subheader(" Dashboard systemu")
 
     try:
-        stations_response = requests.get(f"{BACKEND_URL}/stations/", timeout=5)
-        if stations_response.status_code == 200:
-            stations_data = stations_response.json()
-            stations_count = len(stations_data.get('features', []))
-        else:
-            stations_count = "N/A"
+        stations_count = len(get_stations())
     except:
         stations_count = "N/A"
     
     try:
-        warnings_response = requests.get(f"{BACKEND_URL}/warnings/", timeout=5)
-        warnings_count = len(warnings_response.json()) if warnings_response.status_code == 200 else "N/A"
+        warnings_count = len(get_warnings())
     except:
         warnings_count = "N/A"
 
@@ -270,8 +268,11 @@ def show_home():
     
     col1, col2, col3, col4 = st.columns(4)
     
-    def safe_api_call(url, method='GET', timeout=30, action_name="operacja"):
-        """Bezpieczne wywołanie API z obsługą błędów i debouncing"""
+    def safe_api_call(path, method='GET', timeout=DEFAULT_TIMEOUT, action_name="operacja"):
+        """Bezpieczne wywołanie API z obsługą błędów i debouncing (przez wspólną sesję HTTP).
+
+        Odpowiedź ze statusem błędu jest zwracana, żeby wywołujący mógł pokazać jej kod.
+        """
         import time
         
         current_time = time.time()
@@ -284,13 +285,16 @@ def show_home():
         
         try:
             if method == 'POST':
-                response = requests.post(url, timeout=timeout)
+                response = api_post(path, timeout=timeout)
             else:
-                response = requests.get(url, timeout=timeout)
+                response = api_get(path, timeout=timeout)
             
             st.session_state.sync_in_progress = False
             return response
             
+        except requests.exceptions.HTTPError as e:
+            st.session_state.sync_in_progress = False
+            return e.response
         except requests.exceptions.Timeout:
             st.session_state.sync_in_progress = False
             st.error(f" Przekroczono limit czasu dla {action_name}")
@@ -311,7 +315,7 @@ def show_home():
     with col1:
         if st.button(" Synchronizuj wszystkie dane", use_container_width=True, disabled=st.session_state.sync_in_progress):
             with st.spinner("Synchronizacja w toku..."):
-                response = safe_api_call(f"{BACKEND_URL}/sync/all/", method='POST', timeout=30, action_name="synchronizacji wszystkich danych")
+                response = safe_api_call("/sync/all/", method='POST', action_name="synchronizacji wszystkich danych")
                 if response and response.status_code == 200:
                     st.success("✅ Synchronizacja zakończona pomyślnie")
                 elif response:
@@ -320,7 +324,7 @@ def show_home():
     with col2:
         if st.button(" Synchronizuj stacje", use_container_width=True, disabled=st.session_state.sync_in_progress):
             with st.spinner("Synchronizacja stacji..."):
-                response = safe_api_call(f"{BACKEND_URL}/sync/stations/", method='POST', timeout=300, action_name="synchronizacji stacji")
+                response = safe_api_call("/sync/stations/", method='POST', timeout=(DEFAULT_TIMEOUT[0], 300), action_name="synchronizacji stacji")
                 if response and response.status_code == 200:
                     st.success("✅ Stacje zsynchronizowane")
                 elif response:
@@ -329,7 +333,7 @@ def show_home():
     with col3:
         if st.button(" Synchronizuj ostrzeżenia", use_container_width=True, disabled=st.session_state.sync_in_progress):
             with st.spinner("Synchronizacja ostrzeżeń..."):
-                response = safe_api_call(f"{BACKEND_URL}/sync/warnings/", method='POST', timeout=10, action_name="synchronizacji ostrzeżeń")
+                response = safe_api_call("/sync/warnings/", method='POST', action_name="synchronizacji ostrzeżeń")
                 if response and response.status_code == 200:
                     st.success("✅ Ostrzeżenia zsynchronizowane")
                 elif response:
@@ -337,9 +341,14 @@ def show_home():
     
     with col4:
         if st.button(" Sprawdź status API", use_container_width=True, disabled=st.session_state.sync_in_progress):
-            response = safe_api_call(f"{BACKEND_URL}/health/", method='GET', timeout=5, action_name="sprawdzania statusu API")
+            response = safe_api_call("/health/", method='GET', action_name="sprawdzania statusu API")
             if response and response.status_code == 200:
-                st.success("✅ API działa prawidłowo")
+                health = response.json()
+                if health.get("status") == "degraded":
+                    imgw = health.get("imgw_api", {})
+                    st.warning(f"️ API działa, ale IMGW jest niedostępne ({imgw.get('detail', 'brak szczegółów')}, sprawdzono {imgw.get('age_seconds')} s temu)")
+                else:
+                    st.success("✅ API działa prawidłowo")
             elif response:
                 st.warning(f"️ API odpowiada, ale może mieć problemy (kod: {response.status_code})")
 
@@ -8,9 +8,15 @@ from flood_monitoring.ui.components.charts import (
     create_flow_comparison_chart,
     display_station_charts,
 )
-from flood_monitoring.ui.components.map import display_map
+from flood_monitoring.ui.components.map import MARKERS_MODE_LIMIT, display_map
 from datetime import datetime, timedelta
-from flood_monitoring.ui.services.api_service import get_station_data, get_stations
+from flood_monitoring.ui.services.api_service import (
+    get_resampled_series,
+    get_stations,
+    get_stations_series,
+    get_stations_stats,
+)
+from flood_monitoring.ui.services.data_cache import show_cache_stats
 
 
 # =======================
@@ -43,6 +49,44 @@ def get_bounds(stations):
     return [[min(lats), min(lons)], [max(lats), max(lons)]]
 
 
+def fetch_stations_series(station_ids: list, days: int, extended: bool, limit: int) -> dict:
+    """Serie stacji (kolumny NumPy) ze wspólnego cache danych; brakujące pobierane jednym równoległym wywołaniem"""
+    return {
+        station_id: None if isinstance(series, Exception) else series
+        for station_id, series in get_stations_series(station_ids, days=days, extended=extended, limit=limit).items()
+    }
+
+
+def fetch_stations_stats(station_ids: list, days: int, extended: bool, limit: int) -> dict:
+    """Statystyki stacji z backendu (równolegle) dla tego samego okna co fetch_stations_series;
+    None gdy niedostępne (wykresy policzą je lokalnie)"""
+    return {
+        station_id: None if isinstance(stats, Exception) else stats
+        for station_id, stats in get_stations_stats(station_ids, days=days, limit=limit if extended else None).items()
+    }
+
+
+def comparison_step(days: int) -> str:
+    """Krok wspólnej siatki czasu dla wykresów porównawczych - dłuższe okno, rzadsza siatka"""
+    if days <= 1:
+        return "15min"
+    if days <= 3:
+        return "30min"
+    if days <= 14:
+        return "1h"
+    return "3h"
+
+
+def fetch_resampled_series(station_ids: tuple, kind: str, days: int, step: str):
+    """Serie stacji na wspólnej siatce czasu; None gdy backend niedostępny"""
+    if not station_ids:
+        return None
+    try:
+        return get_resampled_series(station_ids, kind=kind, days=days, step=step)
+    except Exception:
+        return None
+
+
 def get_wojewodztwo_emoji(wojewodztwo: str) -> str:
     """Zwraca emoji dla danego województwa."""
     emoji_map = {
@@ -80,8 +124,6 @@ def show_hydro_stations():
     st.title(" Mapa Stacji Pomiarowych")
     st.markdown("""Przeglądaj stacje pomiarowe i analizuj dane hydrologiczne.""")
 
-    if 'stations_cache' not in st.session_state:
-        st.session_state.stations_cache = {}
     if 'last_stations_fetch' not in st.session_state:
         st.session_state.last_stations_fetch = None
 
@@ -164,6 +206,21 @@ def show_hydro_stations():
             help="Wybierz styl mapy dostosowany do Twoich potrzeb"
         )
 
+        map_render_mode = st.selectbox(
+            " Rysowanie stacji:",
+            options=["auto", "markers", "geojson"],
+            index=0,
+            format_func=lambda x: {
+                "auto": "Automatycznie",
+                "markers": "Markery z ikonami",
+                "geojson": "Warstwa GeoJSON",
+            }[x],
+            help=(
+                f"Automatycznie: markery do {MARKERS_MODE_LIMIT} stacji, powyżej jedna warstwa GeoJSON "
+                "(szybsza przy wielu stacjach)"
+            )
+        )
+
         st.subheader(" Opcje wydajności")
         use_progressive_loading = st.checkbox(
             "Progresywne ładowanie danych", 
@@ -188,6 +245,8 @@ def show_hydro_stations():
             index=0
         )
 
+        show_cache_stats()
+
     stations = get_stations()
     if not stations:
         st.error("❌ Nie udało się pobrać danych stacji")
@@ -454,7 +513,8 @@ def show_hydro_stations():
             stations_data=enhanced_stations_data,
             map_style=map_style,
             cluster_markers=cluster_markers,
-            responsive=responsive_map
+            responsive=responsive_map,
+            render_mode=map_render_mode
         )
 
         if auto_fit and len(selected_stations) > 1:
@@ -480,28 +540,21 @@ def show_hydro_stations():
     st.markdown("** Analiza danych hydrologicznych**")
     
     if analysis_type == "Pojedyncze stacje":
+        station_ids = [s["properties"]["id_stacji"] for s in selected_stations if s["properties"].get("id_stacji")]
+        extended = True if use_progressive_loading else show_statistics
+        with st.spinner(f"Pobieranie danych dla {len(station_ids)} stacji..."):
+            stations_series = fetch_stations_series(station_ids, days_back, extended, batch_size)
+            stations_stats = fetch_stations_stats(station_ids, days_back, extended, batch_size)
+
         for i, station in enumerate(selected_stations):
             station_id = station["properties"]["id_stacji"]
             station_name = get_stacja(station["properties"])
             
             if station_id:
                 with st.expander(f" {station_name} - {get_rzeka(station['properties']) or 'Nieznana rzeka'}", expanded=i==0):
-                    cache_key = f"{station_id}_{days_back}_{show_statistics}_{batch_size}"
-                    
-                    if cache_key in st.session_state.stations_cache:
-                        data = st.session_state.stations_cache[cache_key]
-                    else:
-                        with st.spinner(f"Pobieranie danych dla {station_name}..."):
-                            if use_progressive_loading:
-                                from flood_monitoring.ui.services.api_service import get_station_data
-                                data = get_station_data(station_id, days=days_back, extended=True, limit=batch_size)
-                            else:
-                                data = get_station_data(station_id, days=days_back, extended=show_statistics, limit=batch_size)
-                            if data:
-                                st.session_state.stations_cache[cache_key] = data
-                    
-                    if data:
-                        display_station_charts(data)
+                    series = stations_series.get(station_id)
+                    if series:
+                        display_station_charts(series, stats=stations_stats.get(station_id), station_id=station_id, days=days_back)
                     else:
                         st.error(f"❌ Nie udało się pobrać danych dla stacji {station_name}")
             else:
@@ -524,61 +577,46 @@ def show_hydro_stations():
                 help="Dodatkowo wyświetl wykresy dla każdej stacji osobno"
             )
         
-        stations_data = {}
+        station_names = {
+            station["properties"]["id_stacji"]: get_stacja(station["properties"])
+            for station in selected_stations
+            if station["properties"].get("id_stacji")
+        }
+        station_ids = tuple(station_names)
+        step = comparison_step(days_back)
+
+        if chart_type in ["Poziom wody", "Oba typy"]:
+            block = fetch_resampled_series(station_ids, "stan", days_back, step)
+            comparison_fig = create_comparison_chart(block, station_names) if block else None
+            if comparison_fig:
+                st.plotly_chart(comparison_fig, use_container_width=True)
+            else:
+                st.info("️ Brak danych o poziomie wody dla wybranych stacji")
 
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        for i, station in enumerate(selected_stations):
-            station_id = station["properties"]["id_stacji"]
-            station_name = get_stacja(station["properties"])
-            
-            status_text.text(f"Pobieranie danych: {station_name}...")
-            progress_bar.progress((i + 1) / len(selected_stations))
-            
-            if station_id:
-                cache_key = f"{station_id}_{days_back}_{show_statistics}_{batch_size}"
-                
-                if cache_key in st.session_state.stations_cache:
-                    data = st.session_state.stations_cache[cache_key]
-                else:
-                    if use_progressive_loading:
-                        from flood_monitoring.ui.services.api_service import get_station_data
-                        data = get_station_data(station_id, days=days_back, extended=True, limit=batch_size)
-                    else:
-                        data = get_station_data(station_id, days=days_back, extended=show_statistics, limit=batch_size)
-                    if data:
-                        st.session_state.stations_cache[cache_key] = data
-                
-                if data:
-                    stations_data[station_name] = data
-        
-        progress_bar.empty()
-        status_text.empty()
-        
-        if stations_data:
-            if chart_type in ["Poziom wody", "Oba typy"]:
-                comparison_fig = create_comparison_chart(stations_data)
-                if comparison_fig:
-                    st.plotly_chart(comparison_fig, use_container_width=True)
-                else:
-                    st.info("️ Brak danych o poziomie wody dla wybranych stacji")
-            
-            if chart_type in ["Przepływ", "Oba typy"]:
-                flow_comparison_fig = create_flow_comparison_chart(stations_data)
-                if flow_comparison_fig:
-                    st.plotly_chart(flow_comparison_fig, use_container_width=True)
-                else:
-                    st.info("️ Brak danych o przepływie dla wybranych stacji")
-
-            if show_individual:
+        if chart_type in ["Przepływ", "Oba typy"]:
+            block = fetch_resampled_series(station_ids, "przeplyw", days_back, step)
+            flow_comparison_fig = create_flow_comparison_chart(block, station_names) if block else None
+            if flow_comparison_fig:
+                st.plotly_chart(flow_comparison_fig, use_container_width=True)
+            else:
+                st.info("️ Brak danych o przepływie dla wybranych stacji")
+
+        if show_individual:
+            extended = True if use_progressive_loading else show_statistics
+            with st.spinner(f"Pobieranie danych dla {len(station_ids)} stacji..."):
+                stations_series = fetch_stations_series(list(station_ids), days_back, extended, batch_size)
+                stations_stats = fetch_stations_stats(list(station_ids), days_back, extended, batch_size)
+
+            if any(stations_series.values()):
                 st.subheader(" Wykresy indywidualne")
-                for station_name, data in stations_data.items():
-                    with st.expander(f" {station_name}", expanded=False):
-                        display_station_charts(data)
-        else:
-            st.error("❌ Nie udało się pobrać danych dla żadnej z wybranych stacji")
-    
+                for station_id, series in stations_series.items():
+                    if not series:
+                        continue
+                    with st.expander(f" {station_names[station_id]}", expanded=False):
+                        display_station_charts(series, stats=stations_stats.get(station_id), station_id=station_id, days=days_back)
+            else:
+                st.error("❌ Nie udało się pobrać danych dla żadnej z wybranych stacji")
+
     elif analysis_type == "Porównanie stacji" and len(selected_stations) <= 1:
         st.info("️ Wybierz co najmniej 2 stacje, aby przeprowadzić porównanie.")
 
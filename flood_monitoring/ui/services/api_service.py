@@ -1,49 +1,214 @@
+import json
 import os
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
 
+import numpy as np
+import pyarrow as pa
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
+
+from flood_monitoring.ui.services.data_cache import get_data_cache
+
+try:
+    import brotli  # noqa: F401 - urllib3 dekoduje br tylko z zainstalowanym brotli
+    ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# (nawiązanie połączenia, odczyt odpowiedzi) w sekundach
+DEFAULT_TIMEOUT = (3.05, 30)
+MAX_RETRIES = 3
+POOL_SIZE = 16
+MAX_PARALLEL_REQUESTS = 10
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Wspólna sesja HTTP (keep-alive, pula połączeń) dla wszystkich sesji przeglądarki.
+
+    GET-y są ponawiane przy błędach połączenia i odpowiedziach 502/503/504
+    (z narastającym odstępem), POST-y nigdy - synchronizacji nie wolno zdublować.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return session
+
+
+def api_get(path: str, params: Optional[Dict[str, Any]] = None, timeout=DEFAULT_TIMEOUT, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """GET do backendu przez wspólną sesję; rzuca wyjątek przy statusie błędu"""
+    response = get_http_session().get(f"{BACKEND_URL}{path}", params=params, timeout=timeout, headers=headers)
+    response.raise_for_status()
+    return response
+
+
+def api_post(path: str, timeout=DEFAULT_TIMEOUT) -> requests.Response:
+    """POST do backendu przez wspólną sesję (bez ponawiania)"""
+    return get_http_session().post(f"{BACKEND_URL}{path}", timeout=timeout)
+
+
+def run_concurrently(calls: Dict[Hashable, Callable[[], Any]]) -> Dict[Hashable, Any]:
+    """Wykonaj wywołania równolegle w puli wątków; wynik albo wyjątek pod tym samym kluczem.
+
+    Wątki dostają kontekst bieżącego przebiegu skryptu, więc funkcje z
+    st.cache_data działają w nich tak samo jak w wątku głównym.
+    """
+    if not calls:
+        return {}
+    ctx = get_script_run_ctx()
+
+    def run(call: Callable[[], Any]) -> Any:
+        add_script_run_ctx(ctx=ctx)
+        try:
+            return call()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(calls))) as pool:
+        results = pool.map(run, calls.values())
+        return dict(zip(calls.keys(), results))
 
 
 @st.cache_data(ttl=300)
 def get_stations() -> List[Dict[str, Any]]:
     """Pobierz listę stacji pomiarowych"""
     try:
-        response = requests.get(f"{BACKEND_URL}/stations/")
-        response.raise_for_status()
+        response = api_get("/stations/")
         data = response.json()
         return data.get('features', [])
     except Exception as e:
         raise Exception(f"Error fetching stations: {str(e)}")
 
 
-@st.cache_data(ttl=120)
-def get_station_data(station_id: str, days: int = 1, extended: bool = True, limit: int = 100) -> List[Dict[str, Any]]:
-    """Pobierz dane z konkretnej stacji"""
+def decode_series(body: bytes) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Serie z odpowiedzi Arrow IPC: {nazwa: (czasy datetime64, wartości float64)}.
+
+    Liczby wierszy serii są w metadanych schematu ("serie"); odczyty bez
+    wartości są pomijane.
+    """
+    reader = pa.ipc.open_stream(body)
+    counts = json.loads(reader.schema.metadata[b"serie"])
+    table = reader.read_all()
+    times = table.column("czas").to_numpy()
+    values = table.column("wartosc").to_numpy(zero_copy_only=False)
+
+    series = {}
+    offset = 0
+    for name, count in counts.items():
+        chunk_times, chunk_values = times[offset:offset + count], values[offset:offset + count]
+        valid = np.isfinite(chunk_values)
+        series[name] = (chunk_times[valid], chunk_values[valid])
+        offset += count
+    return series
+
+
+def get_station_series(station_id: str, days: int = 1, extended: bool = True, limit: int = 100) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Pobierz serie stanu i przepływu stacji jako kolumny NumPy (Arrow IPC, przez wspólny cache danych).
+
+    Klucz to parametry, które faktycznie zmieniają odpowiedź - backend bez
+    extended ignoruje limit, więc wtedy nie rozdziela on wpisów.
+    """
     try:
         params = {
             "days": days,
             "extended": extended,
-            "limit": limit
+            "limit": limit,
+            "exclude_flagged": True
         }
-        response = requests.get(
-            f"{BACKEND_URL}/stations/{station_id}/", params=params
+        key = ("series", station_id, days, extended, limit if extended else None)
+        return get_data_cache().get_or_fetch(
+            key,
+            lambda: decode_series(
+                api_get(f"/stations/{station_id}", params=params, headers={"Accept": ARROW_STREAM_MEDIA_TYPE}).content
+            ),
         )
-        response.raise_for_status()
-        return response.json()
     except Exception as e:
         raise Exception(f"Error fetching station data: {str(e)}")
 
 
+def get_stations_series(station_ids: List[str], days: int = 1, extended: bool = True, limit: int = 100) -> Dict[str, Any]:
+    """Serie wielu stacji pobierane równolegle: {station_id: serie albo wyjątek}"""
+    return run_concurrently({
+        station_id: (lambda station_id=station_id: get_station_series(station_id, days, extended, limit))
+        for station_id in station_ids
+    })
+
+
+def get_station_stats(station_id: str, days: int = 1, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Pobierz statystyki serii stacji policzone po stronie serwera (przez wspólny cache danych).
+
+    limit ogranicza statystyki do najnowszych pomiarów - podaj ten sam, co dla
+    get_station_series, żeby obejmowały dokładnie serię z wykresu.
+    """
+    try:
+        params = {"days": days, "exclude_flagged": True}
+        if limit:
+            params["limit"] = limit
+        return get_data_cache().get_or_fetch(
+            ("stats", station_id, days, limit),
+            lambda: api_get(f"/stations/{station_id}/stats", params=params).json()
+        )
+    except Exception as e:
+        raise Exception(f"Error fetching station stats: {str(e)}")
+
+
+def get_stations_stats(station_ids: List[str], days: int = 1, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Statystyki wielu stacji pobierane równolegle: {station_id: statystyki albo wyjątek}"""
+    return run_concurrently({
+        station_id: (lambda station_id=station_id: get_station_stats(station_id, days, limit))
+        for station_id in station_ids
+    })
+
+
+@st.cache_data(ttl=120)
+def get_resampled_series(station_ids: Tuple[str, ...], kind: str = "stan", days: int = 1, step: str = "1h", agg: str = "mean") -> Dict[str, Any]:
+    """Pobierz serie kilku stacji wyrównane do wspólnej siatki czasu"""
+    try:
+        response = api_get(
+            "/stations/resample",
+            params={
+                "station_id": list(station_ids),
+                "kind": kind,
+                "days": days,
+                "step": step,
+                "agg": agg,
+                "exclude_flagged": True,
+            }
+        )
+        return response.json()
+    except Exception as e:
+        raise Exception(f"Error fetching resampled series: {str(e)}")
+
 
 @st.cache_data(ttl=180)
-def get_warnings() -> List[Dict]:
-    """Pobierz ostrzeżenia z backendu"""
+def get_warnings(wojewodztwo: Optional[str] = None, kod_zlewni: Optional[str] = None, kod_zlewni_prefix: Optional[str] = None) -> List[Dict]:
+    """Pobierz ostrzeżenia z backendu (filtrowanie po stronie API)"""
     try:
-        response = requests.get(f"{BACKEND_URL}/warnings/")
-        response.raise_for_status()
+        params = {
+            "wojewodztwo": wojewodztwo,
+            "kod_zlewni": kod_zlewni,
+            "kod_zlewni_prefix": kod_zlewni_prefix,
+        }
+        response = api_get(
+            "/warnings/",
+            params={k: v for k, v in params.items() if v is not None}
+        )
         return response.json()
     except Exception as e:
         raise Exception(f"Error fetching stations: {str(e)}")
@@ -0,0 +1,132 @@
+"""
+Wspólna pamięć podręczna danych frontendu (jedna na proces Streamlit, dla wszystkich sesji)
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+import streamlit as st
+
+# Dane IMGW spływają do backendu co ok. 10 minut - dłużej nie ma sensu trzymać serii
+DATA_CACHE_TTL = int(os.getenv("UI_CACHE_TTL", "600"))
+DATA_CACHE_MAX_MB = int(os.getenv("UI_CACHE_MAX_MB", "256"))
+
+
+def estimate_size(value: Any) -> int:
+    """Przybliżony rozmiar w bajtach obiektu z JSON (zagnieżdżone listy/słowniki) lub tablic NumPy"""
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.flags.owndata else value.nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+@dataclass
+class DataEntry:
+    value: Any
+    size: int
+    expires: float
+    created: float = field(default_factory=time.monotonic)
+
+
+class DataCache:
+    """Cache LRU z TTL i limitem pamięci; bezpieczny dla wielu wątków.
+
+    Wpisy wypierane są od najdawniej używanych, gdy suma ich rozmiarów przekroczy
+    max_bytes. Wartość większa niż cały limit nie jest zapamiętywana.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, DataEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[DataEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() > entry.expires:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> Any:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = DataEntry(value, size, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Zwróć wartość z cache lub pobierz ją funkcją fetch(); puste wyniki nie są zapamiętywane"""
+        entry = self.get(key)
+        if entry is not None:
+            return entry.value
+        value = fetch()
+        return self.set(key, value, ttl) if value else value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": self.size / 2**20,
+                "max_mb": self.max_bytes / 2**20,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: Hashable):
+        self.size -= self._entries.pop(key).size
+
+
+@st.cache_resource
+def get_data_cache() -> DataCache:
+    """Jeden cache danych na proces, współdzielony przez wszystkie sesje przeglądarki"""
+    return DataCache(max_bytes=DATA_CACHE_MAX_MB * 2**20, ttl=DATA_CACHE_TTL)
+
+
+def show_cache_stats():
+    """Statystyki cache danych (do panelu bocznego)"""
+    cache = get_data_cache()
+    stats = cache.stats()
+    with st.expander(" Pamięć podręczna danych", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Trafienia", stats["hits"], help=f"{stats['hit_rate']:.0%} zapytań obsłużonych z cache")
+        col2.metric("Chybienia", stats["misses"])
+        st.caption(
+            f"{stats['entries']} wpisów, {stats['size_mb']:.1f} / {stats['max_mb']:.0f} MB, "
+            f"wyparto {stats['evictions']}, TTL {cache.ttl:.0f} s"
+        )
+        if st.button("Wyczyść cache", use_container_width=True):
+            cache.clear()